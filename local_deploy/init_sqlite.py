@@ -2,65 +2,319 @@
 """
 Script de inicialização simplificado que usa SQLite em vez de PostgreSQL.
 Não requer Docker ou MongoDB para funcionar.
+
+A carga é feita em streaming: o CSV (latin1, separado por ';') é lido em
+blocos, convertido para um schema explícito e inserido com executemany
+dentro de uma única transação. O uso de memória fica constante,
+independente do tamanho do arquivo exportado pelo portal.
 """
 
-import pandas as pd
-from sqlalchemy import create_engine
+import argparse
 import os
+import sqlite3
 import sys
+import time
+
+import pandas as pd
+
+
+# Schema explícito da tabela (ordem = ordem das colunas no CSV do portal)
+SCHEMA = [
+    ('codigo_emenda', 'TEXT'),
+    ('ano_emenda', 'INTEGER'),
+    ('tipo_emenda', 'TEXT'),
+    ('codigo_autor', 'TEXT'),
+    ('nome_autor', 'TEXT'),
+    ('numero_emenda', 'TEXT'),
+    ('localidade_gasto', 'TEXT'),
+    ('codigo_municipio_ibge', 'INTEGER'),
+    ('municipio', 'TEXT'),
+    ('codigo_uf_ibge', 'INTEGER'),
+    ('uf', 'TEXT'),
+    ('regiao', 'TEXT'),
+    ('codigo_funcao', 'TEXT'),
+    ('nome_funcao', 'TEXT'),
+    ('codigo_subfuncao', 'TEXT'),
+    ('nome_subfuncao', 'TEXT'),
+    ('codigo_programa', 'TEXT'),
+    ('nome_programa', 'TEXT'),
+    ('codigo_acao', 'TEXT'),
+    ('nome_acao', 'TEXT'),
+    ('codigo_plano_orcamentario', 'TEXT'),
+    ('nome_plano_orcamentario', 'TEXT'),
+    ('valor_empenhado', 'REAL'),
+    ('valor_liquidado', 'REAL'),
+    ('valor_pago', 'REAL'),
+    ('valor_restos_pagar_inscritos', 'REAL'),
+    ('valor_restos_pagar_cancelados', 'REAL'),
+    ('valor_restos_pagar_pagos', 'REAL'),
+]
+
+COLUMNS = [name for name, _ in SCHEMA]
+TABLE_NAME = 'emendas_parlamentares'
+
+# PRAGMAs da carga: o banco é recriado do zero, então não precisamos de
+# journal nem de fsync durante a inserção (uma falha simplesmente refaz a carga)
+LOAD_PRAGMAS = [
+    "PRAGMA journal_mode = OFF",
+    "PRAGMA synchronous = OFF",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -262144",  # 256 MB
+    "PRAGMA locking_mode = EXCLUSIVE",
+]
+PAGE_SIZE = 8192
+
+# Índices secundários alinhados às consultas das ferramentas do servidor MCP.
+# Os que terminam em valor_pago são "covering" para SUM(valor_pago) e para
+# ORDER BY valor_pago DESC dentro do filtro.
+INDEXES = [
+    ('idx_emendas_uf_municipio', ['uf', 'municipio', 'valor_pago']),
+    ('idx_emendas_municipio', ['municipio', 'valor_pago']),
+    ('idx_emendas_autor', ['nome_autor', 'valor_pago']),
+    ('idx_emendas_regiao', ['regiao', 'valor_pago']),
+    ('idx_emendas_funcao', ['nome_funcao', 'valor_pago']),
+    ('idx_emendas_ano', ['ano_emenda', 'valor_pago']),
+    ('idx_emendas_valor_pago', ['valor_pago']),
+]
+
+# Índice full-text (FTS5) para buscas por autor, município e ação.
+# remove_diacritics faz "SAO PAULO" casar com "SÃO PAULO"; o índice de
+# prefixos acelera as buscas "paul*" usadas pelo servidor.
+FTS_TABLE = 'emendas_fts'
+FTS_COLUMNS = ['nome_autor', 'municipio', 'nome_acao']
+
+# Tabelas de agregação (rollups) materializadas na carga. O servidor MCP
+# reescreve GROUP BYs compatíveis para lê-las em vez da tabela base. Os
+# cruzamentos com regiao/nome_funcao cobrem os filtros gerados pelo parser
+# de regras do chat_app.py.
+ROLLUPS = [
+    ['nome_autor'],
+    ['uf'],
+    ['municipio'],
+    ['regiao'],
+    ['nome_funcao'],
+    ['ano_emenda'],
+    ['uf', 'municipio'],
+    ['regiao', 'nome_funcao'],
+    ['ano_emenda', 'regiao'],
+    ['nome_autor', 'regiao', 'nome_funcao'],
+    ['uf', 'regiao', 'nome_funcao'],
+    ['municipio', 'regiao', 'nome_funcao'],
+]
+ROLLUP_MEASURES = ['valor_empenhado', 'valor_liquidado', 'valor_pago']
+ROLLUP_CATALOG = 'rollup_catalog'
+
+
+def iter_csv_chunks(csv_path: str, chunksize: int):
+    """Lê o CSV em blocos, já com os nomes de coluna do schema (tudo como texto)."""
+    return pd.read_csv(
+        csv_path,
+        delimiter=';',
+        encoding='latin1',
+        quotechar='"',
+        header=0,
+        names=COLUMNS,
+        dtype=str,
+        keep_default_na=False,
+        chunksize=chunksize
+    )
+
+
+def to_float(series: pd.Series) -> pd.Series:
+    """Converte valores no formato brasileiro ('1.234,56') para float."""
+    cleaned = series.str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+    return pd.to_numeric(cleaned, errors='coerce')
+
+
+def to_int(series: pd.Series) -> pd.Series:
+    """Converte códigos numéricos para inteiro (vazio/inválido vira NULL)."""
+    return pd.to_numeric(series, errors='coerce').astype('Int64')
+
+
+def convert_chunk(chunk: pd.DataFrame) -> list:
+    """Aplica o schema explícito a um bloco e devolve as linhas prontas para o executemany."""
+    for name, sql_type in SCHEMA:
+        if sql_type == 'REAL':
+            chunk[name] = to_float(chunk[name])
+        elif sql_type == 'INTEGER':
+            chunk[name] = to_int(chunk[name])
+        else:
+            values = chunk[name].str.strip()
+            chunk[name] = values.where(values != '')
+
+    # NaN/NA -> None para o sqlite3
+    chunk = chunk.astype(object).where(chunk.notna(), None)
+    return list(chunk.itertuples(index=False, name=None))
+
+
+def create_table(conn: sqlite3.Connection):
+    columns_sql = ',\n    '.join(f'{name} {sql_type}' for name, sql_type in SCHEMA)
+    conn.execute(f"DROP TABLE IF EXISTS {TABLE_NAME}")
+    conn.execute(f"CREATE TABLE {TABLE_NAME} (\n    {columns_sql}\n)")
+
+
+def create_indexes(conn: sqlite3.Connection):
+    """Cria os índices depois da carga (mais rápido que manter durante os INSERTs)."""
+    for index_name, columns in INDEXES:
+        print(f"   🗂️  Criando índice {index_name} ({', '.join(columns)})")
+        conn.execute(f"CREATE INDEX {index_name} ON {TABLE_NAME} ({', '.join(columns)})")
+
+
+def create_fts_index(conn: sqlite3.Connection):
+    """
+    Cria o índice FTS5 (external content) e os triggers que o mantêm sincronizado.
+
+    O FTS referencia o rowid implícito da tabela base: após um VACUUM é
+    preciso refazer o 'rebuild' do índice.
+    """
+    columns = ', '.join(FTS_COLUMNS)
+    new_values = ', '.join(f'new.{c}' for c in FTS_COLUMNS)
+    old_values = ', '.join(f'old.{c}' for c in FTS_COLUMNS)
+
+    conn.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    conn.execute(
+        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+        f"{columns}, content='{TABLE_NAME}', content_rowid='rowid', "
+        f"tokenize=\"unicode61 remove_diacritics 2\", prefix='2 3')"
+    )
+    conn.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
 
+    # Triggers: qualquer INSERT/UPDATE/DELETE na tabela base reflete no FTS
+    conn.execute(f"""
+        CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON {TABLE_NAME} BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.rowid, {new_values});
+        END""")
+    conn.execute(f"""
+        CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON {TABLE_NAME} BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.rowid, {old_values});
+        END""")
+    conn.execute(f"""
+        CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE ON {TABLE_NAME} BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.rowid, {old_values});
+            INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.rowid, {new_values});
+        END""")
 
 
-def setup_sqlite():
+def create_rollups(conn: sqlite3.Connection):
+    """
+    Materializa as tabelas de agregação e registra cada uma no rollup_catalog.
+
+    Cada rollup guarda COUNT(*) como `quantidade` e a soma de cada medida com
+    o próprio nome da coluna (ex: SUM(valor_pago) AS valor_pago), de modo que
+    SUM(valor_pago) continua válido quando reagregado sobre o rollup.
+    """
+    measures_sql = ', '.join(f'SUM({m}) AS {m}' for m in ROLLUP_MEASURES)
+
+    conn.execute(f"DROP TABLE IF EXISTS {ROLLUP_CATALOG}")
+    conn.execute(
+        f"CREATE TABLE {ROLLUP_CATALOG} (table_name TEXT PRIMARY KEY, dimensions TEXT, row_count INTEGER)"
+    )
+
+    for dimensions in ROLLUPS:
+        table_name = 'rollup_' + '__'.join(dimensions)
+        dims_sql = ', '.join(dimensions)
+
+        conn.execute(f"DROP TABLE IF EXISTS {table_name}")
+        conn.execute(
+            f"CREATE TABLE {table_name} AS "
+            f"SELECT {dims_sql}, COUNT(*) AS quantidade, {measures_sql} "
+            f"FROM {TABLE_NAME} GROUP BY {dims_sql}"
+        )
+        row_count = conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+        conn.execute(
+            f"INSERT INTO {ROLLUP_CATALOG} VALUES (?, ?, ?)",
+            (table_name, ','.join(dimensions), row_count)
+        )
+        print(f"   📊 {table_name}: {row_count} linhas")
+
+    # Totais gerais (usado pelo get_emendas_stats)
+    conn.execute("DROP TABLE IF EXISTS rollup_total")
+    conn.execute(
+        "CREATE TABLE rollup_total AS SELECT "
+        "COUNT(*) AS total_emendas, "
+        "COUNT(DISTINCT nome_autor) AS total_autores, "
+        "SUM(valor_empenhado) AS total_empenhado, "
+        "SUM(valor_liquidado) AS total_liquidado, "
+        f"SUM(valor_pago) AS total_pago FROM {TABLE_NAME}"
+    )
+
+
+def setup_sqlite(chunksize: int = 20000, analyze: bool = False):
     """Carrega dados de emendas parlamentares no SQLite."""
     print("🔄 Iniciando carga de dados de emendas parlamentares no SQLite...")
 
     # Cria diretório para dados se não existir
     os.makedirs('local_deploy/data', exist_ok=True)
 
-    # Database URL para SQLite
     db_path = os.path.abspath('local_deploy/data/db_transparencia.db')
-    DB_SQL_URL = f"sqlite:///{db_path}"
+    tmp_path = db_path + '.loading'
 
+    # Caminho do CSV
+    csv_path = os.path.join('data', 'EmendasParlamentares.csv')
+
+    if not os.path.exists(csv_path):
+        print(f"❌ Erro: Arquivo {csv_path} não encontrado")
+        return False
+
+    conn = None
     try:
-        engine = create_engine(DB_SQL_URL)
-
-        # Caminho do CSV
-        csv_path = os.path.join('data', 'EmendasParlamentares.csv')
-
-        if not os.path.exists(csv_path):
-            print(f"❌ Erro: Arquivo {csv_path} não encontrado")
-            return False
-
-        # Carrega o CSV de emendas parlamentares
-        print(f"📂 Carregando CSV: {csv_path}")
-        df = pd.read_csv(
-            csv_path,
-            delimiter=';',
-            encoding='latin1',
-            decimal=',',
-            quotechar='"'
+        start = time.time()
+
+        # Carrega em um arquivo temporário e troca no final: quem estiver lendo
+        # o banco antigo não vê uma carga pela metade
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+        conn = sqlite3.connect(tmp_path, isolation_level=None)
+        conn.execute(f"PRAGMA page_size = {PAGE_SIZE}")
+        for pragma in LOAD_PRAGMAS:
+            conn.execute(pragma)
+
+        insert_sql = (
+            f"INSERT INTO {TABLE_NAME} ({', '.join(COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(COLUMNS))})"
         )
 
-        # Renomeia colunas para nomes sem acentos e mais simples
-        df.columns = [
-            'codigo_emenda', 'ano_emenda', 'tipo_emenda', 'codigo_autor',
-            'nome_autor', 'numero_emenda', 'localidade_gasto', 'codigo_municipio_ibge',
-            'municipio', 'codigo_uf_ibge', 'uf', 'regiao', 'codigo_funcao',
-            'nome_funcao', 'codigo_subfuncao', 'nome_subfuncao', 'codigo_programa',
-            'nome_programa', 'codigo_acao', 'nome_acao', 'codigo_plano_orcamentario',
-            'nome_plano_orcamentario', 'valor_empenhado', 'valor_liquidado',
-            'valor_pago', 'valor_restos_pagar_inscritos', 'valor_restos_pagar_cancelados',
-            'valor_restos_pagar_pagos'
-        ]
-
-        # Cria a tabela 'emendas_parlamentares'
-        print(f"💾 Carregando {len(df)} registros de emendas parlamentares...")
-        df.to_sql('emendas_parlamentares', engine, if_exists='replace', index=False, chunksize=1000)
+        print(f"📂 Carregando CSV em blocos de {chunksize} linhas: {csv_path}")
+        total_rows = 0
+
+        conn.execute("BEGIN")
+        create_table(conn)
+        for chunk in iter_csv_chunks(csv_path, chunksize):
+            rows = convert_chunk(chunk)
+            conn.executemany(insert_sql, rows)
+            total_rows += len(rows)
+            print(f"   💾 {total_rows} registros inseridos...")
+
+        print("🗂️  Criando índices secundários...")
+        create_indexes(conn)
+
+        print("🔎 Criando índice full-text (FTS5)...")
+        create_fts_index(conn)
+
+        print("📊 Materializando tabelas de agregação (rollups)...")
+        create_rollups(conn)
+        conn.execute("COMMIT")
+
+        if analyze:
+            # Estatísticas para o planejador escolher entre os índices
+            print("📈 Executando ANALYZE...")
+            conn.execute("ANALYZE")
+
+        # O servidor MCP lê o banco com conexões somente leitura: WAL evita que
+        # leitores e uma eventual escrita se bloqueiem (modo fica gravado no arquivo)
+        conn.execute("PRAGMA locking_mode = NORMAL")
+        conn.execute("PRAGMA journal_mode = WAL")
 
+        conn.close()
+        conn = None
+        os.replace(tmp_path, db_path)
+
+        elapsed = time.time() - start
         print(f"✅ Banco SQLite criado com sucesso!")
         print(f"   Localização: {db_path}")
-        print(f"   Registros: {len(df)}")
+        print(f"   Registros: {total_rows}")
+        print(f"   Tempo de carga: {elapsed:.1f}s")
         return True
 
     except Exception as e:
@@ -69,13 +323,38 @@ def setup_sqlite():
         traceback.print_exc()
         return False
 
+    finally:
+        if conn is not None:
+            conn.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Carga das emendas parlamentares no SQLite")
+    parser.add_argument(
+        '--chunksize',
+        type=int,
+        default=20000,
+        help="Linhas do CSV lidas por bloco (padrão: 20000)"
+    )
+    parser.add_argument(
+        '--analyze',
+        action='store_true',
+        help="Executa ANALYZE ao final da carga (estatísticas para o planejador)"
+    )
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
+    args = parse_args()
+
     print("=" * 60)
     print("  Setup de Banco SQLite para Desenvolvimento Local")
     print("=" * 60)
     print()
 
-    success = setup_sqlite()
+    success = setup_sqlite(chunksize=args.chunksize, analyze=args.analyze)
 
     print()
     if success:
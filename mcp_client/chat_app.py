@@ -1,11 +1,15 @@
 
 import os
 import sys
+import time
 import asyncio
+import threading
 import streamlit as st
 from langchain_community.llms import LlamaCpp
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
+from mcp_pool import MCPSessionPool
+from llm_client import DEFAULT_SOCKET, PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL, LLMClient, LocalLLM
+from sql_grammar import SQL_GRAMMAR
+from sql_cache import DEFAULT_EMBEDDING_MODEL, SQLCache
 
 # Configuração da página
 st.set_page_config(
@@ -17,6 +21,44 @@ st.set_page_config(
 # Caminho do projeto
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 LLM_PATH = os.path.join(PROJECT_ROOT, "llm_models", "qwen2.5-1.5b-instruct-q4_k_m.gguf")
+SERVER_SCRIPT = os.path.join(PROJECT_ROOT, "mcp_server", "start_mcp_server.sh")
+MCP_POOL_SIZE = int(os.getenv("MCP_POOL_SIZE", "2"))
+PROMPT_CACHE_DIR = os.getenv("PROMPT_CACHE_DIR") or None
+
+# Servidor de inferência compartilhado (llm_server.py); sem ele o modelo roda no processo do Streamlit
+LLM_SERVER = os.getenv("LLM_SERVER", "1") == "1"
+LLM_SERVER_SOCKET = os.getenv("LLM_SERVER_SOCKET", DEFAULT_SOCKET)
+LLM_SERVER_WAIT = float(os.getenv("LLM_SERVER_WAIT", "120"))  # espera (s) o servidor carregar o modelo
+
+# Cache semântico pergunta → SQL (sql_cache.py); SQL_CACHE_MODEL vazio = só texto normalizado
+SQL_CACHE = os.getenv("SQL_CACHE", "1") == "1"
+SQL_CACHE_PATH = os.getenv("SQL_CACHE_PATH", os.path.join(PROJECT_ROOT, "data", "sql_cache.json"))
+SQL_CACHE_MODEL = os.getenv("SQL_CACHE_MODEL", DEFAULT_EMBEDDING_MODEL)
+SQL_CACHE_THRESHOLD = float(os.getenv("SQL_CACHE_THRESHOLD", "0.88"))
+
+# Intervalo mínimo (s) entre redesenhos da resposta durante o streaming
+STREAM_REFRESH_INTERVAL = 0.05
+
+# Prompts: prefixo fixo (estado do llama.cpp salvo pelo PromptCache) + sufixo dinâmico
+DB_SCHEMA = """emendas_parlamentares (nome_autor, uf, municipio, regiao, nome_funcao, valor_pago, valor_empenhado)"""
+
+SQL_PROMPT_PREFIX = f"""Gere SQL SQLite para a pergunta.
+
+Tabela: {DB_SCHEMA}
+
+Exemplos:
+P: "top 20 parlamentares" → SELECT nome_autor, COUNT(*) as total FROM emendas_parlamentares GROUP BY nome_autor ORDER BY total DESC LIMIT 20;
+P: "soma por estado" → SELECT uf, SUM(valor_pago) as total FROM emendas_parlamentares GROUP BY uf ORDER BY total DESC LIMIT 50;
+
+"""
+
+SQL_EXPLAIN_PREFIX = """Você é um assistente que explica resultados de queries SQL.
+Gere uma resposta em linguagem natural clara e objetiva em 2-3 frases, explicando o resultado.
+Não invente informações. Use os dados fornecidos.
+
+"""
+
+THEORY_PROMPT_PREFIX = "Baseado nos trechos abaixo, responda de forma CONCISA (2-3 frases):\n\n"
 
 # Inicializa o estado da sessão
 if "messages" not in st.session_state:
@@ -27,7 +69,13 @@ if "llm" not in st.session_state:
 
 @st.cache_resource
 def load_llm():
-    """Carrega o modelo Qwen (cached)."""
+    """Cliente do servidor de inferência ou, sem ele, o modelo Qwen no próprio processo (cached)."""
+    if LLM_SERVER:
+        client = LLMClient(LLM_SERVER_SOCKET)
+        if client.wait_until_ready(LLM_SERVER_WAIT):
+            return client
+        print(f"⚠️  Servidor LLM indisponível em {LLM_SERVER_SOCKET}: carregando o modelo no processo do Streamlit")
+
     if not os.path.exists(LLM_PATH):
         st.error(f"❌ Modelo LLM não encontrado em: {LLM_PATH}")
         return None
@@ -42,11 +90,47 @@ def load_llm():
             n_batch=512,
             verbose=False
         )
-        return llm
+        return LocalLLM(llm, cache_dir=PROMPT_CACHE_DIR)
     except Exception as e:
         st.error(f"❌ Erro ao carregar LLM: {e}")
         return None
 
+@st.cache_resource
+def get_mcp_pool():
+    """Pool de sessões MCP persistentes (sobrevive aos reruns do Streamlit)."""
+    return MCPSessionPool(SERVER_SCRIPT, size=MCP_POOL_SIZE)
+
+@st.cache_resource
+def get_sql_cache():
+    """Cache pergunta → SQL compartilhado entre as sessões; o modelo de embeddings carrega em background."""
+    if not SQL_CACHE:
+        return None
+    cache = SQLCache(SQL_CACHE_PATH, embedding_model=SQL_CACHE_MODEL, threshold=SQL_CACHE_THRESHOLD)
+    threading.Thread(target=cache.warm_up, name="sql-cache-warmup", daemon=True).start()
+    return cache
+
+def stream_llm(llm, prompt, placeholder, prefix="", suffix="", prefix_prompt="", **kwargs):
+    """
+    Gera a resposta token a token (llm.stream), redesenhando o placeholder
+    conforme os tokens chegam. Retorna o texto completo gerado.
+
+    prefix/suffix envolvem o texto exibido; prefix_prompt é a parte fixa do
+    prompt cujo KV cache é reaproveitado.
+    """
+    text = ""
+    last_render = 0.0
+
+    for chunk in llm.stream(prompt, prefix=prefix_prompt, **kwargs):
+        text += chunk
+        # Redesenha no máximo a cada STREAM_REFRESH_INTERVAL (cada markdown vai ao navegador)
+        now = time.monotonic()
+        if now - last_render >= STREAM_REFRESH_INTERVAL:
+            placeholder.markdown(f"{prefix}{text}▌{suffix}")
+            last_render = now
+
+    placeholder.markdown(f"{prefix}{text}{suffix}")
+    return text
+
 # Carrega dicionário de dados
 DICT_PATH = os.path.join(PROJECT_ROOT, "data", "dicionario_dados.md")
 data_dictionary = ""
@@ -75,6 +159,8 @@ with st.sidebar:
             st.session_state.llm = load_llm()
             if st.session_state.llm:
                 st.success("Modelo carregado!")
+    # Aquecimento do cache pergunta → SQL em background
+    get_sql_cache()
 
 
 def parse_simple_query(user_message):
@@ -167,31 +253,27 @@ def parse_simple_query(user_message):
 
     return sql
 
-async def run_sql_agent(user_message, llm, status_container):
+async def run_sql_agent(user_message, llm, status_container, output):
     """Agente Especialista em SQL com parser híbrido (regras + LLM)"""
 
     # TENTATIVA 1: Parser baseado em regras para queries simples
     status_container.status("🔍 Analisando pergunta...", expanded=True)
     simple_sql = parse_simple_query(user_message)
+    sql_cache = get_sql_cache()
+    # TENTATIVA 2: SQL de uma pergunta igual ou parecida que já executou com sucesso
+    cached = sql_cache.lookup(user_message) if sql_cache and not simple_sql else None
 
     if simple_sql:
         status_container.success("✅ Query interpretada por regras (rápido)")
         sql_response = simple_sql
+    elif cached:
+        status_container.success(f"⚡ SQL reaproveitado do cache (similaridade {cached.score:.2f})")
+        sql_response = cached.sql
     else:
         status_container.info("🤖 Query complexa - usando LLM")
 
-        # SCHEMA PARA LLM
-        db_schema = """emendas_parlamentares (nome_autor, uf, municipio, regiao, nome_funcao, valor_pago, valor_empenhado)"""
-
-        # Prompt few-shot
-        system_prompt = f"""Gere SQL SQLite para: "{user_message}"
-
-Tabela: {db_schema}
-
-Exemplos:
-P: "top 20 parlamentares" → SELECT nome_autor, COUNT(*) as total FROM emendas_parlamentares GROUP BY nome_autor ORDER BY total DESC LIMIT 20;
-P: "soma por estado" → SELECT uf, SUM(valor_pago) as total FROM emendas_parlamentares GROUP BY uf ORDER BY total DESC LIMIT 50;
-
+        # Prompt few-shot: só a pergunta fica fora do prefixo em cache
+        system_prompt = SQL_PROMPT_PREFIX + f"""P: "{user_message}"
 SQL:
 ```sql"""
 
@@ -199,29 +281,16 @@ SQL:
 
         # Gera SQL com LLM
         try:
-            response_text = llm.invoke(system_prompt, stop=["User:", "```\n"], max_tokens=150)
+            # Saída restrita pela gramática: um único SELECT válido, terminado em ";"
+            response_text = llm.invoke(
+                system_prompt, prefix=SQL_PROMPT_PREFIX, priority=PRIORITY_HIGH,
+                grammar=SQL_GRAMMAR, max_tokens=150
+            )
+            sql_response = response_text.strip()
 
-            # Estratégia 1: Tenta pegar bloco Markdown fechado
-            import re
-            match = re.search(r"```sql\s*([\s\S]*?)\s*```", response_text, re.IGNORECASE)
-
-            if match:
-                sql_response = match.group(1).strip()
-            else:
-                # Estratégia 2: Pega do primeiro SELECT até ;
-                match_fallback = re.search(r"(SELECT\s+[\s\S]+?;)", response_text, re.IGNORECASE)
-                if match_fallback:
-                    sql_response = match_fallback.group(1).strip()
-                else:
-                    # Estratégia 3: Pega linha única
-                    match_line = re.search(r"(SELECT\s+.*)", response_text, re.IGNORECASE)
-                    if match_line:
-                        sql_response = match_line.group(1).strip()
-                    else:
-                        return "❌ LLM não conseguiu gerar SQL válido. Tente reformular a pergunta.", None
-
-            # Remove caracteres extras
-            sql_response = sql_response.replace("```", "").split(';')[0].strip() + ";"
+            # Sem ";" a geração parou por max_tokens antes de completar o comando
+            if not sql_response.endswith(";"):
+                return "❌ LLM não conseguiu gerar SQL completo. Tente simplificar a pergunta.", None
 
             status_container.info(f"✅ SQL gerado pelo LLM")
 
@@ -230,112 +299,115 @@ SQL:
 
     # 2. Executa
     status_container.status("🛠️ Executando no Banco...", expanded=True)
-    server_script = os.path.join(PROJECT_ROOT, "mcp_server", "start_mcp_server.sh")
-    server_params = StdioServerParameters(command=server_script, args=[], env=None)
 
     try:
-        async with stdio_client(server_params) as (read, write):
-            async with ClientSession(read, write) as session:
-                await session.initialize()
-                result = await session.call_tool("query_emendas", {"query": sql_response})
-                data_str = result.content[0].text
+        result = await get_mcp_pool().acall_tool("query_emendas", {"query": sql_response})
+        data_str = result.content[0].text
 
-                status_container.info("✅ Query executada com sucesso")
+        status_container.info("✅ Query executada com sucesso")
 
-                # 3. Verificar se tem erro
-                if "Erro" in data_str:
-                    return f"❌ Erro ao consultar dados:\n\n{data_str}\n\n**Query gerada:**\n```sql\n{sql_response}\n```", sql_response
+        # Só SQL do LLM (ou do próprio cache) que executou sem erro entra no cache
+        if sql_cache and not simple_sql and "Erro" not in data_str:
+            sql_cache.store(user_message, sql_response)
 
-                # 4. O MCP server já retorna markdown formatado! Vamos usar direto
-                # Verifica se é uma tabela markdown (contém | e -)
-                if "|" in data_str and "---" in data_str:
-                    # É uma tabela! Retorna direto com formatação bonita
-                    final_ans = f"📊 **Resultado da consulta:**\n\n{data_str}\n\n**Query SQL utilizada:**\n```sql\n{sql_response}\n```"
-                    return final_ans, data_str
+        # 3. Verificar se tem erro
+        if "Erro" in data_str:
+            if cached:
+                sql_cache.invalidate(sql_response)
+            return f"❌ Erro ao consultar dados:\n\n{data_str}\n\n**Query gerada:**\n```sql\n{sql_response}\n```", sql_response
 
-                # 5. Se não é tabela, pode ser mensagem de sucesso ou resultado simples
-                # Vamos gerar uma explicação em linguagem natural
-                explain_prompt = f"""Você é um assistente que explica resultados de queries SQL.
+        # 4. O MCP server já retorna markdown formatado! Vamos usar direto
+        # Verifica se é uma tabela markdown (contém | e -)
+        if "|" in data_str and "---" in data_str:
+            # É uma tabela! Retorna direto com formatação bonita
+            final_ans = f"📊 **Resultado da consulta:**\n\n{data_str}\n\n**Query SQL utilizada:**\n```sql\n{sql_response}\n```"
+            return final_ans, data_str
 
-PERGUNTA ORIGINAL: {user_message}
+        # 5. Se não é tabela, pode ser mensagem de sucesso ou resultado simples
+        # Vamos gerar uma explicação em linguagem natural
+        explain_prompt = SQL_EXPLAIN_PREFIX + f"""PERGUNTA ORIGINAL: {user_message}
 
 RESULTADO DA QUERY:
 {data_str[:1000]}
 
-Gere uma resposta em linguagem natural clara e objetiva em 2-3 frases, explicando o resultado.
-Não invente informações. Use os dados fornecidos.
-
 Resposta:"""
 
-                final_ans = llm.invoke(explain_prompt, stop=["User:", "Pergunta:", "PERGUNTA:", "\n\n\n"])
-                final_ans += f"\n\n**Query SQL utilizada:**\n```sql\n{sql_response}\n```"
+        # A query aparece já; a explicação vai sendo escrita acima dela
+        sql_block = f"\n\n**Query SQL utilizada:**\n```sql\n{sql_response}\n```"
+        final_ans = stream_llm(
+            llm, explain_prompt, output, suffix=sql_block,
+            prefix_prompt=SQL_EXPLAIN_PREFIX, priority=PRIORITY_NORMAL,
+            stop=["User:", "Pergunta:", "PERGUNTA:", "\n\n\n"]
+        )
+        final_ans += sql_block
 
-                return final_ans, data_str
+        return final_ans, data_str
 
     except Exception as e:
         return f"❌ Erro na execução da tool: {e}\n\n**Query gerada:**\n```sql\n{sql_response}\n```", None
 
-async def run_theory_agent(user_message, llm, status_container):
+async def run_theory_agent(user_message, llm, status_container, output):
     """Agente Especialista em Teoria"""
     
     status_container.status("📚 Pesquisando documentos...", expanded=True)
     
-    # Chama direto a busca
-    server_script = os.path.join(PROJECT_ROOT, "mcp_server", "start_mcp_server.sh")
-    server_params = StdioServerParameters(command=server_script, args=[], env=None)
-    
+    # Chama direto a busca (sessão MCP persistente do pool)
     try:
-        async with stdio_client(server_params) as (read, write):
-             async with ClientSession(read, write) as session:
-                await session.initialize()
-                # Usa a pergunta do usuario como termo de busca
-                result = await session.call_tool("search_legislative_report", {"query": user_message})
-                doc_content = result.content[0].text
-                
-                status_container.info("✅ Documentos encontrados")
-
-                # Gera resposta sintética e concisa
-                status_container.status("🤖 Gerando resumo com LLM...", expanded=True)
-
-                # Limita contexto para evitar travamento
-                context_limit = 2000
-                limited_context = doc_content[:context_limit]
-
-                explain_prompt = (
-                    "Baseado nos trechos abaixo, responda de forma CONCISA (2-3 frases):\n\n"
-                    f"CONTEXTO:\n{limited_context}\n\n"
-                    f"PERGUNTA: {user_message}\n\n"
-                    "RESPOSTA:"
-                )
-
-                try:
-                    summary = llm.invoke(explain_prompt, max_tokens=200)
-                    status_container.success("✅ Resumo gerado")
-                except Exception as e:
-                    status_container.error(f"❌ Erro ao gerar resumo: {e}")
-                    import traceback
-                    traceback.print_exc()
-                    summary = "Não foi possível gerar resumo automático. Veja os trechos abaixo."
-
-                # Monta resposta final: Resumo + Trechos de referência
-                final_response = f"📚 **Resposta:**\n\n{summary}\n\n"
-                final_response += "---\n\n📖 **Trechos de Referência (fontes):**\n\n"
-
-                # Pega apenas os primeiros 5 trechos para exibir como referência
-                doc_lines = doc_content.split("\n\n")
-                references = []
-                for i, trecho in enumerate(doc_lines[:5], 1):
-                    if trecho.strip():
-                        # Remove o label [Trecho X] se existir
-                        clean_trecho = trecho.replace(f"[Trecho {i}]", "").strip()
-                        # Limita tamanho
-                        if len(clean_trecho) > 600:
-                            clean_trecho = clean_trecho[:600] + "..."
-                        references.append(f"**[{i}]** {clean_trecho}")
-
-                final_response += "\n\n".join(references)
-
-                return final_response, doc_content
+        # Usa a pergunta do usuario como termo de busca
+        result = await get_mcp_pool().acall_tool("search_legislative_report", {"query": user_message})
+        doc_content = result.content[0].text
+        
+        status_container.info("✅ Documentos encontrados")
+
+        # Pega apenas os primeiros 5 trechos para exibir como referência
+        doc_lines = doc_content.split("\n\n")
+        references = []
+        for i, trecho in enumerate(doc_lines[:5], 1):
+            if trecho.strip():
+                # Remove o label [Trecho X] se existir
+                clean_trecho = trecho.replace(f"[Trecho {i}]", "").strip()
+                # Limita tamanho
+                if len(clean_trecho) > 600:
+                    clean_trecho = clean_trecho[:600] + "..."
+                references.append(f"**[{i}]** {clean_trecho}")
+
+        references_md = "---\n\n📖 **Trechos de Referência (fontes):**\n\n" + "\n\n".join(references)
+
+        # Trechos aparecem logo após a busca; o resumo é escrito acima deles
+        with output.container():
+            answer_box = st.empty()
+            st.markdown(references_md)
+
+        # Gera resposta sintética e concisa
+        status_container.status("🤖 Gerando resumo com LLM...", expanded=True)
+
+        # Limita contexto para evitar travamento
+        context_limit = 2000
+        limited_context = doc_content[:context_limit]
+
+        explain_prompt = (
+            THEORY_PROMPT_PREFIX +
+            f"CONTEXTO:\n{limited_context}\n\n"
+            f"PERGUNTA: {user_message}\n\n"
+            "RESPOSTA:"
+        )
+
+        try:
+            summary = stream_llm(
+                llm, explain_prompt, answer_box, prefix="📚 **Resposta:**\n\n",
+                prefix_prompt=THEORY_PROMPT_PREFIX, priority=PRIORITY_LOW, max_tokens=200
+            )
+            status_container.success("✅ Resumo gerado")
+        except Exception as e:
+            status_container.error(f"❌ Erro ao gerar resumo: {e}")
+            import traceback
+            traceback.print_exc()
+            summary = "Não foi possível gerar resumo automático. Veja os trechos abaixo."
+
+        # Monta resposta final: Resumo + Trechos de referência
+        final_response = f"📚 **Resposta:**\n\n{summary}\n\n" + references_md
+
+        return final_response, doc_content
     except Exception as e:
         return f"Erro na busca: {e}", None
 
@@ -355,17 +427,19 @@ if prompt := st.chat_input("Digite sua pergunta..."):
     with st.chat_message("assistant"):
         if st.session_state.llm:
             status = st.empty()
+            # Área da resposta: os agentes escrevem nela durante o streaming
+            output = st.empty()
             
             # Decide qual agente chamar baseado no RadioButton
             if "SQL" in mode:
                 # Hack async
 
                 
-                response, details = asyncio.run(run_sql_agent(prompt, st.session_state.llm, status))
+                response, details = asyncio.run(run_sql_agent(prompt, st.session_state.llm, status, output))
             else:
-                 response, details = asyncio.run(run_theory_agent(prompt, st.session_state.llm, status))
+                 response, details = asyncio.run(run_theory_agent(prompt, st.session_state.llm, status, output))
             
-            st.markdown(response)
+            output.markdown(response)
             st.session_state.messages.append({"role": "assistant", "content": response})
             status.empty()
         else:
@@ -27,7 +27,7 @@ Esta tabela contém informações sobre emendas parlamentares do Governo Federal
 | nome_autor | TEXT | Nome completo do parlamentar autor | "João da Silva" |
 | numero_emenda | TEXT | Número da emenda | "1234/2020" |
 | localidade_gasto | TEXT | Localidade do gasto | Texto descritivo |
-| codigo_municipio_ibge | TEXT | Código IBGE do município | "3550308" |
+| codigo_municipio_ibge | INTEGER | Código IBGE do município | 3550308 |
 | municipio | TEXT | Município beneficiado pela emenda | "SÃO PAULO", "RIO DE JANEIRO" |
 | codigo_uf_ibge | INTEGER | Código IBGE do estado | 35 |
 | uf | TEXT | Nome completo do estado (maiúsculo) | "SÃO PAULO", "RIO DE JANEIRO", "PARANÁ" |
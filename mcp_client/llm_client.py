@@ -0,0 +1,175 @@
+"""
+Cliente do Servidor de Inferência LLM (llm_server.py)
+
+Cada chamada abre uma conexão no socket Unix do servidor, envia uma
+requisição JSON e lê os tokens conforme são gerados. Conexões
+independentes: sessões do Streamlit em threads diferentes podem chamar o
+mesmo cliente ao mesmo tempo, e a fila com prioridades fica no servidor.
+
+LocalLLM tem a mesma interface e roda o LlamaCpp no próprio processo
+(sem servidor, sem fila), com o cache de prefixo do prompt_cache.py.
+"""
+
+import json
+import os
+import socket
+import time
+from contextlib import nullcontext
+from typing import Iterator, List, Optional
+
+from prompt_cache import PromptCache
+
+DEFAULT_SOCKET = "/tmp/transparencia_llm.sock"
+
+# Menor valor = atendido antes (e interrompe gerações de prioridade menor)
+PRIORITY_HIGH = 0     # geração de SQL (curta, usuário esperando)
+PRIORITY_NORMAL = 1   # explicação de resultados
+PRIORITY_LOW = 2      # resumos longos
+
+
+class LLMServerError(RuntimeError):
+    """Erro reportado pelo servidor de inferência (ou falha de comunicação)."""
+
+
+class LLMClient:
+    """Cliente do servidor de inferência (mesma interface invoke/stream do LlamaCpp)."""
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET, timeout: float = 180.0,
+                 connect_timeout: float = 5.0):
+        """
+        Args:
+            socket_path: Socket Unix do llm_server.py
+            timeout: Tempo máximo (s) padrão de uma geração, incluindo a espera na fila
+            connect_timeout: Tempo máximo (s) para conectar
+        """
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+
+    def _request(self, payload: dict, timeout: float) -> Iterator[dict]:
+        """Envia uma requisição e devolve as mensagens do servidor (uma por linha)"""
+        deadline = time.monotonic() + timeout
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(self.connect_timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError as e:
+                raise LLMServerError(f"servidor LLM indisponível em {self.socket_path}: {e}") from e
+
+            sock.sendall((json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8"))
+            reader = sock.makefile("r", encoding="utf-8")
+
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise LLMServerError(f"tempo esgotado ({timeout:.0f}s) aguardando o servidor LLM")
+                sock.settimeout(remaining)
+                try:
+                    line = reader.readline()
+                except socket.timeout:
+                    raise LLMServerError(f"tempo esgotado ({timeout:.0f}s) aguardando o servidor LLM")
+                if not line:
+                    raise LLMServerError("servidor LLM encerrou a conexão")
+
+                message = json.loads(line)
+                if message.get("type") == "error":
+                    raise LLMServerError(message.get("error", "erro desconhecido"))
+                yield message
+                if message.get("type") in ("done", "status"):
+                    return
+        finally:
+            # Fechar no meio da geração faz o servidor descartar a requisição
+            sock.close()
+
+    def status(self) -> dict:
+        return next(self._request({"op": "status"}, self.connect_timeout))
+
+    def wait_until_ready(self, timeout: float) -> bool:
+        """
+        Espera o servidor terminar de carregar o modelo
+
+        Returns:
+            False se não há servidor no socket ou se ele não ficou pronto a tempo
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                if self.status().get("ready"):
+                    return True
+            except LLMServerError:
+                # Sem o arquivo do socket não há servidor subindo
+                if not os.path.exists(self.socket_path):
+                    return False
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.5)
+
+    def stream(self, prompt: str, prefix: str = "", max_tokens: int = 512,
+               stop: Optional[List[str]] = None, temperature: float = 0.1,
+               priority: int = PRIORITY_NORMAL, timeout: Optional[float] = None,
+               grammar: Optional[str] = None) -> Iterator[str]:
+        """
+        Gera a resposta token a token
+
+        Args:
+            prompt: Prompt completo
+            prefix: Parte fixa do início do prompt (estado salvo no servidor)
+            max_tokens: Máximo de tokens gerados
+            stop: Sequências de parada
+            temperature: Temperatura de amostragem
+            priority: PRIORITY_HIGH / PRIORITY_NORMAL / PRIORITY_LOW
+            timeout: Tempo máximo (s) da requisição, incluindo a fila
+            grammar: Gramática GBNF que restringe a saída (ex: sql_grammar.SQL_GRAMMAR)
+        """
+        timeout = timeout or self.timeout
+        payload = {
+            "op": "generate",
+            "prompt": prompt,
+            "prefix": prefix,
+            "max_tokens": max_tokens,
+            "stop": stop or [],
+            "temperature": temperature,
+            "priority": priority,
+            "timeout": timeout,
+            "grammar": grammar,
+        }
+        for message in self._request(payload, timeout):
+            if message.get("type") == "token":
+                yield message["text"]
+
+    def invoke(self, prompt: str, **kwargs) -> str:
+        return "".join(self.stream(prompt, **kwargs))
+
+
+class LocalLLM:
+    """LlamaCpp no próprio processo com a interface do LLMClient (sem fila)."""
+
+    def __init__(self, llm, cache_dir: Optional[str] = None):
+        """
+        Args:
+            llm: langchain_community.llms.LlamaCpp carregado
+            cache_dir: Diretório dos snapshots de prefixo (None = só memória)
+        """
+        self.llm = llm
+        self.prompt_cache = PromptCache(llm.client, cache_dir=cache_dir)
+        self._grammars = {}
+
+    def _grammar(self, grammar: str):
+        # LlamaGrammar por texto da gramática (reaproveitada entre chamadas)
+        if grammar not in self._grammars:
+            from llama_cpp import LlamaGrammar
+            self._grammars[grammar] = LlamaGrammar.from_string(grammar, verbose=False)
+        return self._grammars[grammar]
+
+    def stream(self, prompt: str, prefix: str = "", priority: int = PRIORITY_NORMAL,
+               timeout: Optional[float] = None, grammar: Optional[str] = None,
+               **kwargs) -> Iterator[str]:
+        # Sem servidor não há fila: prioridade e timeout são ignorados
+        if grammar:
+            kwargs["grammar"] = self._grammar(grammar)
+        with self.prompt_cache.prefix(prefix) if prefix else nullcontext():
+            yield from self.llm.stream(prompt, **kwargs)
+
+    def invoke(self, prompt: str, **kwargs) -> str:
+        return "".join(self.stream(prompt, **kwargs))
@@ -0,0 +1,397 @@
+"""
+Servidor de Inferência LLM - Um processo com o modelo GGUF para todas as sessões
+
+O modelo era carregado dentro de cada processo do Streamlit, e as sessões
+concorrentes disputavam o mesmo objeto LlamaCpp (que não é thread-safe),
+sem nenhuma política de fila. Aqui um único processo carrega o GGUF e uma
+thread de inferência atende uma fila com prioridades:
+
+- Menor prioridade numérica primeiro (geração de SQL antes de resumos);
+  mesma prioridade em ordem de chegada.
+- Preempção entre tokens: se chega uma requisição mais prioritária, a
+  geração em curso é pausada (snapshot do estado do llama.cpp), volta para
+  a fila e continua de onde parou depois, sem reavaliar o prompt. Um resumo
+  longo não bloqueia uma geração de SQL curta.
+- max_tokens e timeout por requisição (o timeout conta desde a chegada,
+  inclusive o tempo na fila); requisições cujo cliente desconectou são
+  descartadas, inclusive enquanto ainda estão na fila (o socket é
+  verificado periodicamente).
+- Prefixos fixos dos prompts reaproveitam o KV cache (prompt_cache.py).
+- Saída restrita por gramática GBNF (ex: sql_grammar.py); essas gerações
+  não são interrompidas, porque o estado da gramática não sobrevive à retomada.
+
+Protocolo (socket Unix, uma requisição JSON por conexão, respostas JSON por linha):
+    -> {"op": "generate", "prompt": "...", "prefix": "...", "max_tokens": 150,
+        "stop": ["..."], "temperature": 0.1, "priority": 0, "timeout": 60,
+        "grammar": "root ::= ..."}
+    <- {"type": "token", "text": "..."}   (um por token)
+    <- {"type": "done", "text": "...", "tokens": 42, "queue_ms": 3.1, "total_ms": 912.0}
+    <- {"type": "error", "error": "..."}
+
+    -> {"op": "status"}
+    <- {"type": "status", "ready": true, "queued": 0, ...}
+
+Uso:
+    python mcp_client/llm_server.py   (o start_chat.sh já sobe o servidor)
+"""
+
+import heapq
+import itertools
+import json
+import os
+import queue
+import select
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+from contextlib import nullcontext
+from typing import Callable, Optional
+
+from llm_client import DEFAULT_SOCKET, PRIORITY_NORMAL
+from prompt_cache import PromptCache, save_snapshot
+
+# Caminho do projeto
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LLM_PATH = os.getenv("LLM_PATH", os.path.join(PROJECT_ROOT, "llm_models", "qwen2.5-1.5b-instruct-q4_k_m.gguf"))
+LLM_SERVER_SOCKET = os.getenv("LLM_SERVER_SOCKET", DEFAULT_SOCKET)
+LLM_N_CTX = int(os.getenv("LLM_N_CTX", "5000"))
+LLM_THREADS = int(os.getenv("LLM_THREADS", "0"))  # 0 = padrão do llama.cpp
+LLM_PREEMPT = os.getenv("LLM_PREEMPT", "1") == "1"
+PROMPT_CACHE_DIR = os.getenv("PROMPT_CACHE_DIR") or None
+
+# Mesmos parâmetros de amostragem do LlamaCpp usado antes no chat_app
+SAMPLING = {"top_p": 0.95, "top_k": 40, "repeat_penalty": 1.1}
+DEFAULT_MAX_TOKENS = 512
+DEFAULT_TIMEOUT = 180.0
+# Intervalo (s) entre verificações de desconexão do cliente enquanto espera tokens
+DISCONNECT_POLL_INTERVAL = 0.2
+
+
+class GenerationRequest:
+    """Uma geração na fila (e o estado salvo quando é interrompida)."""
+
+    def __init__(self, params: dict, emit: Callable[[dict], None]):
+        prompt = params.get("prompt")
+        if not isinstance(prompt, str) or not prompt:
+            raise ValueError("campo 'prompt' ausente")
+
+        self.prompt = prompt
+        prefix = params.get("prefix") or ""
+        # Snapshot de prefixo só vale se o prompt realmente começa com ele
+        self.prefix = prefix if prompt.startswith(prefix) else ""
+        self.max_tokens = max(1, int(params.get("max_tokens") or DEFAULT_MAX_TOKENS))
+        self.stop = list(params.get("stop") or [])
+        self.temperature = float(params.get("temperature", 0.1))
+        self.priority = int(params.get("priority", PRIORITY_NORMAL))
+        self.grammar = params.get("grammar") or None
+
+        self.created_at = time.monotonic()
+        self.deadline = self.created_at + float(params.get("timeout") or DEFAULT_TIMEOUT)
+        self.started_at: Optional[float] = None
+
+        self.emit = emit
+        self.cancelled = False
+        self.text = ""
+        self.tokens = 0
+        self.state = None  # snapshot do llama.cpp quando interrompida
+
+    def expired(self) -> bool:
+        return time.monotonic() > self.deadline
+
+    def fail(self, error: str):
+        self.emit({"type": "error", "error": error})
+
+
+class InferenceScheduler:
+    """Fila com prioridades atendida por uma única thread dona do modelo."""
+
+    def __init__(self, preempt: bool = True):
+        """
+        Args:
+            preempt: Interromper gerações quando chega uma requisição mais prioritária
+        """
+        self.preempt = preempt
+        self.llama = None
+        self.prompt_cache: Optional[PromptCache] = None
+
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._current: Optional[GenerationRequest] = None
+
+        self.completed = 0
+        self.failed = 0
+        self.preemptions = 0
+
+        # Gramáticas já carregadas (mesmo texto = mesmo objeto)
+        self._grammars = {}
+
+    @property
+    def ready(self) -> bool:
+        return self.llama is not None
+
+    def start(self, llama, prompt_cache: PromptCache):
+        """Começa a atender a fila (requisições que chegaram antes esperam o modelo)"""
+        self.llama = llama
+        self.prompt_cache = prompt_cache
+        threading.Thread(target=self._run, name="llm-inference", daemon=True).start()
+
+    def submit(self, request: GenerationRequest):
+        with self._cond:
+            heapq.heappush(self._heap, (request.priority, next(self._seq), request))
+            self._cond.notify()
+
+    def _next(self) -> GenerationRequest:
+        with self._cond:
+            while not self._heap:
+                self._cond.wait()
+            return heapq.heappop(self._heap)[2]
+
+    def _grammar(self, grammar: Optional[str]):
+        if grammar is None:
+            return None
+        if grammar not in self._grammars:
+            from llama_cpp import LlamaGrammar
+            self._grammars[grammar] = LlamaGrammar.from_string(grammar, verbose=False)
+        return self._grammars[grammar]
+
+    def _higher_priority_waiting(self, request: GenerationRequest) -> bool:
+        # Requisições canceladas (cliente desconectou) ainda na fila não interrompem ninguém
+        with self._cond:
+            return any(priority < request.priority and not waiting.cancelled
+                       for priority, _, waiting in self._heap)
+
+    def _run(self):
+        while True:
+            request = self._next()
+            if request.cancelled:
+                continue
+            if request.expired():
+                self.failed += 1
+                request.fail("tempo esgotado na fila do servidor LLM")
+                continue
+
+            self._current = request
+            try:
+                self._generate(request)
+            except Exception as e:
+                self.failed += 1
+                request.fail(f"erro na geração: {e}")
+            finally:
+                self._current = None
+
+    def _generate(self, request: GenerationRequest):
+        if request.started_at is None:
+            request.started_at = time.monotonic()
+
+        if request.state is not None:
+            # Retomando: o contexto volta ao ponto em que a geração parou
+            self.llama.load_state(request.state)
+            request.state = None
+            context = nullcontext()
+        else:
+            context = self.prompt_cache.prefix(request.prefix)
+
+        with context:
+            finished = self._stream(request)
+
+        if finished:
+            self.completed += 1
+            now = time.monotonic()
+            request.emit({
+                "type": "done",
+                "text": request.text,
+                "tokens": request.tokens,
+                "queue_ms": round((request.started_at - request.created_at) * 1000, 1),
+                "total_ms": round((now - request.created_at) * 1000, 1),
+            })
+
+    def _stream(self, request: GenerationRequest) -> bool:
+        """
+        Gera até terminar, expirar ou ser interrompida
+
+        Returns:
+            True se a geração terminou (False = descartada ou de volta à fila)
+        """
+        # O prefixo já avaliado (prompt + texto gerado até aqui) é reaproveitado pelo llama.cpp
+        completion = self.llama.create_completion(
+            request.prompt + request.text,
+            max_tokens=request.max_tokens - request.tokens,
+            stop=request.stop,
+            temperature=request.temperature,
+            grammar=self._grammar(request.grammar),
+            stream=True,
+            **SAMPLING,
+        )
+        try:
+            for chunk in completion:
+                piece = chunk["choices"][0]["text"]
+                request.tokens += 1  # aproximado: um trecho pode juntar mais de um token
+                if piece:
+                    request.text += piece
+                    request.emit({"type": "token", "text": piece})
+
+                if request.cancelled:
+                    return False
+                if request.expired():
+                    self.failed += 1
+                    request.fail("tempo esgotado gerando a resposta")
+                    return False
+                if self.preempt and request.grammar is None and request.tokens < request.max_tokens and \
+                        self._higher_priority_waiting(request):
+                    completion.close()
+                    request.state = save_snapshot(self.llama)
+                    self.preemptions += 1
+                    self.submit(request)
+                    return False
+        finally:
+            completion.close()
+        return True
+
+    def stats(self) -> dict:
+        with self._cond:
+            queued = len(self._heap)
+        current = self._current
+        return {
+            "ready": self.ready,
+            "queued": queued,
+            "busy": current is not None,
+            "current_priority": current.priority if current is not None else None,
+            "completed": self.completed,
+            "failed": self.failed,
+            "preemptions": self.preemptions,
+            "prompt_cache": self.prompt_cache.stats() if self.prompt_cache else None,
+        }
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Uma conexão = uma requisição; as respostas saem conforme a thread de inferência gera."""
+
+    def _send(self, message: dict) -> bool:
+        try:
+            self.wfile.write((json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8"))
+            self.wfile.flush()
+            return True
+        except OSError:
+            return False
+
+    def _peer_closed(self) -> bool:
+        """O cliente fechou a conexão? (EOF sem consumir dados)"""
+        try:
+            readable, _, _ = select.select([self.connection], [], [], 0)
+            if not readable:
+                return False
+            return self.connection.recv(1, socket.MSG_PEEK) == b""
+        except OSError:
+            return True
+
+    def handle(self):
+        scheduler: InferenceScheduler = self.server.scheduler
+
+        try:
+            params = json.loads(self.rfile.readline())
+        except ValueError as e:
+            self._send({"type": "error", "error": f"requisição inválida: {e}"})
+            return
+
+        op = params.get("op", "generate")
+        if op == "status":
+            self._send({"type": "status", "model": os.path.basename(LLM_PATH), **scheduler.stats()})
+            return
+        if op != "generate":
+            self._send({"type": "error", "error": f"operação desconhecida: {op}"})
+            return
+
+        # A thread de inferência só enfileira mensagens: um cliente lento não a bloqueia
+        messages = queue.Queue()
+        try:
+            request = GenerationRequest(params, messages.put)
+        except (TypeError, ValueError) as e:
+            self._send({"type": "error", "error": f"requisição inválida: {e}"})
+            return
+        scheduler.submit(request)
+
+        while True:
+            try:
+                message = messages.get(timeout=DISCONNECT_POLL_INTERVAL)
+            except queue.Empty:
+                # Sem tokens (na fila ou avaliando o prompt): descarta se o cliente já foi embora
+                if self._peer_closed():
+                    request.cancelled = True
+                    return
+                continue
+            if not self._send(message):
+                request.cancelled = True  # cliente desconectou: descarta na próxima oportunidade
+                return
+            if message["type"] in ("done", "error"):
+                return
+
+
+class LLMServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, scheduler: InferenceScheduler):
+        self.scheduler = scheduler
+        super().__init__(socket_path, _RequestHandler)
+
+
+def _socket_in_use(socket_path: str) -> bool:
+    """Há um servidor vivo atendendo nesse socket?"""
+    if not os.path.exists(socket_path):
+        return False
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+def main():
+    if _socket_in_use(LLM_SERVER_SOCKET):
+        print(f"✅ Servidor LLM já em execução em {LLM_SERVER_SOCKET}")
+        return
+    if os.path.exists(LLM_SERVER_SOCKET):
+        os.unlink(LLM_SERVER_SOCKET)  # socket de um processo que morreu
+
+    if not os.path.exists(LLM_PATH):
+        print(f"❌ Modelo LLM não encontrado em: {LLM_PATH}")
+        sys.exit(1)
+
+    # O socket abre antes do modelo carregar: clientes veem "ready": false e aguardam
+    scheduler = InferenceScheduler(preempt=LLM_PREEMPT)
+    server = LLMServer(LLM_SERVER_SOCKET, scheduler)
+    threading.Thread(target=server.serve_forever, name="llm-server", daemon=True).start()
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+
+    try:
+        from llama_cpp import Llama
+
+        print(f"⏳ Carregando modelo: {LLM_PATH}")
+        llama = Llama(
+            model_path=LLM_PATH,
+            n_ctx=LLM_N_CTX,
+            n_gpu_layers=0,
+            n_batch=512,
+            n_threads=LLM_THREADS or None,
+            verbose=False
+        )
+        scheduler.start(llama, PromptCache(llama, cache_dir=PROMPT_CACHE_DIR))
+        print(f"✅ Servidor LLM pronto em {LLM_SERVER_SOCKET}")
+
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(LLM_SERVER_SOCKET):
+            os.unlink(LLM_SERVER_SOCKET)
+
+
+if __name__ == "__main__":
+    main()
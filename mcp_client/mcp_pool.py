@@ -0,0 +1,215 @@
+"""
+Pool de Sessões MCP - Sessões persistentes com o servidor de transparência
+
+Mantém um pequeno conjunto de processos do servidor MCP vivos entre os
+reruns do Streamlit. Cada sessão roda em um event loop dedicado (thread
+própria), de modo que a latência por pergunta passa a ser apenas o tempo
+da ferramenta, e não o tempo de subir o venv, o Python e os modelos.
+"""
+
+import asyncio
+import atexit
+import threading
+from typing import Any, Optional
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+
+
+class _PooledSession:
+    """Uma sessão MCP de longa duração ligada a um processo do servidor."""
+
+    def __init__(self, server_params: StdioServerParameters, slot_id: int):
+        self.server_params = server_params
+        self.slot_id = slot_id
+        self.session: Optional[ClientSession] = None
+        self.error: Optional[BaseException] = None
+        self._task: Optional[asyncio.Task] = None
+        self._ready: Optional[asyncio.Event] = None
+        self._stop: Optional[asyncio.Event] = None
+
+    def is_alive(self) -> bool:
+        return (
+            self.session is not None
+            and self._task is not None
+            and not self._task.done()
+        )
+
+    async def start(self):
+        """Sobe o processo do servidor e inicializa a sessão."""
+        self.error = None
+        self._ready = asyncio.Event()
+        self._stop = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        await self._ready.wait()
+
+        if self.session is None:
+            raise RuntimeError(f"Falha ao iniciar sessão MCP #{self.slot_id}: {self.error}")
+
+    async def _run(self):
+        # Os context managers do stdio_client precisam abrir e fechar na mesma task
+        try:
+            async with stdio_client(self.server_params) as (read, write):
+                async with ClientSession(read, write) as session:
+                    await session.initialize()
+                    self.session = session
+                    self._ready.set()
+                    await self._stop.wait()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.session = None
+            self._ready.set()
+
+    async def stop(self, timeout: float = 5.0):
+        """Encerra a sessão e o processo do servidor."""
+        if self._task is None:
+            return
+
+        self._stop.set()
+        try:
+            await asyncio.wait_for(self._task, timeout=timeout)
+        except (asyncio.TimeoutError, Exception):
+            self._task.cancel()
+        finally:
+            self._task = None
+            self.session = None
+
+    async def restart(self):
+        print(f"♻️  Reiniciando sessão MCP #{self.slot_id}...")
+        await self.stop()
+        await self.start()
+
+
+class MCPSessionPool:
+    """
+    Pool de sessões MCP compartilhado entre os reruns do Streamlit.
+
+    Todas as sessões vivem em um event loop próprio rodando em uma thread
+    daemon. As chamadas vindas de outros loops (ex: asyncio.run do
+    Streamlit) são encaminhadas via run_coroutine_threadsafe.
+    """
+
+    def __init__(
+        self,
+        server_script: str,
+        size: int = 2,
+        call_timeout: float = 180.0,
+        health_interval: float = 30.0,
+        env: Optional[dict] = None
+    ):
+        """
+        Args:
+            server_script: Script que inicia o servidor MCP via stdio
+            size: Número de processos do servidor mantidos vivos
+            call_timeout: Tempo máximo (s) de uma chamada de ferramenta
+            health_interval: Intervalo (s) entre health checks (ping)
+            env: Variáveis de ambiente para o processo do servidor
+        """
+        self.server_params = StdioServerParameters(command=server_script, args=[], env=env)
+        self.size = max(1, size)
+        self.call_timeout = call_timeout
+        self.health_interval = health_interval
+
+        self._slots = [_PooledSession(self.server_params, i) for i in range(self.size)]
+        self._available: Optional[asyncio.Queue] = None
+        self._health_task: Optional[asyncio.Task] = None
+        self._closed = False
+
+        # Event loop dedicado ao pool
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever,
+            name="mcp-session-pool",
+            daemon=True
+        )
+        self._thread.start()
+
+        self._submit(self._start()).result()
+        atexit.register(self.close)
+
+    def _submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    async def _start(self):
+        self._available = asyncio.Queue()
+
+        for slot in self._slots:
+            try:
+                await slot.start()
+                print(f"✅ Sessão MCP #{slot.slot_id} pronta")
+            except Exception as e:
+                # A sessão será recriada na primeira chamada que usá-la
+                print(f"⚠️  {e}")
+            self._available.put_nowait(slot)
+
+        self._health_task = asyncio.create_task(self._health_loop())
+
+    async def _health_loop(self):
+        """Faz ping periódico nas sessões ociosas e recria as que morreram."""
+        while True:
+            await asyncio.sleep(self.health_interval)
+
+            for _ in range(self._available.qsize()):
+                slot = self._available.get_nowait()
+                try:
+                    if not slot.is_alive():
+                        await slot.restart()
+                    else:
+                        await asyncio.wait_for(slot.session.send_ping(), timeout=10)
+                except Exception as e:
+                    print(f"⚠️  Health check falhou na sessão #{slot.slot_id}: {e}")
+                    try:
+                        await slot.restart()
+                    except Exception as restart_error:
+                        print(f"⚠️  {restart_error}")
+                finally:
+                    self._available.put_nowait(slot)
+
+    async def _call_tool(self, name: str, arguments: dict):
+        slot = await self._available.get()
+        try:
+            if not slot.is_alive():
+                await slot.restart()
+
+            try:
+                return await asyncio.wait_for(
+                    slot.session.call_tool(name, arguments),
+                    timeout=self.call_timeout
+                )
+            except Exception:
+                # Sessão em estado desconhecido (timeout, pipe quebrado...): recria
+                await slot.stop()
+                raise
+        finally:
+            self._available.put_nowait(slot)
+
+    async def acall_tool(self, name: str, arguments: dict) -> Any:
+        """Chama uma ferramenta MCP a partir de qualquer event loop."""
+        if self._closed:
+            raise RuntimeError("Pool de sessões MCP já foi encerrado")
+        return await asyncio.wrap_future(self._submit(self._call_tool(name, arguments)))
+
+    def call_tool(self, name: str, arguments: dict) -> Any:
+        """Versão síncrona de acall_tool."""
+        if self._closed:
+            raise RuntimeError("Pool de sessões MCP já foi encerrado")
+        return self._submit(self._call_tool(name, arguments)).result()
+
+    async def _shutdown(self):
+        if self._health_task:
+            self._health_task.cancel()
+        for slot in self._slots:
+            await slot.stop()
+
+    def close(self):
+        """Encerra todas as sessões e o event loop do pool."""
+        if self._closed:
+            return
+        self._closed = True
+
+        try:
+            self._submit(self._shutdown()).result(timeout=15)
+        except Exception:
+            pass
+        self._loop.call_soon_threadsafe(self._loop.stop)
@@ -0,0 +1,182 @@
+"""
+Cache de Prefixo de Prompt - Snapshots do estado (KV cache) do llama.cpp
+
+Os prompts do chat são montados como prefixo fixo (instruções, schema,
+exemplos few-shot) + sufixo dinâmico (pergunta, dados). O prefixo é
+avaliado uma única vez: o estado do llama.cpp logo após ele (KV cache +
+tokens) é salvo em memória e, opcionalmente, em disco. Antes de cada
+chamada o snapshot é restaurado, e o casamento de prefixo do próprio
+llama-cpp-python (Llama.generate) avalia só os tokens do sufixo.
+
+Uso:
+    cache = PromptCache(llm.client, cache_dir="...")
+    with cache.prefix(SQL_PROMPT_PREFIX):
+        llm.invoke(SQL_PROMPT_PREFIX + sufixo)
+
+O lock do `prefix` também serializa o uso do modelo (um único contexto
+llama.cpp compartilhado entre as sessões do Streamlit).
+"""
+
+import hashlib
+import os
+import pickle
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+SNAPSHOT_FORMAT = 1
+
+
+def save_snapshot(llama):
+    """
+    Llama.save_state sem a matriz de logits inteira
+
+    Sem logits_all os scores não são usados na amostragem; guardar uma linha
+    só evita copiar n_tokens x n_vocab floats a cada restauração.
+    """
+    state = llama.save_state()
+    if not llama.context_params.logits_all and len(state.scores):
+        state.scores = state.scores[-1:].copy()
+    return state
+
+
+class PromptCache:
+    """Snapshots do estado do llama.cpp por prefixo de prompt."""
+
+    def __init__(self, llama, cache_dir: Optional[str] = None):
+        """
+        Args:
+            llama: Instância llama_cpp.Llama (LlamaCpp.client no LangChain)
+            cache_dir: Diretório para persistir os snapshots (None = só memória)
+        """
+        self.llama = llama
+        self.cache_dir = cache_dir
+        self.enabled = True
+
+        self._lock = threading.RLock()
+        self._states: Dict[str, object] = {}
+        self._tokens: Dict[str, List[int]] = {}
+
+        self.restores = 0
+        self.reuses = 0
+        self.evaluations = 0
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _model_id(self) -> str:
+        """Identifica modelo + contexto (snapshot só vale para o mesmo modelo/n_ctx)"""
+        import llama_cpp
+
+        model_path = getattr(self.llama, "model_path", "")
+        try:
+            stat = os.stat(model_path)
+            file_id = f"{stat.st_size}:{int(stat.st_mtime)}"
+        except OSError:
+            file_id = ""
+        return f"{os.path.abspath(model_path)}|{file_id}|{self.llama.n_ctx()}|{llama_cpp.__version__}"
+
+    def _key(self, prefix: str) -> str:
+        digest = hashlib.sha256(f"{SNAPSHOT_FORMAT}|{self._model_id()}".encode("utf-8"))
+        digest.update(b"\x00")
+        digest.update(prefix.encode("utf-8"))
+        return digest.hexdigest()[:32]
+
+    def _tokenize(self, prefix: str) -> List[int]:
+        # Mesma tokenização do create_completion (BOS + tokens especiais)
+        return self.llama.tokenize(prefix.encode("utf-8"), special=True)
+
+    def _evaluate(self, tokens: List[int]):
+        """Avalia o prefixo do zero e tira o snapshot do estado"""
+        self.llama.reset()
+        self.llama.eval(tokens)
+        state = save_snapshot(self.llama)
+        self.evaluations += 1
+        return state
+
+    def _disk_path(self, key: str) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        return os.path.join(self.cache_dir, f"{key}.state")
+
+    def _load_from_disk(self, key: str, tokens: List[int]):
+        path = self._disk_path(key)
+        if path is None or not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                data = pickle.load(f)
+            if data.get("format") != SNAPSHOT_FORMAT or data.get("tokens") != tokens:
+                return None
+            return data["state"]
+        except Exception as e:
+            print(f"⚠️  Snapshot de prompt inválido ({path}): {e}")
+            return None
+
+    def _save_to_disk(self, key: str, tokens: List[int], state):
+        path = self._disk_path(key)
+        if path is None:
+            return
+        try:
+            # Escrita atômica: outro processo nunca lê um arquivo pela metade
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump({"format": SNAPSHOT_FORMAT, "tokens": tokens, "state": state}, f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"⚠️  Não foi possível salvar o snapshot de prompt: {e}")
+
+    def _restore(self, prefix: str):
+        key = self._key(prefix)
+        tokens = self._tokens.get(key)
+        if tokens is None:
+            tokens = self._tokenize(prefix)
+            self._tokens[key] = tokens
+
+        # O contexto já começa com o prefixo (chamada anterior usou o mesmo): nada a fazer
+        n_tokens = len(tokens)
+        if self.llama.n_tokens >= n_tokens and self.llama.input_ids[:n_tokens].tolist() == tokens:
+            self.reuses += 1
+            return
+
+        state = self._states.get(key)
+        if state is None:
+            state = self._load_from_disk(key, tokens)
+            if state is None:
+                state = self._evaluate(tokens)
+                self._save_to_disk(key, tokens, state)
+                self._states[key] = state
+                return  # o contexto já está exatamente no estado do snapshot
+            self._states[key] = state
+
+        self.llama.load_state(state)
+        self.restores += 1
+
+    @contextmanager
+    def prefix(self, prefix: str):
+        """
+        Deixa o contexto do llama.cpp no estado logo após `prefix`
+
+        O prompt passado ao modelo dentro do bloco deve começar com `prefix`.
+        Em caso de erro o cache é desligado e as chamadas seguem normalmente
+        (avaliando o prompt inteiro).
+        """
+        with self._lock:
+            if self.enabled and prefix:
+                try:
+                    self._restore(prefix)
+                except Exception as e:
+                    print(f"⚠️  Cache de prefixo desativado: {e}")
+                    self.enabled = False
+                    self.llama.reset()
+            yield
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "prefixes": len(self._states),
+            "evaluations": self.evaluations,
+            "restores": self.restores,
+            "reuses": self.reuses,
+        }
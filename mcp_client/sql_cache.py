@@ -0,0 +1,451 @@
+"""
+Cache Semântico de SQL - Pergunta em linguagem natural → SQL gerado pelo LLM
+
+Perguntas que o parse_simple_query não entende vão para o LLM, e variações
+da mesma pergunta ("top 10 deputados por valor pago", "10 parlamentares
+que mais receberam") geram praticamente o mesmo SQL a cada vez. Este cache
+guarda o SQL de cada pergunta cuja execução deu certo e o devolve sem
+passar pelo LLM.
+
+Busca em dois passos:
+1. Texto normalizado (sem acentos, pontuação e caixa): acerto exato.
+2. Vizinho mais próximo por similaridade de cosseno entre embeddings de
+   sentença (modelo pequeno, multilíngue), acima de um limiar.
+
+Similaridade alta não basta: "top 10" e "top 20", "região sul" e "região
+norte" ficam muito próximos no espaço de embeddings e geram SQL diferente.
+Um candidato semântico só é aceito se as duas perguntas têm os mesmos
+números, os mesmos termos-chave (KEY_TERMS: agrupamento, tipo de valor,
+ordem, região, UF, função) e se as palavras dos literais do SQL em cache
+('%Saúde%', 'Sul') aparecem na pergunta nova.
+
+Só entram no cache SQLs que executaram sem erro; um SQL do cache que falha
+é removido (com todas as perguntas que apontavam para ele). O cache é
+persistido em JSON (escrita atômica), com os embeddings em float16. A
+gravação é agrupada: alterações seguidas viram uma escrita só, SAVE_DELAY
+segundos depois da primeira (e uma última na saída do processo).
+
+O modelo de embeddings carrega em background (warm_up). Até ele e os
+embeddings das entradas ficarem prontos, a busca é só por texto: uma
+pergunta nunca espera o download/carga do modelo.
+"""
+
+import atexit
+import base64
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+CACHE_FORMAT = 1
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+SAVE_DELAY = 5.0
+
+# Termos que mudam o SQL: (prefixos das palavras, termo canônico)
+KEY_TERMS = (
+    # Agrupamento
+    (("parlamentar", "deputad", "senador", "autor", "autora", "bancada"), "autor"),
+    (("municip", "cidade"), "municipio"),
+    (("estado", "uf"), "uf"),
+    (("regiao", "regioes"), "regiao"),
+    (("funcao", "funcoes", "area"), "funcao"),
+    # Tipo de valor
+    (("pago", "paga", "pagament", "receb"), "pago"),
+    (("empenh",), "empenhado"),
+    (("liquid",), "liquidado"),
+    # Agregação e ordem
+    (("quantas", "quantos", "quantidade", "numero", "contagem"), "contagem"),
+    (("media", "medio"), "media"),
+    (("menos", "menor", "menores", "pior", "piores"), "crescente"),
+    # Regiões
+    (("norte",), "norte"),
+    (("nordeste",), "nordeste"),
+    (("sul",), "sul"),
+    (("sudeste",), "sudeste"),
+    (("centro",), "centro-oeste"),
+    # Funções de governo
+    (("saude",), "saude"),
+    (("educac",), "educacao"),
+    (("assistenc",), "assistencia"),
+    (("agricult",), "agricultura"),
+    (("urbanism",), "urbanismo"),
+    (("seguranc",), "seguranca"),
+    (("cultura",), "cultura"),
+    (("esport", "desport"), "desporto"),
+    (("transport",), "transporte"),
+    (("turism",), "turismo"),
+    (("saneament",), "saneamento"),
+    (("defesa",), "defesa"),
+)
+
+_REGIONS = frozenset({"norte", "nordeste", "sul", "sudeste", "centro-oeste"})
+
+# Siglas de UF (sem "se", que é palavra comum em português)
+UF_CODES = frozenset(
+    "ac al ap am ba ce df es go ma mt ms mg pa pb pr pe pi rj rn rs ro rr sc sp to".split()
+)
+
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)*")
+_LITERAL_RE = re.compile(r"'((?:[^']|'')*)'")
+_NON_WORD_RE = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_question(question: str) -> str:
+    """Minúsculas, sem acentos e sem pontuação, espaços colapsados"""
+    text = unicodedata.normalize("NFKD", question.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(_NON_WORD_RE.sub(" ", text).split())
+
+
+def question_numbers(question: str) -> Tuple[str, ...]:
+    """Números citados na pergunta (ordenados; "1.000" e "1000" são o mesmo número)"""
+    return tuple(sorted(re.sub(r"[.,]", "", n) for n in _NUMBER_RE.findall(question)))
+
+
+def key_terms(normalized: str) -> frozenset:
+    """Termos canônicos (KEY_TERMS e siglas de UF) presentes na pergunta normalizada"""
+    terms = set()
+    for word in normalized.split():
+        if word in UF_CODES:
+            terms.add(f"uf:{word}")
+        for prefixes, term in KEY_TERMS:
+            if word.startswith(prefixes):
+                terms.add(term)
+    # "região sul" é filtro, não agrupamento ("por região")
+    if terms & _REGIONS:
+        terms.discard("regiao")
+    return frozenset(terms)
+
+
+def literal_words(sql: str) -> frozenset:
+    """Palavras dos literais de texto do SQL ('%Saúde%' → saude)"""
+    words = set()
+    for literal in _LITERAL_RE.findall(sql):
+        words.update(word for word in normalize_question(literal).split() if len(word) > 1)
+    return frozenset(words)
+
+
+class SQLCacheHit(NamedTuple):
+    sql: str
+    question: str   # pergunta em cache que casou
+    score: float    # 1.0 = texto normalizado idêntico
+
+
+class SQLCache:
+    """Cache persistente pergunta → SQL com busca por texto e por embeddings."""
+
+    def __init__(self, path: Optional[str] = None, embedding_model: str = DEFAULT_EMBEDDING_MODEL,
+                 threshold: float = 0.88, max_entries: int = 2000, save_delay: float = SAVE_DELAY):
+        """
+        Args:
+            path: Arquivo JSON de persistência (None = só memória)
+            embedding_model: Modelo sentence-transformers (None/"" = só texto normalizado)
+            threshold: Similaridade mínima (cosseno) de um acerto semântico
+            max_entries: Número máximo de perguntas (remove as usadas há mais tempo)
+            save_delay: Segundos entre a primeira alteração e a gravação (0 = grava na hora)
+        """
+        self.path = path
+        self.embedding_model = embedding_model or None
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.save_delay = save_delay
+
+        self._lock = threading.Lock()
+        self._embedder_lock = threading.Lock()
+        self._model = None
+        self.semantic = self.embedding_model is not None
+        # Modelo carregado e embeddings de todas as entradas calculados (busca semântica liberada)
+        self._ready = threading.Event()
+
+        # Entradas: question, sql, successes, last_used (+ campos derivados, não persistidos)
+        self._entries: List[dict] = []
+        self._by_text: Dict[str, int] = {}
+        self._embeddings: Optional[np.ndarray] = None  # (entradas, dim) float32, linhas normalizadas
+        self._dirty = False
+        self._save_timer: Optional[threading.Timer] = None
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.rejected = 0
+        self.misses = 0
+        self.invalidations = 0
+
+        if path:
+            self._load()
+            atexit.register(self.flush)
+
+    def _load_model(self) -> bool:
+        with self._embedder_lock:
+            if self._model is None and self.semantic:
+                try:
+                    # Import tardio: sem sentence-transformers o cache funciona só por texto
+                    from sentence_transformers import SentenceTransformer
+
+                    print(f"⏳ Carregando modelo de embeddings do cache de SQL: {self.embedding_model}")
+                    self._model = SentenceTransformer(self.embedding_model, device="cpu")
+                except Exception as e:
+                    print(f"⚠️  Cache de SQL só por texto (embeddings indisponíveis: {e})")
+                    self.semantic = False
+            return self._model is not None
+
+    def _encode(self, questions: List[str]) -> np.ndarray:
+        embeddings = self._model.encode(
+            questions, batch_size=32, normalize_embeddings=True, show_progress_bar=False
+        )
+        return np.asarray(embeddings, dtype=np.float32)
+
+    def warm_up(self):
+        """Carrega o modelo e calcula os embeddings que faltam (chamar em background)"""
+        if not self._load_model():
+            return
+        while True:
+            with self._lock:
+                questions = [entry["question"] for entry in self._entries]
+                if self._embeddings is not None and len(self._embeddings) == len(questions):
+                    self._ready.set()
+                    return
+            if questions:
+                embeddings = self._encode(questions)
+            else:
+                embeddings = self._encode(["aquecimento do modelo"])[:0]
+            with self._lock:
+                # Só aplica se nada mudou enquanto calculava (senão calcula de novo)
+                if [entry["question"] for entry in self._entries] == questions:
+                    self._embeddings = embeddings
+                    self._ready.set()
+                    return
+
+    @staticmethod
+    def _derive(entry: dict) -> dict:
+        normalized = normalize_question(entry["question"])
+        entry["normalized"] = normalized
+        entry["numbers"] = question_numbers(entry["question"])
+        entry["terms"] = key_terms(normalized)
+        entry["literals"] = literal_words(entry["sql"])
+        return entry
+
+    @staticmethod
+    def _compatible(entry: dict, normalized: str, numbers: Tuple[str, ...], terms: frozenset) -> bool:
+        """Guardas do acerto semântico: mesmos números, mesmos termos-chave, literais presentes"""
+        if entry["numbers"] != numbers or entry["terms"] != terms:
+            return False
+        words = set(normalized.split())
+        return all(any(word.startswith(literal) or literal.startswith(word) for word in words)
+                   for literal in entry["literals"])
+
+    def lookup(self, question: str) -> Optional[SQLCacheHit]:
+        """
+        SQL em cache para a pergunta
+
+        Returns:
+            SQLCacheHit ou None (nenhuma pergunta parecida o bastante)
+        """
+        normalized = normalize_question(question)
+        if not normalized:
+            return None
+
+        with self._lock:
+            row = self._by_text.get(normalized)
+            if row is not None:
+                entry = self._entries[row]
+                entry["last_used"] = time.time()
+                self.exact_hits += 1
+                return SQLCacheHit(entry["sql"], entry["question"], 1.0)
+            if not self._entries:
+                self.misses += 1
+                return None
+
+        # Modelo ainda carregando (ou indisponível): fica só o acerto por texto
+        if not self._ready.is_set():
+            with self._lock:
+                self.misses += 1
+            return None
+
+        query = self._encode([question])[0]
+        numbers = question_numbers(question)
+        terms = key_terms(normalized)
+
+        with self._lock:
+            if self._embeddings is None or len(self._embeddings) != len(self._entries):
+                self.misses += 1
+                return None
+
+            scores = self._embeddings @ query
+            candidates = np.flatnonzero(scores >= self.threshold)
+            for row in candidates[np.argsort(-scores[candidates], kind="stable")]:
+                entry = self._entries[row]
+                if self._compatible(entry, normalized, numbers, terms):
+                    entry["last_used"] = time.time()
+                    self.semantic_hits += 1
+                    return SQLCacheHit(entry["sql"], entry["question"], float(scores[row]))
+
+            if len(candidates):
+                self.rejected += 1
+            self.misses += 1
+            return None
+
+    def _rebuild_index(self):
+        self._by_text = {entry["normalized"]: row for row, entry in enumerate(self._entries)}
+
+    def store(self, question: str, sql: str):
+        """Registra um SQL que executou com sucesso para a pergunta"""
+        sql = sql.strip()
+        normalized = normalize_question(question)
+        if not normalized or not sql:
+            return
+
+        # Embedding calculado fora do lock; antes do aquecimento terminar o warm_up calcula tudo
+        embedding = None
+        if self._ready.is_set():
+            embedding = self._encode([question])[0]
+
+        with self._lock:
+            row = self._by_text.get(normalized)
+            if row is not None:
+                entry = self._entries[row]
+                entry["successes"] = entry["successes"] + 1 if entry["sql"] == sql else 1
+                entry["sql"] = sql
+                entry["literals"] = literal_words(sql)
+                entry["last_used"] = time.time()
+            else:
+                self._entries.append(self._derive({
+                    "question": question, "sql": sql, "successes": 1, "last_used": time.time(),
+                }))
+                self._by_text[normalized] = len(self._entries) - 1
+                if embedding is not None:
+                    self._embeddings = np.vstack([self._embeddings, embedding[None, :]])
+                else:
+                    self._embeddings = None  # recalculado pelo warm_up em andamento
+
+                if len(self._entries) > self.max_entries:
+                    self._evict()
+
+        self._schedule_save()
+
+    def _evict(self):
+        """Remove as entradas usadas há mais tempo (com o lock)"""
+        keep = sorted(range(len(self._entries)), key=lambda row: self._entries[row]["last_used"],
+                      reverse=True)[:self.max_entries]
+        keep.sort()
+        self._entries = [self._entries[row] for row in keep]
+        if self._embeddings is not None:
+            self._embeddings = self._embeddings[keep]
+        self._rebuild_index()
+
+    def invalidate(self, sql: str):
+        """Remove um SQL que falhou ao executar (e todas as perguntas que o usavam)"""
+        sql = sql.strip()
+        with self._lock:
+            keep = [row for row, entry in enumerate(self._entries) if entry["sql"] != sql]
+            if len(keep) == len(self._entries):
+                return
+            self._entries = [self._entries[row] for row in keep]
+            if self._embeddings is not None:
+                self._embeddings = self._embeddings[keep]
+            self._rebuild_index()
+            self.invalidations += 1
+
+        self._schedule_save()
+
+    def _schedule_save(self):
+        """Agenda a gravação: alterações dentro de save_delay viram uma escrita só"""
+        if not self.path:
+            return
+        if self.save_delay <= 0:
+            self.save()
+            return
+        with self._lock:
+            self._dirty = True
+            if self._save_timer is not None:
+                return
+            self._save_timer = threading.Timer(self.save_delay, self._timed_save)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def _timed_save(self):
+        with self._lock:
+            self._save_timer = None
+        self.save()
+
+    def flush(self):
+        """Grava agora as alterações pendentes (chamado também na saída do processo)"""
+        with self._lock:
+            timer, self._save_timer = self._save_timer, None
+            dirty = self._dirty
+        if timer is not None:
+            timer.cancel()
+        if dirty:
+            self.save()
+
+    def save(self):
+        """Persiste em disco (no-op sem path)"""
+        if not self.path:
+            return
+        with self._lock:
+            self._dirty = False
+            embeddings = None
+            if self._embeddings is not None and len(self._embeddings) == len(self._entries):
+                embeddings = base64.b64encode(self._embeddings.astype(np.float16).tobytes()).decode("ascii")
+            state = {
+                "format": CACHE_FORMAT,
+                "embedding_model": self.embedding_model,
+                "entries": [
+                    {key: entry[key] for key in ("question", "sql", "successes", "last_used")}
+                    for entry in self._entries
+                ],
+                "embeddings": embeddings,
+            }
+
+        try:
+            # Escrita atômica: sessões do Streamlit salvam em paralelo
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(state, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"⚠️  Não foi possível salvar o cache de SQL: {e}")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Cache de SQL ignorado ({e})")
+            return
+
+        if state.get("format") != CACHE_FORMAT:
+            return
+
+        self._entries = [self._derive(dict(entry)) for entry in state.get("entries", [])]
+        self._rebuild_index()
+
+        # Embeddings de outro modelo são descartados (recalculados no aquecimento)
+        embeddings = state.get("embeddings")
+        if embeddings and self._entries and state.get("embedding_model") == self.embedding_model:
+            matrix = np.frombuffer(base64.b64decode(embeddings), dtype=np.float16)
+            if matrix.size % len(self._entries) == 0:
+                self._embeddings = matrix.reshape(len(self._entries), -1).astype(np.float32)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            hits = self.exact_hits + self.semantic_hits
+            return {
+                "entries": len(self._entries),
+                "semantic": self.semantic,
+                "ready": self._ready.is_set(),
+                "threshold": self.threshold,
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "rejected": self.rejected,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,133 @@
+"""
+Gramática SQL (GBNF) - Geração de SQL restrita pelo llama.cpp
+
+Em vez de pedir texto livre ao modelo e garimpar o SQL com expressões
+regulares, a geração é restrita por uma gramática GBNF: a cada token o
+llama.cpp só permite continuações válidas. O resultado é sempre um único
+SELECT sobre a tabela emendas_parlamentares, usando apenas as colunas
+conhecidas, terminado em ";". Como nada pode seguir o ";", a geração para
+ali (só o token de fim de texto é permitido), sem tokens desperdiçados.
+
+Subconjunto aceito:
+    SELECT [DISTINCT] itens FROM emendas_parlamentares
+    [WHERE condição] [GROUP BY ...] [HAVING condição] [ORDER BY ...] [LIMIT n];
+
+Itens e condições aceitam colunas, agregações (COUNT/SUM/AVG/MIN/MAX),
+algumas funções escalares, aritmética, literais, comparações, LIKE, IN,
+BETWEEN e IS [NOT] NULL. O WHERE não aceita agregações. Os apelidos (AS
+total) vêm de uma lista fixa (ALIASES) e podem ser usados no ORDER BY e
+no HAVING.
+"""
+
+from typing import Sequence
+
+TABLE = "emendas_parlamentares"
+
+# Colunas da tabela (mesmas do DATABASE_SCHEMA em knowledge_base.py)
+COLUMNS = (
+    "codigo_emenda", "ano_emenda", "tipo_emenda", "codigo_autor", "nome_autor",
+    "numero_emenda", "localidade_gasto", "codigo_municipio_ibge", "municipio",
+    "codigo_uf_ibge", "uf", "regiao", "codigo_funcao", "nome_funcao",
+    "codigo_subfuncao", "nome_subfuncao", "codigo_programa", "nome_programa",
+    "codigo_acao", "nome_acao", "codigo_plano_orcamentario", "nome_plano_orcamentario",
+    "valor_empenhado", "valor_liquidado", "valor_pago", "valor_restos_pagar_inscritos",
+    "valor_restos_pagar_cancelados", "valor_restos_pagar_pagos",
+)
+
+AGGREGATES = ("COUNT", "SUM", "AVG", "MIN", "MAX", "TOTAL")
+FUNCTIONS = ("ROUND", "ABS", "COALESCE", "IFNULL", "UPPER", "LOWER", "LENGTH")
+
+# Apelidos aceitos no AS (e referenciáveis no ORDER BY/HAVING); nomes de coluna também valem
+ALIASES = (
+    "total", "quantidade", "media", "maximo", "minimo", "percentual",
+    "total_pago", "total_empenhado", "total_liquidado", "total_emendas", "total_autores",
+    "quantidade_emendas", "media_por_emenda", "emendas", "autores", "municipios",
+)
+
+_RULES = r"""
+root ::= ws select ws ";"
+
+select ::= "SELECT" sp ("DISTINCT" sp)? select-list sp "FROM" sp table where? group-by? having? order-by? limit?
+select-list ::= "*" | select-item (ws "," ws select-item)*
+select-item ::= expr (sp as sp alias)?
+as ::= "AS" | "as"
+alias ::= alias-name | column
+
+where ::= sp "WHERE" sp row-condition
+group-by ::= sp "GROUP BY" sp group-item (ws "," ws group-item)*
+group-item ::= column
+having ::= sp "HAVING" sp condition
+order-by ::= sp "ORDER BY" sp order-item (ws "," ws order-item)*
+order-item ::= (expr | alias) (sp direction)?
+direction ::= "DESC" | "ASC" | "desc" | "asc"
+limit ::= sp "LIMIT" sp [1-9] [0-9]{0,3}
+
+logic ::= "AND" | "OR"
+cmp ::= "=" | "!=" | "<>" | "<=" | ">=" | "<" | ">"
+
+expr ::= term (ws arith ws term)*
+term ::= aggregate | function | column | literal | "(" ws expr ws ")"
+function ::= function-name "(" ws expr (ws "," ws expr)* ws ")"
+aggregate ::= aggregate-name "(" ws ("*" | ("DISTINCT" sp)? row-expr) ws ")"
+arith ::= "+" | "-" | "*" | "/"
+
+row-expr ::= row-term (ws arith ws row-term)*
+row-term ::= row-function | column | literal | "(" ws row-expr ws ")"
+row-function ::= function-name "(" ws row-expr (ws "," ws row-expr)* ws ")"
+
+literal ::= number | string
+number ::= "-"? [0-9]{1,15} ("." [0-9]{1,6})?
+string ::= "'" ([^'\n] | "''"){0,80} "'"
+
+sp ::= [ \t\n]{1,8}
+ws ::= [ \t\n]{0,8}
+"""
+
+
+def _alternatives(values: Sequence[str]) -> str:
+    return " | ".join(f'"{value}"' for value in values)
+
+
+def _condition_rules(name: str, operand: str) -> str:
+    """Regras de uma condição (AND/OR, NOT, parênteses, comparações) sobre um tipo de operando"""
+    predicate = f"{name}-predicate"
+    comparison = f"{name}-comparison"
+    return "\n".join([
+        f"{name} ::= {predicate} (sp logic sp {predicate})*",
+        f'{predicate} ::= "NOT" sp {predicate} | "(" ws {name} ws ")" | {comparison}',
+        f"{comparison} ::= "
+        f"{operand} ws cmp ws {operand}"
+        f' | {operand} sp ("NOT" sp)? "LIKE" sp string'
+        f' | {operand} sp ("NOT" sp)? "IN" ws "(" ws literal (ws "," ws literal)* ws ")"'
+        f' | {operand} sp ("NOT" sp)? "BETWEEN" sp {operand} sp "AND" sp {operand}'
+        f' | {operand} sp "IS" sp ("NOT" sp)? "NULL"',
+    ])
+
+
+def build_sql_grammar(table: str = TABLE, columns: Sequence[str] = COLUMNS) -> str:
+    """
+    Gramática GBNF de um SELECT sobre uma tabela
+
+    Args:
+        table: Única tabela aceita no FROM
+        columns: Colunas aceitas nas expressões
+
+    Returns:
+        Texto da gramática (regra inicial: root)
+    """
+    return "\n\n".join([
+        _RULES.strip(),
+        # WHERE: só valores por linha; HAVING: agregações e apelidos
+        _condition_rules("row-condition", "row-expr"),
+        _condition_rules("condition", "(expr | alias)"),
+        "\n".join([
+            f'table ::= "{table}"',
+            f"column ::= {_alternatives(columns)}",
+            f"alias-name ::= {_alternatives(ALIASES)}",
+            f"aggregate-name ::= {_alternatives(AGGREGATES)}",
+            f"function-name ::= {_alternatives(FUNCTIONS)}",
+        ]),
+    ]) + "\n"
+
+
+SQL_GRAMMAR = build_sql_grammar()
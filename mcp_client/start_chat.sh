@@ -12,6 +12,17 @@ source "${PROJECT_ROOT}/venv/bin/activate"
 # Exporta variáveis de ambiente
 export DB_SQL_URL="sqlite:///${PROJECT_ROOT}/local_deploy/data/db_transparencia.db"
 
+# Servidor de inferência compartilhado: um único processo carrega o GGUF para todas as sessões
+export LLM_SERVER_SOCKET="${LLM_SERVER_SOCKET:-/tmp/transparencia_llm.sock}"
+if [ "${LLM_SERVER:-1}" = "1" ]; then
+    # Se já houver um servidor vivo no socket, o novo processo apenas encerra
+    python3 "${PROJECT_ROOT}/mcp_client/llm_server.py" >> "${LLM_SERVER_LOG:-/tmp/transparencia_llm.log}" 2>&1 &
+    for _ in $(seq 1 30); do
+        [ -S "${LLM_SERVER_SOCKET}" ] && break
+        sleep 1
+    done
+fi
+
 # Inicia o Streamlit
 cd "${PROJECT_ROOT}/mcp_client"
 streamlit run chat_app.py --server.port 8504 --server.headless true
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Teste da fila do servidor de inferência (llm_server.InferenceScheduler)
+
+Usa um llama falso (sem modelo): cada token sai a cada TOKEN_INTERVAL, e
+save_state/load_state só registram as chamadas. Confere que:
+    - uma requisição HIGH interrompe uma LOW, que depois continua de onde
+      parou (snapshot restaurado, prompt + texto já gerado)
+    - gerações com gramática nunca são interrompidas
+    - requisições canceladas não geram nada e as expiradas recebem um único
+      erro, com a fila seguindo normalmente
+"""
+
+import sys
+import threading
+import time
+
+import numpy as np
+
+from llm_client import PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL
+from llm_server import GenerationRequest, InferenceScheduler
+from prompt_cache import PromptCache
+
+TOKEN_INTERVAL = 0.01
+WAIT_TIMEOUT = 5.0
+SQL_GRAMMAR = 'root ::= "SELECT"'
+
+
+class FakeState:
+    def __init__(self, tokens: int):
+        self.tokens = tokens
+        self.scores = np.zeros((tokens, 4), dtype=np.single)
+
+
+class FakeContextParams:
+    logits_all = False
+
+
+class FakeLlama:
+    """Só o que o InferenceScheduler usa de llama_cpp.Llama"""
+
+    context_params = FakeContextParams()
+
+    def __init__(self):
+        self.completions = []   # (prompt, max_tokens, grammar)
+        self.closed = 0         # gerações fechadas (fim, cancelamento ou preempção)
+        self.saved = []
+        self.loaded = []
+        self.fail_prompts = set()
+
+    def create_completion(self, prompt, max_tokens, stop, temperature, grammar, stream, **sampling):
+        if prompt in self.fail_prompts:
+            raise RuntimeError("falha simulada")
+        self.completions.append((prompt, max_tokens, grammar))
+        return self._tokens(max_tokens)
+
+    def _tokens(self, max_tokens):
+        try:
+            for _ in range(max_tokens):
+                time.sleep(TOKEN_INTERVAL)
+                yield {"choices": [{"text": "x"}]}
+        finally:
+            self.closed += 1
+
+    def save_state(self):
+        state = FakeState(len(self.completions))
+        self.saved.append(state)
+        return state
+
+    def load_state(self, state):
+        self.loaded.append(state)
+
+
+class Recorder:
+    """emit de uma requisição: guarda as mensagens e avisa quem espera"""
+
+    def __init__(self, name: str, log: list, cond: threading.Condition):
+        self.name = name
+        self.messages = []
+        self._log = log
+        self._cond = cond
+
+    def __call__(self, message: dict):
+        with self._cond:
+            self.messages.append(message)
+            self._log.append((self.name, message["type"]))
+            self._cond.notify_all()
+
+    def count(self, kind: str) -> int:
+        return sum(message["type"] == kind for message in self.messages)
+
+    @property
+    def finished(self) -> bool:
+        return any(message["type"] in ("done", "error") for message in self.messages)
+
+
+class Harness:
+    def __init__(self, preempt: bool = True):
+        self.llama = FakeLlama()
+        self.scheduler = InferenceScheduler(preempt=preempt)
+        # Gramática "carregada" sem llama_cpp: o scheduler só repassa o objeto
+        self.scheduler._grammars[SQL_GRAMMAR] = object()
+        self.log = []
+        self.cond = threading.Condition()
+        self.scheduler.start(self.llama, PromptCache(self.llama))
+
+    def submit(self, name: str, priority: int, max_tokens: int, **params) -> GenerationRequest:
+        recorder = Recorder(name, self.log, self.cond)
+        request = GenerationRequest(
+            dict(params, prompt=f"prompt {name}: ", priority=priority, max_tokens=max_tokens), recorder
+        )
+        request.recorder = recorder
+        self.scheduler.submit(request)
+        return request
+
+    def wait(self, predicate) -> bool:
+        with self.cond:
+            return self.cond.wait_for(predicate, timeout=WAIT_TIMEOUT)
+
+    def done_order(self) -> list:
+        return [name for name, kind in self.log if kind in ("done", "error")]
+
+
+class Checks:
+    def __init__(self):
+        self.failures = 0
+
+    def check(self, description: str, ok: bool, detail: str = ""):
+        self.failures += not ok
+        print(f"{'✅' if ok else '❌'} {description}" + (f" ({detail})" if detail and not ok else ""))
+
+
+def test_preemption(checks: Checks):
+    print("Preempção:")
+    harness = Harness()
+    low = harness.submit("low", PRIORITY_LOW, max_tokens=30)
+    harness.wait(lambda: low.recorder.count("token") >= 3)
+    high = harness.submit("high", PRIORITY_HIGH, max_tokens=3)
+    harness.wait(lambda: low.recorder.finished and high.recorder.finished)
+
+    checks.check("HIGH termina antes da LOW", harness.done_order() == ["high", "low"], str(harness.done_order()))
+    checks.check("uma preempção", harness.scheduler.preemptions == 1, str(harness.scheduler.preemptions))
+    last = low.recorder.messages[-1]
+    checks.check("LOW completa, sem tokens repetidos",
+                 last["type"] == "done" and last["text"] == "x" * 30 and last["tokens"] == 30, str(last))
+    checks.check("snapshot da LOW restaurado na retomada",
+                 len(harness.llama.saved) == 1 and harness.llama.loaded == harness.llama.saved)
+
+    resumed = [(prompt, max_tokens) for prompt, max_tokens, _ in harness.llama.completions if prompt.startswith(low.prompt)]
+    paused_at = len(resumed[1][0]) - len(low.prompt) if len(resumed) == 2 else None
+    checks.check("retomada com prompt + texto gerado e max_tokens restante",
+                 len(resumed) == 2 and resumed[1][0] == low.prompt + "x" * paused_at and resumed[1][1] == 30 - paused_at,
+                 str(resumed))
+    checks.check("gerações fechadas", harness.llama.closed == 3, str(harness.llama.closed))
+
+    # Requisição mais prioritária cancelada na fila não interrompe ninguém
+    harness = Harness()
+    low = harness.submit("low", PRIORITY_LOW, max_tokens=20)
+    harness.wait(lambda: low.recorder.count("token") >= 2)
+    blocker = harness.submit("cancelada", PRIORITY_HIGH, max_tokens=3)
+    blocker.cancelled = True
+    harness.wait(lambda: low.recorder.finished)
+    checks.check("HIGH cancelada na fila não interrompe",
+                 harness.scheduler.preemptions == 0 and not blocker.recorder.messages)
+
+    # Sem preempção: ordem de chegada
+    harness = Harness(preempt=False)
+    low = harness.submit("low", PRIORITY_LOW, max_tokens=10)
+    harness.wait(lambda: low.recorder.count("token") >= 2)
+    high = harness.submit("high", PRIORITY_HIGH, max_tokens=3)
+    harness.wait(lambda: low.recorder.finished and high.recorder.finished)
+    checks.check("preempt=False: LOW termina primeiro", harness.done_order() == ["low", "high"])
+
+
+def test_grammar(checks: Checks):
+    print()
+    print("Gramática:")
+    harness = Harness()
+    sql = harness.submit("sql", PRIORITY_NORMAL, max_tokens=20, grammar=SQL_GRAMMAR)
+    harness.wait(lambda: sql.recorder.count("token") >= 3)
+    high = harness.submit("high", PRIORITY_HIGH, max_tokens=3)
+    harness.wait(lambda: sql.recorder.finished and high.recorder.finished)
+
+    checks.check("geração com gramática não é interrompida",
+                 harness.scheduler.preemptions == 0 and harness.done_order() == ["sql", "high"],
+                 str(harness.done_order()))
+    checks.check("gramática repassada ao create_completion",
+                 harness.llama.completions[0][2] is harness.scheduler._grammars[SQL_GRAMMAR])
+    checks.check("texto completo", sql.recorder.messages[-1].get("text") == "x" * 20)
+
+
+def test_expired_and_cancelled(checks: Checks):
+    print()
+    print("Expiradas e canceladas:")
+    harness = Harness()
+    busy = harness.submit("ocupada", PRIORITY_HIGH, max_tokens=15)
+    harness.wait(lambda: busy.recorder.count("token") >= 1)
+
+    queued_expired = harness.submit("expira-na-fila", PRIORITY_NORMAL, max_tokens=5, timeout=0.01)
+    queued_cancelled = harness.submit("cancelada-na-fila", PRIORITY_NORMAL, max_tokens=5)
+    queued_cancelled.cancelled = True
+    generating_expired = harness.submit("expira-gerando", PRIORITY_NORMAL, max_tokens=1000, timeout=0.5)
+    harness.wait(lambda: generating_expired.recorder.finished)
+
+    errors = queued_expired.recorder.messages
+    checks.check("expirada na fila: um erro, sem tokens",
+                 len(errors) == 1 and errors[0]["type"] == "error" and "fila" in errors[0]["error"], str(errors))
+    checks.check("expirada na fila: create_completion não chamado",
+                 all(not prompt.startswith(queued_expired.prompt) for prompt, _, _ in harness.llama.completions))
+    checks.check("cancelada na fila: nada emitido e nada gerado",
+                 not queued_cancelled.recorder.messages and
+                 all(not prompt.startswith(queued_cancelled.prompt) for prompt, _, _ in harness.llama.completions))
+    last = generating_expired.recorder.messages[-1]
+    checks.check("expirada gerando: termina com um único erro",
+                 generating_expired.recorder.count("error") == 1 and last["type"] == "error"
+                 and "gerando" in last["error"] and generating_expired.recorder.count("done") == 0, str(last))
+
+    # Cancelada no meio da geração (cliente desconectou)
+    cancelled = harness.submit("cancelada-gerando", PRIORITY_NORMAL, max_tokens=1000)
+    harness.wait(lambda: cancelled.recorder.count("token") >= 2)
+    closed_before = harness.llama.closed
+    cancelled.cancelled = True
+    harness.wait(lambda: harness.llama.closed > closed_before)
+    checks.check("cancelada gerando: para sem done/erro e fecha a geração",
+                 not cancelled.recorder.finished and cancelled.recorder.count("token") < 1000)
+
+    # Falha do modelo vira erro da requisição; a fila continua
+    harness.llama.fail_prompts.add("prompt falha: ")
+    failing = harness.submit("falha", PRIORITY_NORMAL, max_tokens=5)
+    after = harness.submit("depois", PRIORITY_NORMAL, max_tokens=2)
+    harness.wait(lambda: failing.recorder.finished and after.recorder.finished)
+    checks.check("erro do modelo: um erro para a requisição",
+                 failing.recorder.messages == [{"type": "error", "error": "erro na geração: falha simulada"}],
+                 str(failing.recorder.messages))
+    checks.check("fila segue depois das falhas", after.recorder.messages[-1]["type"] == "done")
+
+    stats = harness.scheduler.stats()
+    checks.check("estatísticas", stats["failed"] == 3 and stats["completed"] == 2 and stats["queued"] == 0, str(stats))
+
+
+def main():
+    print("="*80)
+    print("TESTE DA FILA DE INFERÊNCIA (llama falso)")
+    print("="*80)
+    print()
+
+    checks = Checks()
+    test_preemption(checks)
+    test_grammar(checks)
+    test_expired_and_cancelled(checks)
+
+    if checks.failures:
+        print(f"\n❌ {checks.failures} verificação(ões) falharam")
+        sys.exit(1)
+    print("\n✅ Prioridades, preempção e descarte de requisições corretos")
+
+
+if __name__ == "__main__":
+    main()
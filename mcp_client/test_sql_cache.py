@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Teste das guardas do cache semântico pergunta → SQL (sql_cache.py)
+
+Não usa o modelo de embeddings:
+    - key_terms / question_numbers / _compatible: "top 10" vs "top 20",
+      "sul" vs "norte", palavras dos literais do SQL
+    - antes do _ready, o lookup só devolve acertos por texto (e nunca chama
+      o modelo)
+    - com um "modelo" que leva toda pergunta ao mesmo vetor (similaridade 1),
+      só as guardas decidem o acerto semântico
+    - a gravação em disco é agrupada (save_delay) e feita no flush
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from sql_cache import SQLCache, key_terms, normalize_question, question_numbers
+
+TOP_AUTORES_SQL = (
+    "SELECT nome_autor, SUM(valor_pago) AS total FROM emendas_parlamentares "
+    "GROUP BY nome_autor ORDER BY total DESC LIMIT 10;"
+)
+SAUDE_SUL_SQL = (
+    "SELECT municipio, SUM(valor_pago) AS total FROM emendas_parlamentares "
+    "WHERE nome_funcao LIKE '%Saúde%' AND regiao = 'Sul' GROUP BY municipio ORDER BY total DESC LIMIT 5;"
+)
+
+
+class ConstantModel:
+    """Embeddings idênticos para qualquer pergunta: toda busca passa do limiar"""
+
+    def encode(self, questions, **kwargs):
+        return np.ones((len(questions), 4), dtype=np.float32) / 2
+
+
+class Checks:
+    def __init__(self):
+        self.failures = 0
+
+    def check(self, description: str, ok: bool, detail: str = ""):
+        self.failures += not ok
+        print(f"{'✅' if ok else '❌'} {description}" + (f" ({detail})" if detail and not ok else ""))
+
+
+def entry(question: str, sql: str) -> dict:
+    return SQLCache._derive({"question": question, "sql": sql})
+
+
+def compatible(cached: dict, question: str) -> bool:
+    normalized = normalize_question(question)
+    return SQLCache._compatible(cached, normalized, question_numbers(question), key_terms(normalized))
+
+
+def test_guards(checks: Checks):
+    print("Termos e números:")
+    checks.check("números normalizados (1.000 == 1000, ordenados)",
+                 question_numbers("top 1.000 em 2023") == ("1000", "2023"))
+    terms = key_terms(normalize_question("Quanto os deputados da região Sul receberam em saúde?"))
+    checks.check("termos-chave: autor, pago, sul, saude", terms == {"autor", "pago", "sul", "saude"}, str(terms))
+    checks.check("'por região' é agrupamento",
+                 "regiao" in key_terms(normalize_question("valor pago por região")))
+    checks.check("sigla de UF vira termo", "uf:sp" in key_terms(normalize_question("emendas em SP")))
+
+    print()
+    print("Compatibilidade (_compatible):")
+    top10 = entry("top 10 deputados por valor pago", TOP_AUTORES_SQL)
+    checks.check("paráfrase com os mesmos números e termos",
+                 compatible(top10, "10 parlamentares que mais receberam pagamentos"))
+    checks.check("top 10 vs top 20", not compatible(top10, "top 20 deputados por valor pago"))
+    checks.check("pago vs empenhado", not compatible(top10, "top 10 deputados por valor empenhado"))
+
+    saude_sul = entry("municípios do sul com mais emendas de saúde pagas", SAUDE_SUL_SQL)
+    checks.check("mesmos filtros", compatible(saude_sul, "cidades do sul que mais receberam em saúde"))
+    checks.check("sul vs norte", not compatible(saude_sul, "municípios do norte com mais emendas de saúde pagas"))
+
+    # Literal do SQL ausente da pergunta (termos-chave iguais por não serem KEY_TERMS)
+    literal = entry("emendas do autor Fulano", "SELECT * FROM emendas_parlamentares WHERE nome_autor LIKE '%Fulano%';")
+    checks.check("literal presente", compatible(literal, "emendas do autor fulano de tal"))
+    checks.check("literal ausente", not compatible(literal, "emendas do autor Beltrano"))
+
+
+def test_lookup_before_ready(checks: Checks):
+    print()
+    print("Lookup antes do modelo ficar pronto:")
+    # Modelo configurado mas nunca carregado: qualquer _encode falharia
+    cache = SQLCache(None, embedding_model="modelo-inexistente")
+    cache.store("top 10 deputados por valor pago", TOP_AUTORES_SQL)
+
+    hit = cache.lookup("Top 10 deputados, por valor pago!")
+    checks.check("acerto por texto normalizado", hit is not None and hit.score == 1.0)
+    try:
+        miss = cache.lookup("10 parlamentares que mais receberam pagamentos")
+        checks.check("paráfrase vira miss sem chamar o modelo", miss is None and cache._model is None)
+    except Exception as e:
+        checks.check("paráfrase vira miss sem chamar o modelo", False, repr(e))
+
+    # Com o "modelo" pronto, só as guardas decidem
+    cache._model = ConstantModel()
+    cache.warm_up()
+    cache.store("municípios do sul com mais emendas de saúde pagas", SAUDE_SUL_SQL)
+    hit = cache.lookup("10 parlamentares que mais receberam pagamentos")
+    checks.check("depois do _ready: acerto semântico", hit is not None and hit.sql == TOP_AUTORES_SQL)
+    checks.check("depois do _ready: top 20 rejeitado", cache.lookup("top 20 deputados por valor pago") is None)
+    checks.check("depois do _ready: norte rejeitado",
+                 cache.lookup("municípios do norte com mais emendas de saúde pagas") is None)
+    stats = cache.stats()
+    checks.check("estatísticas", stats["exact_hits"] == 1 and stats["semantic_hits"] == 1 and stats["rejected"] == 2,
+                 str(stats))
+
+
+def test_debounced_save(checks: Checks):
+    print()
+    print("Gravação agrupada:")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "sql_cache.json")
+        cache = SQLCache(path, embedding_model=None, save_delay=0.3)
+        for n in (10, 20, 30):
+            cache.store(f"top {n} deputados por valor pago", TOP_AUTORES_SQL.replace("10", str(n)))
+        checks.check("nada gravado logo após os stores", not os.path.exists(path))
+
+        time.sleep(0.6)
+        with open(path, encoding="utf-8") as f:
+            checks.check("uma gravação com as 3 entradas após o save_delay", len(json.load(f)["entries"]) == 3)
+
+        mtime = os.stat(path).st_mtime_ns
+        cache.flush()
+        checks.check("flush sem alterações não regrava", os.stat(path).st_mtime_ns == mtime)
+
+        cache.invalidate(TOP_AUTORES_SQL)
+        cache.flush()
+        reloaded = SQLCache(path, embedding_model=None)
+        checks.check("flush grava a invalidação pendente", reloaded.stats()["entries"] == 2)
+
+
+def main():
+    print("="*80)
+    print("TESTE DO CACHE SEMÂNTICO DE SQL (sem modelo)")
+    print("="*80)
+    print()
+
+    checks = Checks()
+    test_guards(checks)
+    test_lookup_before_ready(checks)
+    test_debounced_save(checks)
+
+    if checks.failures:
+        print(f"\n❌ {checks.failures} verificação(ões) falharam")
+        sys.exit(1)
+    print("\n✅ Guardas e gravação do cache de SQL corretas")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Teste da gramática GBNF do execute_sql_query (sql_grammar.py)
+
+Confere que o llama.cpp instalado aceita o SQL_GRAMMAR, que usa repetição
+{m,n} (não existe nas versões antigas do parser de gramáticas):
+    - LlamaGrammar.from_string (no llama-cpp-python 0.2.x o parse é em Python)
+    - parser em C do llama.cpp (0.3.x), com o vocabulário do modelo em
+      LLM_PATH (vocab_only: não carrega os pesos)
+
+Sem llama_cpp instalado o teste é pulado; sem o modelo, só a segunda parte.
+"""
+
+import ctypes
+import os
+import sys
+
+import numpy as np
+
+from sql_grammar import SQL_GRAMMAR
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BASE_DIR)
+LLM_PATH = os.getenv("LLM_PATH", os.path.join(PROJECT_ROOT, "llm_models", "qwen2.5-1.5b-instruct-q4_k_m.gguf"))
+
+# Gramática inválida: garante que o parser em C realmente rejeita erros
+BROKEN_GRAMMAR = 'root ::= "SELECT" [0-9]{2,'
+
+
+def c_parser(llama_cpp, llm):
+    """Função que parseia uma gramática no llama.cpp (True se aceita) ou None se indisponível"""
+    init_grammar = getattr(llama_cpp, "llama_sampler_init_grammar", None)
+    if init_grammar is None:
+        return None  # 0.2.x: o parse já aconteceu no from_string
+
+    from llama_cpp._internals import LlamaTokenDataArray
+
+    # 0.3.x recebe o modelo; versões mais novas, o vocabulário
+    internal = llm._model
+    handle = internal.vocab if hasattr(internal, "vocab") else internal.model
+    n_vocab = llm.n_vocab()
+
+    def parse(grammar: str) -> bool:
+        # Se o parse falha, o llama.cpp só loga o erro e devolve um sampler sem
+        # gramática (não restringe nada): a gramática vale se mascarar tokens
+        sampler = init_grammar(handle, grammar.encode("utf-8"), b"root")
+        if not sampler:
+            return False
+        try:
+            candidates = LlamaTokenDataArray(n_vocab=n_vocab)
+            candidates.copy_logits(np.zeros(n_vocab, dtype=np.single))
+            llama_cpp.llama_sampler_apply(sampler, ctypes.byref(candidates.candidates))
+            return not np.isfinite(candidates.candidates_data.logit).all()
+        finally:
+            llama_cpp.llama_sampler_free(sampler)
+
+    return parse
+
+
+def main():
+    print("="*80)
+    print("TESTE DA GRAMÁTICA SQL (llama.cpp)")
+    print("="*80)
+    print()
+
+    try:
+        import llama_cpp
+        from llama_cpp import Llama, LlamaGrammar
+    except ImportError:
+        print("⏭️  llama_cpp não instalado, teste pulado")
+        return
+
+    print(f"📦 llama-cpp-python {llama_cpp.__version__}")
+    failures = 0
+
+    try:
+        LlamaGrammar.from_string(SQL_GRAMMAR, verbose=False)
+        print("✅ LlamaGrammar.from_string aceita o SQL_GRAMMAR")
+    except Exception as e:
+        failures += 1
+        print(f"❌ LlamaGrammar.from_string rejeitou o SQL_GRAMMAR: {e}")
+
+    if not os.path.exists(LLM_PATH):
+        print(f"⏭️  Modelo não encontrado ({LLM_PATH}), parser em C não testado")
+    else:
+        llm = Llama(model_path=LLM_PATH, vocab_only=True, verbose=False)
+        parse = c_parser(llama_cpp, llm)
+        if parse is None:
+            print("⏭️  Sem llama_sampler_init_grammar (0.2.x), parser em C já coberto acima")
+        else:
+            accepted = parse(SQL_GRAMMAR)
+            rejected = not parse(BROKEN_GRAMMAR)
+            failures += (not accepted) + (not rejected)
+            print(f"{'✅' if accepted else '❌'} Parser do llama.cpp aceita o SQL_GRAMMAR")
+            print(f"{'✅' if rejected else '❌'} Parser do llama.cpp rejeita uma gramática inválida")
+
+    if failures:
+        print(f"\n❌ {failures} verificação(ões) falharam")
+        sys.exit(1)
+    print("\n✅ Gramática SQL compatível com o llama.cpp instalado")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+DB Pool - Conexões SQLite somente leitura para o servidor MCP
+
+Abre o banco com URI `mode=ro` e PRAGMAs de leitura (mmap, cache grande,
+query_only) e expõe um engine SQLAlchemy com pool fixo de conexões, que é
+pré-aquecido na subida do servidor. Escritas são barradas pelo próprio
+SQLite, e não por validação de texto da query.
+"""
+
+import sqlite3
+from urllib.parse import quote
+
+from sqlalchemy import create_engine
+from sqlalchemy.pool import QueuePool
+
+
+# Operações barradas mesmo em modo somente leitura (ATTACH cria/abre outros arquivos)
+_DENIED_ACTIONS = {sqlite3.SQLITE_ATTACH, sqlite3.SQLITE_DETACH}
+
+
+# PRAGMAs que não podem ser alterados depois que a conexão é aberta
+_LOCKED_PRAGMAS = {"query_only", "writable_schema", "journal_mode", "locking_mode"}
+
+
+def _authorizer(action, arg1, arg2, db_name, trigger):
+    if action in _DENIED_ACTIONS:
+        return sqlite3.SQLITE_DENY
+    # arg2 != None => atribuição (PRAGMA x = valor), leitura continua permitida
+    if action == sqlite3.SQLITE_PRAGMA and arg2 is not None and str(arg1).lower() in _LOCKED_PRAGMAS:
+        return sqlite3.SQLITE_DENY
+    return sqlite3.SQLITE_OK
+
+
+def open_readonly_connection(
+    db_file: str,
+    mmap_size: int = 256 * 1024 * 1024,
+    cache_size_kib: int = 64 * 1024
+) -> sqlite3.Connection:
+    """
+    Abre uma conexão somente leitura configurada para consultas.
+
+    Args:
+        db_file: Caminho do arquivo SQLite
+        mmap_size: Bytes do banco mapeados em memória (páginas quentes via mmap)
+        cache_size_kib: Tamanho do page cache da conexão em KiB
+    """
+    uri = f"file:{quote(db_file)}?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+    conn.execute(f"PRAGMA mmap_size = {int(mmap_size)}")
+    conn.execute(f"PRAGMA cache_size = -{int(cache_size_kib)}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA query_only = ON")
+    conn.set_authorizer(_authorizer)
+    return conn
+
+
+def create_readonly_engine(
+    db_file: str,
+    pool_size: int = 4,
+    mmap_size: int = 256 * 1024 * 1024,
+    cache_size_kib: int = 64 * 1024
+):
+    """
+    Cria um engine SQLAlchemy com pool fixo de conexões somente leitura.
+
+    O banco deve estar em journal_mode=WAL (configurado pelo init_sqlite.py)
+    para que leituras não bloqueiem uma eventual recarga.
+    """
+    return create_engine(
+        "sqlite://",
+        creator=lambda: open_readonly_connection(db_file, mmap_size, cache_size_kib),
+        poolclass=QueuePool,
+        pool_size=pool_size,
+        max_overflow=0,
+        pool_timeout=30
+    )
+
+
+def prewarm(engine, connections: int):
+    """Abre `connections` conexões (já lendo o schema) e as devolve ao pool."""
+    opened = [engine.connect() for _ in range(connections)]
+    for conn in opened:
+        conn.exec_driver_sql("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        conn.close()
@@ -0,0 +1,215 @@
+"""
+Formatting - Formatação vetorizada de resultados no padrão brasileiro
+
+Substitui os `df[col].apply(lambda ...)` célula a célula por operações
+vetorizadas em NumPy. O tipo de cada coluna (moeda, quantidade ou valor
+bruto) vem do schema conhecido da tabela emendas_parlamentares e dos
+aliases usados pelas ferramentas, e não de heurísticas sobre os dados
+(ex: max() > 1 milhão).
+
+Os centavos seguem o arredondamento do antigo f"{x:,.2f}" (0.005 -> 0,01,
+2.675 -> 2,67): valores perto de meio centavo usam o texto decimal '%.2f'.
+Valores fora do int64 (ou inf) usam o formatador antigo.
+
+Os textos já formatados devem ir para o markdown com disable_numparse=True,
+senão o tabulate relê "60.000" como o número 60.
+
+Usado por server.py e server_debug.py.
+"""
+
+import numpy as np
+import pandas as pd
+
+MONEY = "money"
+INTEGER = "integer"
+
+# Colunas da tabela com valores em R$
+MONEY_COLUMNS = {
+    "valor_empenhado",
+    "valor_liquidado",
+    "valor_pago",
+    "valor_restos_pagar_inscritos",
+    "valor_restos_pagar_cancelados",
+    "valor_restos_pagar_pagos",
+    "total_empenhado",
+    "total_liquidado",
+    "total_pago",
+}
+
+# Colunas/aliases que são contagens
+INTEGER_COLUMNS = {
+    "quantidade",
+    "qtd",
+    "count",
+    "count(*)",
+    "num",
+    "total_emendas",
+    "total_autores",
+    "rowcount",
+}
+
+# Colunas que devem sair sem separador de milhar (anos e códigos)
+RAW_COLUMNS = {
+    "ano_emenda",
+    "codigo_municipio_ibge",
+    "codigo_uf_ibge",
+}
+
+# Aliases de agregações sobre valores (ex: SUM(valor_pago) AS total)
+MONEY_KEYWORDS = ("valor", "pago", "empenhado", "liquidado", "soma", "media", "média")
+AMBIGUOUS_KEYWORDS = ("total",)
+
+# Partes inteiras a partir daqui não cabem com folga em int64
+INT64_LIMIT = 9.0e18
+
+
+def column_kind(name: str, dtype) -> str:
+    """
+    Decide como formatar uma coluna a partir do nome e do dtype.
+
+    Returns:
+        MONEY, INTEGER ou None (mantém o valor bruto)
+    """
+    if not pd.api.types.is_numeric_dtype(dtype) or pd.api.types.is_bool_dtype(dtype):
+        return None
+
+    col = str(name).lower()
+    if col in RAW_COLUMNS or col.startswith("codigo_"):
+        return None
+    if col in MONEY_COLUMNS:
+        return MONEY
+    if col in INTEGER_COLUMNS or col.startswith(("qtd_", "quantidade_", "num_", "count(")):
+        return INTEGER
+    if any(keyword in col for keyword in MONEY_KEYWORDS):
+        return MONEY
+    if any(keyword in col for keyword in AMBIGUOUS_KEYWORDS):
+        # "total" pode ser SUM(valor) (float) ou COUNT(*) (inteiro)
+        return MONEY if pd.api.types.is_float_dtype(dtype) else INTEGER
+    return None
+
+
+def _ascii_numbers(integers: np.ndarray, negative: np.ndarray, decimals: np.ndarray = None) -> np.ndarray:
+    """
+    Monta os textos '-1.234.567[,89]' direto em uma matriz de bytes.
+
+    Cada linha da matriz é um número alinhado à direita; os dígitos,
+    separadores de milhar e o sinal são escritos coluna a coluna com
+    aritmética vetorizada, sem nenhum laço por célula.
+
+    Args:
+        integers: Parte inteira (int64, >= 0)
+        negative: Máscara de valores negativos
+        decimals: Centavos (0-99) ou None para números inteiros
+    """
+    count = len(integers)
+    max_digits = len(str(int(integers.max()))) if count else 1
+    suffix = 3 if decimals is not None else 0  # ",99"
+    width = 1 + max_digits + (max_digits - 1) // 3 + suffix  # 1 = sinal
+
+    matrix = np.full((count, width), ord(" "), dtype=np.uint8)
+    units_col = width - suffix - 1
+    leftmost = np.zeros(count, dtype=np.int64)
+
+    power = 1
+    for position in range(max_digits):
+        present = (integers >= power) | (position == 0)
+        offset = position + position // 3
+        if position and position % 3 == 0:
+            matrix[:, units_col - offset + 1] = np.where(present, ord("."), ord(" "))
+        matrix[:, units_col - offset] = np.where(present, ord("0") + (integers // power) % 10, ord(" "))
+        leftmost = np.where(present, offset, leftmost)
+        power *= 10
+
+    rows = np.nonzero(negative)[0]
+    matrix[rows, units_col - leftmost[rows] - 1] = ord("-")
+
+    if decimals is not None:
+        matrix[:, width - 3] = ord(",")
+        matrix[:, width - 2] = ord("0") + decimals // 10
+        matrix[:, width - 1] = ord("0") + decimals % 10
+
+    return np.char.lstrip(matrix.view(f"S{width}").ravel())
+
+
+def brl_cell(x) -> str:
+    """Formatação célula a célula (referência e fallback para valores fora do int64)"""
+    return f"R$ {x:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".") if pd.notna(x) else ""
+
+
+def integer_cell(x) -> str:
+    """Formatação célula a célula (referência e fallback para valores fora do int64)"""
+    if pd.isna(x):
+        return ""
+    return f"{int(x):,}".replace(",", ".") if np.isfinite(x) else str(x)
+
+
+def _assemble(series: pd.Series, values: np.ndarray, vectorized: np.ndarray, text: np.ndarray,
+              fallback) -> pd.Series:
+    """Junta os textos vetorizados, o fallback célula a célula e '' para NaN"""
+    result = np.full(len(values), "", dtype=object)
+    result[vectorized] = text.astype(str)
+    for row in np.nonzero(~np.isnan(values) & ~vectorized)[0]:
+        result[row] = fallback(values[row])
+    return pd.Series(result, index=series.index)
+
+
+def _split_cents(values: np.ndarray):
+    """
+    Separa |valores| em parte inteira e centavos, arredondados como o '%.2f'.
+
+    100 * x em float só erra o arredondamento perto de meio centavo (ex:
+    2.675 é 2.67499999... em binário, mas 267.5 após a multiplicação). Essas
+    linhas, e as grandes demais para a multiplicação ser exata, usam o texto
+    decimal; o resto vem direto de rint.
+    """
+    scaled = np.abs(values) * 100
+    fraction = scaled - np.floor(scaled)
+    ambiguous = np.abs(fraction - 0.5) <= 2 * np.spacing(scaled)
+
+    total = np.rint(np.where(ambiguous, 0, scaled)).astype(np.int64)
+    integers, cents = total // 100, total % 100
+
+    if ambiguous.any():
+        decimal_text = np.char.rpartition(np.char.mod("%.2f", np.abs(values[ambiguous])), ".")
+        integers[ambiguous] = decimal_text[:, 0].astype(np.int64)
+        cents[ambiguous] = decimal_text[:, 2].astype(np.int64)
+    return integers, cents
+
+
+def format_brl(series: pd.Series) -> pd.Series:
+    """Formata valores como moeda: 1234.5 -> 'R$ 1.234,50' (NaN -> '')."""
+    values = pd.to_numeric(series, errors="coerce").to_numpy(dtype="float64")
+    vectorized = np.abs(values) < INT64_LIMIT  # False para NaN e inf
+    selected = values[vectorized]
+
+    integers, cents = _split_cents(selected)
+    # Mesmo sinal do f-string: -0.001 -> 'R$ -0,00'
+    negative = np.signbit(selected)
+
+    text = np.char.add(b"R$ ", _ascii_numbers(integers, negative, cents))
+    return _assemble(series, values, vectorized, text, brl_cell)
+
+
+def format_integer(series: pd.Series) -> pd.Series:
+    """Formata contagens com separador de milhar: 12345 -> '12.345' (NaN -> '')."""
+    values = pd.to_numeric(series, errors="coerce").to_numpy(dtype="float64")
+    vectorized = np.abs(values) < INT64_LIMIT
+    selected = values[vectorized]
+
+    integers = np.abs(np.trunc(selected)).astype(np.int64)
+    negative = selected <= -1
+
+    text = _ascii_numbers(integers, negative)
+    return _assemble(series, values, vectorized, text, integer_cell)
+
+
+def format_dataframe(df: pd.DataFrame) -> pd.DataFrame:
+    """Retorna uma cópia do DataFrame com moeda e contagens no padrão brasileiro."""
+    formatted = df.copy()
+    for col in df.columns:
+        kind = column_kind(col, df[col].dtype)
+        if kind == MONEY:
+            formatted[col] = format_brl(df[col])
+        elif kind == INTEGER:
+            formatted[col] = format_integer(df[col])
+    return formatted
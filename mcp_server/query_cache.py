@@ -0,0 +1,182 @@
+"""
+Query Cache - Cache LRU + TTL dos resultados formatados do execute_sql_query
+
+A chave é o texto SQL normalizado (espaços colapsados fora de literais,
+sem ';' final) mais os parâmetros. O valor é o markdown final, de modo que
+um acerto não passa nem pelo SQLite nem pelo pandas. O cache inteiro é
+invalidado quando o arquivo do banco muda (mtime/tamanho/inode do .db e
+tamanho do -wal). Quem grava passa a versão lida antes de executar a
+query: se o banco mudou no meio da execução, o resultado é descartado.
+"""
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+_LITERAL_RE = re.compile(r"('(?:[^']|'')*')")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_sql(query: str) -> str:
+    """Colapsa espaços fora dos literais e remove ';' final."""
+    parts = _LITERAL_RE.split(query.strip())
+    normalized = "".join(
+        part if i % 2 else _WHITESPACE_RE.sub(" ", part)
+        for i, part in enumerate(parts)
+    )
+    return normalized.strip().rstrip(";").strip()
+
+
+def file_generation(db_path: str) -> Tuple:
+    """
+    Identifica a versão do arquivo do banco (muda a cada escrita/recarga).
+
+    Do -wal só conta o tamanho: leitores em modo WAL criam/tocam o arquivo
+    sem alterar dados, e isso não deve invalidar nada.
+    """
+    try:
+        stat = os.stat(db_path)
+        db_version = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    except OSError:
+        db_version = None
+
+    try:
+        wal_size = os.stat(db_path + "-wal").st_size
+    except OSError:
+        wal_size = 0
+
+    return db_version, wal_size
+
+
+class QueryCache:
+    """Cache LRU com TTL e limite em bytes para resultados de queries."""
+
+    def __init__(
+        self,
+        max_bytes: int = 16 * 1024 * 1024,
+        max_entries: int = 512,
+        ttl: float = 300.0,
+        generation_fn: Optional[Callable[[], Tuple]] = None
+    ):
+        """
+        Args:
+            max_bytes: Tamanho máximo somado dos resultados em cache
+            max_entries: Número máximo de entradas
+            ttl: Tempo de vida (s) de cada entrada
+            generation_fn: Função que retorna a "versão" atual do banco
+        """
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.generation_fn = generation_fn
+
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._bytes = 0
+        self._generation = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale_puts = 0
+
+    @staticmethod
+    def make_key(query: str, params: Optional[dict] = None) -> str:
+        key = normalize_sql(query)
+        if params:
+            key += "\x00" + repr(sorted(params.items()))
+        return key
+
+    def generation(self) -> Optional[Tuple]:
+        """Versão atual do banco (ler antes de executar a query que vai para o put)."""
+        return self.generation_fn() if self.generation_fn is not None else None
+
+    def _check_generation(self):
+        if self.generation_fn is None:
+            return
+        generation = self.generation_fn()
+        if generation != self._generation:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._bytes = 0
+            self._generation = generation
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            self._check_generation()
+
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, size, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self._bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: str, generation: Optional[Tuple] = None):
+        """
+        Args:
+            key: Chave de make_key
+            value: Resultado formatado
+            generation: Versão do banco lida (com generation()) antes de
+                executar a query. Se o banco mudou desde então, o valor pode
+                ter sido calculado sobre os dados antigos e não é guardado.
+        """
+        size = len(value.encode("utf-8")) + len(key)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            self._check_generation()
+            if generation is not None and generation != self._generation:
+                self.stale_puts += 1
+                return
+
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+
+            self._entries[key] = (time.monotonic() + self.ttl, size, value)
+            self._bytes += size
+
+            while self._bytes > self.max_bytes or len(self._entries) > self.max_entries:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "stale_puts": self.stale_puts,
+            }
@@ -0,0 +1,200 @@
+"""
+Query Rewrite - Responde GROUP BYs a partir das tabelas de agregação (rollups)
+
+O init_sqlite.py materializa rollups (por autor, UF, município, região,
+função, ano e alguns cruzamentos) e os registra em `rollup_catalog`.
+Este módulo reconhece os formatos de agregação que o parser de regras do
+chat e as ferramentas do servidor geram e os reescreve para ler o menor
+rollup que contém todas as colunas necessárias.
+"""
+
+import re
+from typing import List, Optional, Tuple
+
+BASE_TABLE = "emendas_parlamentares"
+ROLLUP_CATALOG = "rollup_catalog"
+
+# Medidas somadas em cada rollup (com o mesmo nome da coluna original)
+MEASURES = {"valor_empenhado", "valor_liquidado", "valor_pago"}
+COUNT_ALIAS = '"COUNT(*)"'
+
+# Palavras que podem aparecer no ORDER BY / HAVING / LIMIT sem impedir a reescrita.
+# Medidas só dentro de SUM(...) e COUNT(*): uma medida "solta" no ORDER BY é
+# o valor de uma linha qualquer do grupo na tabela base, mas a soma no rollup.
+_TAIL_KEYWORDS = {
+    "order", "by", "asc", "desc", "limit", "offset", "having", "and", "or",
+    "nulls", "first", "last"
+}
+
+_QUERY_RE = re.compile(
+    r"^\s*SELECT\s+(?P<select>.+?)\s+FROM\s+" + BASE_TABLE +
+    r"(?:\s+WHERE\s+(?P<where>.+?))?"
+    r"\s+GROUP\s+BY\s+(?P<group>.+?)"
+    r"(?P<tail>\s+(?:HAVING|ORDER\s+BY|LIMIT)\b.*?)?"
+    r"\s*;?\s*$",
+    re.IGNORECASE | re.DOTALL
+)
+_ITEM_RE = re.compile(
+    r"^(?P<expr>.+?)(?:\s+(?:AS\s+)?(?P<alias>\"[^\"]+\"|\w+))?$",
+    re.IGNORECASE | re.DOTALL
+)
+_COUNT_RE = re.compile(r"COUNT\s*\(\s*\*\s*\)", re.IGNORECASE)
+_SUM_RE = re.compile(r"^SUM\s*\(\s*(\w+)\s*\)$", re.IGNORECASE)
+_TAIL_SUM_RE = re.compile(r"\bSUM\s*\(\s*(\w+)\s*\)", re.IGNORECASE)
+_PREDICATE_RE = re.compile(
+    r"^\s*(?P<column>\w+)\s*(?:=|<>|!=|<=|>=|<|>|\bLIKE\b)\s*(?P<value>.+?)\s*$",
+    re.IGNORECASE | re.DOTALL
+)
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+_IDENTIFIER_RE = re.compile(r"[A-Za-z_]\w*")
+
+
+class RollupRewriter:
+    """Reescreve agregações sobre emendas_parlamentares para usar os rollups."""
+
+    def __init__(self, catalog: List[Tuple[str, List[str], int]]):
+        """
+        Args:
+            catalog: Lista de (tabela, dimensões, número de linhas)
+        """
+        # Menores primeiro: a primeira tabela compatível é a mais barata
+        self.catalog = sorted(catalog, key=lambda entry: entry[2])
+
+    @classmethod
+    def from_connection(cls, conn) -> "RollupRewriter":
+        """Lê o rollup_catalog do banco (catálogo vazio se não existir)."""
+        exists = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+            (ROLLUP_CATALOG,)
+        ).fetchone()
+        if not exists:
+            return cls([])
+
+        rows = conn.exec_driver_sql(
+            f"SELECT table_name, dimensions, row_count FROM {ROLLUP_CATALOG}"
+        ).fetchall()
+        return cls([(name, dims.split(","), count) for name, dims, count in rows])
+
+    def is_enabled(self) -> bool:
+        return bool(self.catalog)
+
+    def rewrite(self, query: str) -> Optional[str]:
+        """
+        Retorna a query reescrita para um rollup, ou None se não for compatível.
+
+        Formato suportado:
+            SELECT <dims>, COUNT(*) [AS a], SUM(valor_x) [AS b]
+            FROM emendas_parlamentares
+            [WHERE col = '...' AND col LIKE '...']
+            GROUP BY <dims>
+            [HAVING ...] [ORDER BY ...] [LIMIT n]
+        """
+        if not self.catalog:
+            return None
+
+        match = _QUERY_RE.match(query)
+        if not match:
+            return None
+
+        group_columns = [col.strip() for col in match.group("group").split(",")]
+        if not all(_IDENTIFIER_RE.fullmatch(col) for col in group_columns):
+            return None
+
+        select_sql, aliases = self._rewrite_select(match.group("select"), set(group_columns))
+        if select_sql is None:
+            return None
+
+        where_sql = match.group("where")
+        where_columns = self._where_columns(where_sql) if where_sql else []
+        if where_columns is None:
+            return None
+
+        tail_sql = match.group("tail") or ""
+        if not self._tail_is_supported(tail_sql, set(group_columns) | aliases):
+            return None
+
+        needed = set(group_columns) | set(where_columns)
+        table = self._find_rollup(needed)
+        if table is None:
+            return None
+
+        rewritten = f"SELECT {select_sql}\nFROM {table}"
+        if where_sql:
+            rewritten += f"\nWHERE {where_sql.strip()}"
+        rewritten += f"\nGROUP BY {', '.join(group_columns)}"
+        if tail_sql:
+            rewritten += "\n" + _COUNT_RE.sub("SUM(quantidade)", tail_sql.strip())
+        return rewritten
+
+    def _rewrite_select(self, select_sql: str, group_columns: set) -> Tuple[Optional[str], set]:
+        items = []
+        aliases = set()
+
+        for raw_item in select_sql.split(","):
+            item_match = _ITEM_RE.match(raw_item.strip())
+            if not item_match:
+                return None, aliases
+
+            expr = item_match.group("expr").strip()
+            alias = item_match.group("alias")
+
+            if _COUNT_RE.fullmatch(expr):
+                # Sem alias, preserva o nome da coluna original no resultado
+                items.append(f"SUM(quantidade) AS {alias or COUNT_ALIAS}")
+            elif _SUM_RE.match(expr) and _SUM_RE.match(expr).group(1).lower() in MEASURES:
+                items.append(f"{expr} AS {alias}" if alias else expr)
+            elif expr in group_columns:
+                items.append(f"{expr} AS {alias}" if alias else expr)
+            else:
+                return None, aliases
+
+            if alias:
+                aliases.add(alias.strip('"'))
+
+        return ", ".join(items), aliases
+
+    def _where_columns(self, where_sql: str) -> Optional[List[str]]:
+        # Só conjunções simples de predicados "coluna OP literal"
+        without_literals = _LITERAL_RE.sub("''", where_sql)
+        if re.search(r"\bOR\b|\bNOT\b|\(|\bSELECT\b", without_literals, re.IGNORECASE):
+            return None
+
+        columns = []
+        for predicate in re.split(r"\bAND\b", without_literals, flags=re.IGNORECASE):
+            predicate_match = _PREDICATE_RE.match(predicate)
+            if not predicate_match:
+                return None
+            value = predicate_match.group("value")
+            if _IDENTIFIER_RE.fullmatch(value):
+                # Comparação entre colunas: não suportado
+                return None
+            columns.append(predicate_match.group("column"))
+        return columns
+
+    def _tail_is_supported(self, tail_sql: str, known_names: set) -> bool:
+        if not tail_sql:
+            return True
+
+        without_literals = _LITERAL_RE.sub("''", tail_sql)
+        if re.search(r"\bSELECT\b", without_literals, re.IGNORECASE):
+            return False
+
+        # COUNT(*) e SUM(medida) viram agregações equivalentes no rollup; o resto precisa
+        # ser nome de dimensão/apelido da query (colunas do rollup como `quantidade` não)
+        without_aggregates = _COUNT_RE.sub("0", without_literals)
+        without_aggregates = _TAIL_SUM_RE.sub(
+            lambda m: "0" if m.group(1).lower() in MEASURES else m.group(0), without_aggregates
+        )
+
+        for identifier in _IDENTIFIER_RE.findall(without_aggregates):
+            if identifier.lower() in _TAIL_KEYWORDS or identifier in known_names:
+                continue
+            return False
+        return True
+
+    def _find_rollup(self, needed_columns: set) -> Optional[str]:
+        for table, dimensions, _ in self.catalog:
+            if needed_columns.issubset(dimensions):
+                return table
+        return None
+
@@ -0,0 +1,143 @@
+"""
+Analyzer - Text analysis chain for BM25 (Portuguese)
+
+Pipeline applied identically at index and query time:
+    1. Unicode NFKC normalization + lowercase
+    2. Accent folding (orçamento -> orcamento)
+    3. Tokenization that splits punctuation but keeps legal identifiers
+       ("210/2024", "7.688", "rp-9") as single tokens, plus their numbers
+    4. Portuguese stopword removal
+    5. Light stemmer (plural/inflection suffixes only)
+
+Regexes and translation tables are built once; stemming is cached per word.
+The analyzer name is stored in the index header, so an index built with a
+different chain is rebuilt instead of silently mismatching the queries.
+"""
+
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Dict, List, Type
+
+# Palavras com separadores internos; identificadores com dígitos ficam inteiros
+_TOKEN_RE = re.compile(r'[a-z0-9]+(?:[./\-][a-z0-9]+)*')
+_DIGIT_RE = re.compile(r'\d')
+_SEPARATOR_RE = re.compile(r'[./\-]')
+
+# Já na forma sem acento (aplicadas depois do folding)
+PORTUGUESE_STOPWORDS = frozenset("""
+a ao aos as ate com como da das de del dela delas dele deles do dos e ela elas ele eles
+em entre era essa essas esse esses esta estas este estes eu foi for foram ha isso isto
+ja la lhe lhes mais mas me mesmo meu minha muito na nas nem no nos nossa nosso num numa
+o os ou para pela pelas pelo pelos por qual quando que quem se sem ser seu seus sua suas
+so tambem te tem tendo ter teu tua um uma umas uns voce voces vos sao sobre apos cada
+qualquer quais onde seja sejam sera serao estao esta sendo
+""".split())
+
+# Sufixos de plural, do mais longo para o mais curto: (sufixo, troca, tamanho mínimo do radical)
+_STEM_RULES = (
+    ('oes', 'ao', 1),
+    ('aes', 'ao', 1),
+    ('ais', 'al', 2),
+    ('eis', 'el', 2),
+    ('ois', 'ol', 2),
+    ('ns', 'm', 2),
+    ('s', '', 3),
+)
+# Plural de palavras terminadas em r/z (valores, vezes); "livres" cai na regra do 's'
+_CONSONANT_PLURAL_RE = re.compile(r'(?<=[aeiou][rz])es$')
+# Palavras terminadas em 's' que não são plural
+_STEM_EXCEPTIONS = frozenset({'pais', 'mes', 'gas', 'lapis', 'onibus', 'virus', 'bonus', 'tenis', 'atlas'})
+
+
+def _build_fold_table() -> Dict[int, str]:
+    """Translation table that removes accents from Latin-1/Latin Extended-A letters"""
+    table = {}
+    for code in range(0xC0, 0x180):
+        char = chr(code)
+        decomposed = unicodedata.normalize('NFD', char)
+        base = ''.join(c for c in decomposed if not unicodedata.combining(c))
+        if base != char and base:
+            table[code] = base
+    return table
+
+
+_FOLD_TABLE = _build_fold_table()
+
+
+def fold_accents(text: str) -> str:
+    return text.translate(_FOLD_TABLE)
+
+
+@lru_cache(maxsize=100_000)
+def light_stem(word: str) -> str:
+    """Remove Portuguese plural/inflection suffixes (emendas -> emenda, acoes -> acao)"""
+    if len(word) < 4 or _DIGIT_RE.search(word) or word in _STEM_EXCEPTIONS:
+        return word
+    if word.endswith(('ss', 'us', 'is')) and not word.endswith(('ais', 'eis', 'ois')):
+        return word
+    if len(word) >= 5 and _CONSONANT_PLURAL_RE.search(word):
+        return word[:-2]
+    for suffix, replacement, min_stem in _STEM_RULES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= min_stem:
+            return word[:-len(suffix)] + replacement
+    return word
+
+
+class Analyzer:
+    """Base analyzer: normalization + tokenization (no stopwords, no stemming)"""
+
+    name = 'simple-v1'
+
+    def normalize(self, text: str) -> str:
+        return unicodedata.normalize('NFKC', text).lower()
+
+    def tokenize(self, text: str) -> List[str]:
+        tokens = []
+        for token in _TOKEN_RE.findall(text):
+            if not _SEPARATOR_RE.search(token):
+                tokens.append(token)
+            elif _DIGIT_RE.search(token):
+                # Identificador (ex: 210/2024, rp-9): token inteiro + partes
+                tokens.append(token)
+                tokens.extend(part for part in _SEPARATOR_RE.split(token) if part)
+            else:
+                # Palavras unidas por pontuação (ex: municipios/estados)
+                tokens.extend(part for part in _SEPARATOR_RE.split(token) if part)
+        return tokens
+
+    def filter(self, tokens: List[str]) -> List[str]:
+        return tokens
+
+    def analyze(self, text: str) -> List[str]:
+        return self.filter(self.tokenize(self.normalize(text)))
+
+
+class PortugueseAnalyzer(Analyzer):
+    """Accent folding, Portuguese stopwords and light stemming"""
+
+    name = 'pt-v1'
+
+    def normalize(self, text: str) -> str:
+        return fold_accents(super().normalize(text))
+
+    def filter(self, tokens: List[str]) -> List[str]:
+        return [light_stem(token) for token in tokens if token not in PORTUGUESE_STOPWORDS]
+
+
+ANALYZERS: Dict[str, Type[Analyzer]] = {
+    Analyzer.name: Analyzer,
+    PortugueseAnalyzer.name: PortugueseAnalyzer,
+}
+
+
+def get_analyzer(name: str = PortugueseAnalyzer.name) -> Analyzer:
+    """
+    Return an analyzer by name
+
+    Raises:
+        ValueError: If the name is unknown (e.g. index built by a newer version)
+    """
+    if name not in ANALYZERS:
+        raise ValueError(f"analisador '{name}' desconhecido")
+    return ANALYZERS[name]()
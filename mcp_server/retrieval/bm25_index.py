@@ -1,33 +1,195 @@
 """
 BM25 Index - Fast keyword-based ranking
+
+Inverted index in NumPy arrays (CSR layout): for each term, the postings
+are a slice of `doc_ids`/`impacts`. The BM25 contribution of every posting
+(idf * saturated tf with the doc-length norm) is precomputed at build time,
+so a query only gathers and sums the postings of its terms and selects the
+top-k with argpartition. Query time depends on the postings touched, not
+on the corpus size.
+
+Scores match rank_bm25.BM25Okapi (k1=1.5, b=0.75, epsilon=0.25).
+
+On disk the index is a binary file (see index_file.py) opened via mmap:
+postings, term dictionary and document store are read in place, so a
+loaded index costs almost no heap and several server processes share
+the same pages.
 """
 
-from rank_bm25 import BM25Okapi
-import pickle
-import os
-from typing import List, Tuple
+import bisect
+import hashlib
+import json
+from collections import Counter
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .analyzer import Analyzer, get_analyzer
+from .index_file import IndexFile, write_index_file
+
+INDEX_KIND = 'bm25'
+
+
+def _pack_strings(values: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Encode strings as (offsets int64[n+1], utf-8 blob uint8)"""
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(value) for value in encoded]) if encoded else []
+    blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    return offsets, blob
+
+
+class StringTable(Sequence):
+    """Lazy list of strings stored as offsets + utf-8 blob (decoded on access)"""
+
+    def __init__(self, offsets: np.ndarray, blob: np.ndarray):
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def raw(self, i: int) -> bytes:
+        return self._blob[self._offsets[i]:self._offsets[i + 1]].tobytes()
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.raw(i).decode('utf-8')
+
+
+class JsonTable(StringTable):
+    """Lazy list of JSON objects (one per document)"""
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return super().__getitem__(i)
+        return json.loads(super().__getitem__(i))
+
+
+class TermDictionary:
+    """Sorted term table with binary search (same interface as dict.get)"""
+
+    def __init__(self, terms: StringTable):
+        self._terms = terms
+        self._keys = _RawKeys(terms)
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def get(self, term: str, default=None):
+        key = term.encode('utf-8')
+        i = bisect.bisect_left(self._keys, key)
+        if i < len(self._terms) and self._terms.raw(i) == key:
+            return i
+        return default
+
+    def __contains__(self, term: str) -> bool:
+        return self.get(term) is not None
+
+
+class _RawKeys(Sequence):
+    # Termos como bytes: a ordem de bytes utf-8 é a mesma da ordenação dos str
+    def __init__(self, terms: StringTable):
+        self._terms = terms
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def __getitem__(self, i):
+        return self._terms.raw(i)
 
 
 class BM25Index:
     """BM25-based document index for fast keyword retrieval"""
 
-    def __init__(self, documents: List[str]):
+    def __init__(self, documents: List[str], metadata: Optional[List[dict]] = None,
+                 tokenized: Optional[List[List[str]]] = None,
+                 analyzer: Optional[Analyzer] = None,
+                 k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
         """
         Initialize BM25 index with documents
 
         Args:
-            documents: List of text documents (paragraphs)
+            documents: List of text documents (chunks)
+            metadata: Optional per-document metadata (section path, offsets, chunk id)
+            tokenized: Optional pre-tokenized documents (must come from the same analyzer)
+            analyzer: Text analysis chain (default: Portuguese analyzer)
+            k1: Term frequency saturation
+            b: Document length normalization
+            epsilon: Floor for negative idf values (fraction of the average idf)
         """
         self.documents = documents
+        self.metadata = metadata
+        self.analyzer = analyzer or get_analyzer()
+        self.k1 = k1
+        self.b = b
 
-        # Tokenize documents (simples lowercase split)
-        tokenized = [doc.lower().split() for doc in documents]
+        # Tokenize documents (mesma análise usada nas queries)
+        if tokenized is None:
+            tokenized = [self.tokenize(doc) for doc in documents]
 
-        # Create BM25 index
-        self.bm25 = BM25Okapi(tokenized)
+        self._build(tokenized, epsilon)
+        self.version = self._content_version()
 
         print(f"✅ BM25 Index criado com {len(documents)} documentos")
 
+    def _content_version(self) -> str:
+        """Hash of analyzer + documents: same corpus, same version (used by caches)"""
+        digest = hashlib.sha1(self.analyzer.name.encode('utf-8'))
+        for doc in self.documents:
+            digest.update(b'\x00')
+            digest.update(doc.encode('utf-8'))
+        return digest.hexdigest()[:16]
+
+    def tokenize(self, text: str) -> List[str]:
+        return self.analyzer.analyze(text)
+
+    def _build(self, tokenized: List[List[str]], epsilon: float):
+        """Build CSR postings with precomputed per-posting BM25 impacts"""
+        num_docs = len(tokenized)
+        doc_len = np.array([len(tokens) for tokens in tokenized], dtype=np.float64)
+        avgdl = doc_len.mean() if num_docs and doc_len.sum() else 1.0
+
+        # term -> [(doc_id, tf)]
+        postings = {}
+        for doc_id, tokens in enumerate(tokenized):
+            for term, tf in Counter(tokens).items():
+                postings.setdefault(term, []).append((doc_id, tf))
+
+        terms = sorted(postings)
+        self.vocab = {term: term_id for term_id, term in enumerate(terms)}
+
+        df = np.array([len(postings[term]) for term in terms], dtype=np.float64)
+        idf = np.log(num_docs - df + 0.5) - np.log(df + 0.5)
+        if len(idf):
+            # Mesmo piso do BM25Okapi: idf negativo vira epsilon * idf médio
+            idf[idf < 0] = epsilon * idf.mean()
+        self.idf = idf.astype(np.float32)
+
+        self.offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        self.offsets[1:] = np.cumsum(df.astype(np.int64)) if len(terms) else []
+        total = int(self.offsets[-1])
+
+        self.doc_ids = np.empty(total, dtype=np.int32)
+        tfs = np.empty(total, dtype=np.float64)
+        for term_id, term in enumerate(terms):
+            start = self.offsets[term_id]
+            entries = postings[term]
+            self.doc_ids[start:start + len(entries)] = [doc_id for doc_id, _ in entries]
+            tfs[start:start + len(entries)] = [tf for _, tf in entries]
+
+        # Norma de comprimento por documento e impacto final de cada posting
+        norms = self.k1 * (1 - self.b + self.b * doc_len / avgdl)
+        term_of_posting = np.repeat(np.arange(len(terms)), df.astype(np.int64))
+        self.impacts = (
+            self.idf[term_of_posting] * tfs * (self.k1 + 1) / (tfs + norms[self.doc_ids])
+        ).astype(np.float32)
+
     def search(self, query: str, top_k: int = 20) -> List[Tuple[str, float]]:
         """
         Search for most relevant documents
@@ -39,38 +201,103 @@ class BM25Index:
         Returns:
             List of (document, score) tuples sorted by relevance
         """
-        # Tokenize query
-        query_tokens = query.lower().split()
+        return [(self.documents[i], score) for i, score in self.search_indices(query, top_k)]
+
+    def search_indices(self, query: str, top_k: int = 20) -> List[Tuple[int, float]]:
+        """
+        Same as search, returning (document index, score) tuples
+
+        Only documents containing at least one query term are returned.
+        """
+        # Tokenize query (termos repetidos contam mais de uma vez, como no BM25Okapi)
+        term_ids = [self.vocab.get(token) for token in self.tokenize(query)]
+        term_ids = [term_id for term_id in term_ids if term_id is not None]
+        if not term_ids or top_k <= 0:
+            return []
+
+        # Junta só as postings dos termos da query
+        slices = [slice(self.offsets[t], self.offsets[t + 1]) for t in term_ids]
+        doc_ids = np.concatenate([self.doc_ids[s] for s in slices])
+        impacts = np.concatenate([self.impacts[s] for s in slices])
 
-        # Get BM25 scores
-        scores = self.bm25.get_scores(query_tokens)
+        # Soma por documento (só os documentos tocados)
+        docs, inverse = np.unique(doc_ids, return_inverse=True)
+        scores = np.bincount(inverse, weights=impacts, minlength=len(docs))
 
-        # Get top k indices
-        top_indices = sorted(
-            range(len(scores)),
-            key=lambda i: scores[i],
-            reverse=True
-        )[:top_k]
+        # Top-k sem ordenar todos os candidatos
+        if len(docs) > top_k:
+            top = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            top = np.arange(len(docs))
+        top = top[np.argsort(-scores[top], kind='stable')]
 
-        # Return documents with scores
-        return [(self.documents[i], scores[i]) for i in top_indices]
+        return [(int(docs[i]), float(scores[i])) for i in top]
 
     def save(self, path: str):
-        """Save index to disk"""
-        with open(path, 'wb') as f:
-            pickle.dump((self.documents, self.bm25), f)
+        """Save index to disk (binary format, written atomically)"""
+        terms = sorted(self.vocab, key=self.vocab.get) if isinstance(self.vocab, dict) else None
+        if terms is None:
+            raise ValueError("índice carregado via mmap já está em disco")
+
+        term_offsets, term_blob = _pack_strings(terms)
+        doc_offsets, doc_blob = _pack_strings(list(self.documents))
+        sections = {
+            'idf': self.idf,
+            'offsets': self.offsets,
+            'doc_ids': self.doc_ids,
+            'impacts': self.impacts,
+            'term_offsets': term_offsets,
+            'term_blob': term_blob,
+            'doc_offsets': doc_offsets,
+            'doc_blob': doc_blob,
+        }
+        if self.metadata is not None:
+            meta_offsets, meta_blob = _pack_strings(
+                [json.dumps(meta, ensure_ascii=False) for meta in self.metadata]
+            )
+            sections['meta_offsets'] = meta_offsets
+            sections['meta_blob'] = meta_blob
+
+        write_index_file(path, INDEX_KIND, sections, metadata={
+            'num_docs': len(self.documents),
+            'num_terms': len(terms),
+            'analyzer': self.analyzer.name,
+            'version': self.version,
+            'k1': self.k1,
+            'b': self.b,
+        })
         print(f"✅ Índice salvo em: {path}")
 
     @classmethod
     def load(cls, path: str):
-        """Load index from disk"""
-        with open(path, 'rb') as f:
-            documents, bm25 = pickle.load(f)
+        """
+        Open index from disk via mmap (nothing is copied to the heap)
+
+        Raises:
+            ValueError: If the file is not in the current index format
+        """
+        index_file = IndexFile(path, INDEX_KIND)
+        header = index_file.metadata
 
         # Create object without calling __init__
         obj = cls.__new__(cls)
-        obj.documents = documents
-        obj.bm25 = bm25
+        obj.index_file = index_file
+        if 'analyzer' not in header or 'version' not in header:
+            raise ValueError("índice sem analisador/versão registrados")
+        obj.analyzer = get_analyzer(header['analyzer'])
+        obj.version = header['version']
+        obj.k1 = header['k1']
+        obj.b = header['b']
+        obj.idf = index_file.array('idf')
+        obj.offsets = index_file.array('offsets')
+        obj.doc_ids = index_file.array('doc_ids')
+        obj.impacts = index_file.array('impacts')
+        obj.vocab = TermDictionary(StringTable(index_file.array('term_offsets'), index_file.array('term_blob')))
+        obj.documents = StringTable(index_file.array('doc_offsets'), index_file.array('doc_blob'))
+        if index_file.has_section('meta_offsets'):
+            obj.metadata = JsonTable(index_file.array('meta_offsets'), index_file.array('meta_blob'))
+        else:
+            obj.metadata = None
 
-        print(f"✅ Índice carregado: {len(documents)} documentos")
+        print(f"✅ Índice carregado: {len(obj.documents)} documentos")
         return obj
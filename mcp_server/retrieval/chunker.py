@@ -0,0 +1,298 @@
+"""
+Markdown Chunker - Structure-aware chunking for the legislative reports
+
+Splits a markdown document into chunks that follow the heading hierarchy:
+headings are never separated from their section body, tables are kept
+whole (or split by rows repeating the header), and each section is packed
+into overlapping windows with a token budget.
+
+Chunk text never contains blank lines, so a list of chunks joined with
+'\\n\\n' can still be split back by the MCP client.
+"""
+
+import hashlib
+import re
+from dataclasses import dataclass, field
+from typing import List, Tuple
+
+_HEADING_RE = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+_RULE_RE = re.compile(r'^\s*(?:-{3,}|\*{3,}|_{3,})\s*$')
+_FENCE_RE = re.compile(r'^\s*(```|~~~)')
+_SENTENCE_RE = re.compile(r'(?<=[.!?;:])\s+(?=\S)')
+
+# Tipos de bloco
+PARAGRAPH = 'paragraph'
+TABLE = 'table'
+CODE = 'code'
+
+
+@dataclass
+class Block:
+    """A contiguous piece of a section (paragraph, list, table or code)"""
+    kind: str
+    text: str
+    start: int
+    end: int
+
+    @property
+    def tokens(self) -> int:
+        return count_tokens(self.text)
+
+
+@dataclass
+class Chunk:
+    """A searchable window of a section with its location in the source"""
+    chunk_id: str
+    text: str
+    source: str
+    section_path: List[str] = field(default_factory=list)
+    start: int = 0
+    end: int = 0
+    tokens: int = 0
+
+    @property
+    def section(self) -> str:
+        return ' > '.join(self.section_path)
+
+    @property
+    def search_text(self) -> str:
+        """Text used for BM25/reranking: section path + body"""
+        if self.section_path:
+            return f"{self.section}\n{self.text}"
+        return self.text
+
+    def to_dict(self) -> dict:
+        return {
+            'chunk_id': self.chunk_id,
+            'source': self.source,
+            'section_path': list(self.section_path),
+            'start': self.start,
+            'end': self.end,
+            'tokens': self.tokens,
+        }
+
+
+def count_tokens(text: str) -> int:
+    """Token estimate used for the budget (whitespace-separated words)"""
+    return len(text.split())
+
+
+class MarkdownChunker:
+    """Heading-aware markdown chunker with overlapping token windows"""
+
+    def __init__(self, max_tokens: int = 160, overlap_tokens: int = 30, min_chars: int = 50):
+        """
+        Initialize chunker
+
+        Args:
+            max_tokens: Token budget of each chunk (words)
+            overlap_tokens: Tokens repeated from the end of the previous window
+            min_chars: Sections with less text than this are dropped
+        """
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.min_chars = min_chars
+
+    def chunk(self, content: str, source: str = '') -> List[Chunk]:
+        """
+        Split a markdown document into chunks
+
+        Args:
+            content: Markdown text
+            source: Document name stored in each chunk
+
+        Returns:
+            List of chunks in document order
+        """
+        chunks = []
+        for section_path, blocks in self._sections(content):
+            for window in self._windows(blocks):
+                text = '\n'.join(block.text for block in window)
+                if len(text) < self.min_chars:
+                    continue
+                chunks.append(Chunk(
+                    chunk_id=self._chunk_id(source, section_path, text),
+                    text=text,
+                    source=source,
+                    section_path=list(section_path),
+                    start=window[0].start,
+                    end=window[-1].end,
+                    tokens=count_tokens(text)
+                ))
+        return chunks
+
+    @staticmethod
+    def _chunk_id(source: str, section_path: List[str], text: str) -> str:
+        digest = hashlib.sha1()
+        digest.update(source.encode('utf-8'))
+        digest.update('\x00'.join(section_path).encode('utf-8'))
+        digest.update(text.encode('utf-8'))
+        return digest.hexdigest()[:16]
+
+    def _sections(self, content: str) -> List[Tuple[List[str], List[Block]]]:
+        """Group blocks under the heading path they belong to"""
+        sections = []
+        path = []  # [(level, title)]
+        blocks = []
+
+        def section_path():
+            # O título do documento (nível 1) já é identificado por `source`
+            return [title for level, title in path if level > 1]
+
+        for block, heading in self._blocks(content):
+            if heading is None:
+                blocks.append(block)
+                continue
+
+            if blocks:
+                sections.append((section_path(), blocks))
+                blocks = []
+
+            level, title = heading
+            while path and path[-1][0] >= level:
+                path.pop()
+            path.append((level, title))
+
+        if blocks:
+            sections.append((section_path(), blocks))
+        return sections
+
+    def _blocks(self, content: str):
+        """
+        Yield (block, heading) pairs in document order
+
+        Heading lines yield (None, (level, title)); other blocks yield
+        (block, None).
+        Offsets are character positions in the original content.
+        """
+        lines = content.splitlines(keepends=True)
+        offsets = []
+        position = 0
+        for line in lines:
+            offsets.append(position)
+            position += len(line)
+
+        i = 0
+        while i < len(lines):
+            line = lines[i].rstrip('\n')
+            stripped = line.strip()
+
+            if not stripped or _RULE_RE.match(stripped):
+                i += 1
+                continue
+
+            heading = _HEADING_RE.match(stripped)
+            if heading:
+                yield None, (len(heading.group(1)), heading.group(2).strip())
+                i += 1
+                continue
+
+            start = i
+            if _FENCE_RE.match(stripped):
+                # Bloco de código vai até a cerca de fechamento
+                i += 1
+                while i < len(lines) and not _FENCE_RE.match(lines[i]):
+                    i += 1
+                i = min(i + 1, len(lines))
+                kind = CODE
+            elif stripped.startswith('|'):
+                while i < len(lines) and lines[i].strip().startswith('|'):
+                    i += 1
+                kind = TABLE
+            else:
+                while i < len(lines):
+                    current = lines[i].strip()
+                    if (not current or _HEADING_RE.match(current) or _RULE_RE.match(current)
+                            or current.startswith('|') or _FENCE_RE.match(current)):
+                        break
+                    i += 1
+                kind = PARAGRAPH
+
+            text = '\n'.join(l.rstrip() for l in lines[start:i] if l.strip())
+            end = offsets[i - 1] + len(lines[i - 1].rstrip('\n'))
+            yield Block(kind, text, offsets[start], end), None
+
+    def _split_oversized(self, block: Block) -> List[Block]:
+        """Split a block larger than the budget into smaller blocks"""
+        if block.tokens <= self.max_tokens:
+            return [block]
+
+        rows = block.text.split('\n')
+        if block.kind == TABLE:
+            # Cabeçalho (e linha separadora) repetidos em cada parte
+            header = rows[:2] if len(rows) > 1 and set(rows[1].replace('|', '').strip()) <= set('-: ') else rows[:1]
+            return self._split_rows(block, header, rows[len(header):], [])
+        if block.kind == CODE:
+            # Cercas de abertura/fechamento repetidas em cada parte
+            footer = rows[-1:] if len(rows) > 1 and _FENCE_RE.match(rows[-1]) else []
+            return self._split_rows(block, rows[:1], rows[1:len(rows) - len(footer)], footer)
+
+        # Parágrafos/listas: quebra por linhas e, se preciso, por frases
+        pieces = []
+        cursor = block.start
+        for line in rows:
+            if count_tokens(line) <= self.max_tokens:
+                pieces.append(line)
+            else:
+                pieces.extend(_SENTENCE_RE.split(line))
+
+        result = []
+        for piece in pieces:
+            result.append(Block(block.kind, piece, cursor, min(cursor + len(piece), block.end)))
+            cursor = min(cursor + len(piece) + 1, block.end)
+        return result
+
+    def _split_rows(self, block: Block, header: List[str], body: List[str], footer: List[str]) -> List[Block]:
+        """Split a table/code block by rows, repeating header and footer in every part"""
+        fixed_tokens = count_tokens('\n'.join(header + footer))
+
+        parts = []
+        current = []
+        current_tokens = fixed_tokens
+        for row in body:
+            row_tokens = count_tokens(row)
+            if current and current_tokens + row_tokens > self.max_tokens:
+                parts.append(current)
+                current = []
+                current_tokens = fixed_tokens
+            current.append(row)
+            current_tokens += row_tokens
+        if current:
+            parts.append(current)
+
+        return [Block(block.kind, '\n'.join(header + part + footer), block.start, block.end) for part in parts]
+
+    def _windows(self, blocks: List[Block]) -> List[List[Block]]:
+        """Pack a section's blocks into overlapping windows within the budget"""
+        units = []
+        for block in blocks:
+            units.extend(self._split_oversized(block))
+
+        windows = []
+        current = []
+        current_tokens = 0
+
+        for unit in units:
+            if current and current_tokens + unit.tokens > self.max_tokens:
+                windows.append(current)
+
+                # Sobreposição: repete os últimos blocos (texto corrido) da janela anterior
+                overlap = []
+                overlap_tokens = 0
+                for previous in reversed(current):
+                    if previous.kind != PARAGRAPH or overlap_tokens + previous.tokens > self.overlap_tokens:
+                        break
+                    overlap.insert(0, previous)
+                    overlap_tokens += previous.tokens
+
+                if overlap_tokens + unit.tokens > self.max_tokens:
+                    overlap, overlap_tokens = [], 0
+                current = overlap
+                current_tokens = overlap_tokens
+
+            current.append(unit)
+            current_tokens += unit.tokens
+
+        if current:
+            windows.append(current)
+        return windows
@@ -0,0 +1,209 @@
+"""
+Corpus Indexer - Incremental indexing of a directory of markdown documents
+
+Tracks a content hash per file in a JSON manifest saved next to the BM25
+index. On each refresh only added or changed files are read, chunked and
+tokenized again; unchanged files reuse the chunks and analyzed tokens
+stored in the manifest (a manifest written with another analyzer is
+discarded, forcing a full rebuild). When
+anything changed, a new BM25 index is built, saved atomically (temp file +
+os.replace) and reopened via mmap; the caller swaps it into the running
+HybridSearch.
+
+Between refreshes only the file signatures stay in memory: chunks and
+tokens are read back from the manifest when a rebuild is needed.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Optional
+
+from .analyzer import Analyzer, get_analyzer
+from .bm25_index import BM25Index
+from .chunker import MarkdownChunker
+
+MANIFEST_VERSION = 2
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def atomic_write(path: str, data: bytes):
+    """Write a file through a temp file + os.replace (readers never see it half-written)"""
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class CorpusIndexer:
+    """Keeps a BM25 index in sync with the markdown files of a directory"""
+
+    def __init__(self, corpus_dir: str, index_path: str, pattern: str = '**/*.md',
+                 chunker: Optional[MarkdownChunker] = None, analyzer: Optional[Analyzer] = None):
+        """
+        Initialize corpus indexer
+
+        Args:
+            corpus_dir: Root directory of the documents (e.g. data/teorico)
+            index_path: Path of the BM25 index file (manifest goes next to it)
+            pattern: Glob pattern, relative to corpus_dir
+            chunker: Chunker used for new/changed files
+            analyzer: Text analysis chain of the BM25 index (default: Portuguese analyzer)
+        """
+        self.corpus_dir = corpus_dir
+        self.index_path = index_path
+        self.manifest_path = os.path.splitext(index_path)[0] + '.manifest.json'
+        self.pattern = pattern
+        self.chunker = chunker or MarkdownChunker()
+        self.analyzer = analyzer or get_analyzer()
+
+        # relpath -> {sha256, mtime_ns, size, chunks} (chunks e tokens só no manifesto em disco)
+        self.files: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+        self.files = {
+            relpath: {key: value for key, value in entry.items() if key != 'chunks'}
+            for relpath, entry in self._load_manifest().items()
+        }
+
+    def _load_manifest(self) -> Dict[str, dict]:
+        if not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Manifesto do corpus inválido ({e}), reindexando tudo")
+            return {}
+
+        # Tokens de outro analisador não servem: reindexa tudo
+        if manifest.get('version') != MANIFEST_VERSION or manifest.get('analyzer') != self.analyzer.name:
+            return {}
+        return manifest.get('files', {})
+
+    def _save_manifest(self, files: Dict[str, dict]):
+        manifest = {'version': MANIFEST_VERSION, 'analyzer': self.analyzer.name, 'files': files}
+        atomic_write(self.manifest_path, json.dumps(manifest, ensure_ascii=False).encode('utf-8'))
+
+    def _scan(self) -> Dict[str, str]:
+        """Return relpath -> absolute path of the corpus files"""
+        paths = glob.glob(os.path.join(self.corpus_dir, self.pattern), recursive=True)
+        return {
+            os.path.relpath(path, self.corpus_dir).replace(os.sep, '/'): path
+            for path in sorted(paths)
+            if os.path.isfile(path)
+        }
+
+    def _index_file(self, relpath: str, path: str, sha256: str, stat) -> dict:
+        with open(path, 'r', encoding='utf-8') as f:
+            content = f.read()
+
+        chunks = self.chunker.chunk(content, source=relpath)
+        return {
+            'sha256': sha256,
+            'mtime_ns': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'num_chunks': len(chunks),
+            'chunks': [
+                dict(chunk.to_dict(), text=chunk.text, search_text=chunk.search_text,
+                     tokens=self.analyzer.analyze(chunk.search_text))
+                for chunk in chunks
+            ],
+        }
+
+    def refresh(self, force: bool = False) -> Optional[BM25Index]:
+        """
+        Re-index added/changed files and drop removed ones
+
+        Args:
+            force: Rebuild the BM25 index even if no file changed
+
+        Returns:
+            The new BM25Index if the corpus changed (or force), else None
+        """
+        with self._lock:
+            current = self._scan()
+            changed = {}
+
+            for relpath, path in current.items():
+                stat = os.stat(path)
+                entry = self.files.get(relpath)
+
+                # mtime/tamanho iguais: não precisa nem ler o arquivo
+                if entry and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+                    continue
+
+                sha256 = file_sha256(path)
+                if entry and entry['sha256'] == sha256:
+                    entry['mtime_ns'] = stat.st_mtime_ns
+                    continue
+
+                changed[relpath] = self._index_file(relpath, path, sha256, stat)
+
+            removed = [relpath for relpath in self.files if relpath not in current]
+
+            if changed:
+                print(f"📄 Corpus: {len(changed)} arquivo(s) novo(s)/alterado(s): {', '.join(changed)}")
+            if removed:
+                print(f"🗑️  Corpus: {len(removed)} arquivo(s) removido(s): {', '.join(removed)}")
+
+            if not (changed or removed or force or not os.path.exists(self.index_path)):
+                return None
+
+            # Trechos dos arquivos inalterados vêm do manifesto
+            files = self._load_manifest()
+            files.update(changed)
+            files = {relpath: files[relpath] for relpath in current if relpath in files}
+            for relpath in self.files:
+                if relpath in files and relpath not in changed:
+                    files[relpath]['mtime_ns'] = self.files[relpath]['mtime_ns']
+
+            missing = [relpath for relpath in current if relpath not in files]
+            for relpath in missing:
+                # Manifesto perdido/inválido: reprocessa o arquivo
+                path = current[relpath]
+                files[relpath] = self._index_file(relpath, path, file_sha256(path), os.stat(path))
+
+            self._build_index(files).save(self.index_path)
+            self._save_manifest(files)
+            self.files = {
+                relpath: {key: value for key, value in entry.items() if key != 'chunks'}
+                for relpath, entry in files.items()
+            }
+
+            # Reabre via mmap: o índice em uso não fica no heap do processo
+            return BM25Index.load(self.index_path)
+
+    def _build_index(self, files: Dict[str, dict]) -> BM25Index:
+        documents = []
+        metadata = []
+        tokenized = []
+
+        # Tokens vêm do manifesto: só os arquivos alterados passaram pelo analisador
+        for relpath in sorted(files):
+            for chunk in files[relpath]['chunks']:
+                documents.append(chunk['search_text'])
+                metadata.append({key: value for key, value in chunk.items()
+                                 if key not in ('search_text', 'tokens')})
+                tokenized.append(chunk['tokens'])
+
+        print(f"📝 Corpus: {len(files)} arquivo(s), {len(documents)} trechos")
+        return BM25Index(documents, metadata, tokenized=tokenized, analyzer=self.analyzer)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'files': len(self.files),
+                'chunks': sum(entry.get('num_chunks', 0) for entry in self.files.values()),
+            }
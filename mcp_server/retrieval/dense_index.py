@@ -0,0 +1,175 @@
+"""
+Dense Index - Embedding retrieval over the indexed chunks
+
+BM25 only finds chunks that share words with the question; paraphrases
+("repasse direto para municípios" vs "transferência especial") need a
+semantic match. Each chunk gets a normalized sentence embedding, computed
+once when the index is built and stored as a float16 matrix in the same
+binary container as the BM25 index (opened via mmap).
+
+Search is brute force: one matrix-vector product (cosine similarity) and
+argpartition. Rows follow the BM25 document order, and the header records
+the BM25 version they were built for. On rebuild, embeddings of chunks
+whose chunk_id did not change are copied instead of recomputed.
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .bm25_index import StringTable, _pack_strings
+from .index_file import IndexFile, write_index_file
+
+INDEX_KIND = 'dense'
+DEFAULT_EMBEDDING_MODEL = 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2'
+
+# Linhas convertidas para float32 por vez na busca (limita a memória temporária)
+_SEARCH_BLOCK = 8192
+
+
+class Embedder:
+    """Sentence embedding model (L2-normalized float32 vectors)"""
+
+    def __init__(self, model_name: str = DEFAULT_EMBEDDING_MODEL):
+        """
+        Load the embedding model
+
+        Args:
+            model_name: sentence-transformers model (multilingual: the corpus is in Portuguese)
+        """
+        # Import tardio: só carrega torch quando a busca densa está ligada
+        from sentence_transformers import SentenceTransformer
+
+        print(f"⏳ Carregando modelo de embeddings: {model_name}")
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name, device='cpu')
+        # Renomeado para get_embedding_dimension nas versões novas
+        get_dimension = getattr(self.model, 'get_embedding_dimension', None) or \
+            self.model.get_sentence_embedding_dimension
+        self.dim = get_dimension()
+        print(f"✅ Modelo de embeddings carregado ({self.dim} dimensões)")
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        if len(texts) == 0:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        embeddings = self.model.encode(
+            texts, batch_size=batch_size, normalize_embeddings=True, show_progress_bar=False
+        )
+        return np.asarray(embeddings, dtype=np.float32)
+
+
+class DenseIndex:
+    """Float16 embedding matrix aligned with the BM25 documents"""
+
+    def __init__(self, embeddings: np.ndarray, chunk_ids: Sequence[str], model_name: str, bm25_version: str):
+        """
+        Initialize dense index
+
+        Args:
+            embeddings: (num_docs, dim) normalized embeddings
+            chunk_ids: Chunk id of each row
+            model_name: Embedding model that produced the vectors
+            bm25_version: Version of the BM25 index with the same document order
+        """
+        self.embeddings = embeddings.astype(np.float16, copy=False)
+        self.chunk_ids = chunk_ids
+        self.model_name = model_name
+        self.bm25_version = bm25_version
+
+    @property
+    def dim(self) -> int:
+        return self.embeddings.shape[1]
+
+    def __len__(self) -> int:
+        return self.embeddings.shape[0]
+
+    @classmethod
+    def build(cls, texts: List[str], chunk_ids: List[str], embedder: Embedder, bm25_version: str,
+              previous: Optional['DenseIndex'] = None) -> 'DenseIndex':
+        """
+        Embed the documents of a BM25 index
+
+        Args:
+            texts: Text of each document (same order as the BM25 index)
+            chunk_ids: Chunk id of each document
+            embedder: Embedding model
+            bm25_version: Version of that BM25 index
+            previous: Index of an older version (unchanged chunks are reused)
+        """
+        embeddings = np.zeros((len(texts), embedder.dim), dtype=np.float16)
+
+        reusable: Dict[str, int] = {}
+        if previous is not None and previous.model_name == embedder.model_name and previous.dim == embedder.dim:
+            reusable = {chunk_id: row for row, chunk_id in enumerate(previous.chunk_ids)}
+
+        missing = []
+        for row, chunk_id in enumerate(chunk_ids):
+            if chunk_id in reusable:
+                embeddings[row] = previous.embeddings[reusable[chunk_id]]
+            else:
+                missing.append(row)
+
+        if missing:
+            print(f"🧮 Calculando embeddings de {len(missing)} de {len(texts)} trechos...")
+            embeddings[missing] = embedder.encode([texts[row] for row in missing])
+
+        return cls(embeddings, list(chunk_ids), embedder.model_name, bm25_version)
+
+    def search(self, query_embedding: np.ndarray, top_k: int = 20) -> List[Tuple[int, float]]:
+        """
+        Most similar documents (cosine similarity)
+
+        Returns:
+            List of (document index, similarity) sorted by similarity
+        """
+        num_docs = len(self)
+        if num_docs == 0 or top_k <= 0:
+            return []
+
+        query = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+        scores = np.empty(num_docs, dtype=np.float32)
+        for start in range(0, num_docs, _SEARCH_BLOCK):
+            block = self.embeddings[start:start + _SEARCH_BLOCK]
+            scores[start:start + len(block)] = block.astype(np.float32) @ query
+
+        if num_docs > top_k:
+            top = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            top = np.arange(num_docs)
+        top = top[np.argsort(-scores[top], kind='stable')]
+
+        return [(int(i), float(scores[i])) for i in top]
+
+    def save(self, path: str):
+        """Save index to disk (binary format, written atomically)"""
+        chunk_offsets, chunk_blob = _pack_strings(list(self.chunk_ids))
+        write_index_file(path, INDEX_KIND, {
+            'embeddings': self.embeddings.reshape(-1),
+            'chunk_offsets': chunk_offsets,
+            'chunk_blob': chunk_blob,
+        }, metadata={
+            'num_docs': len(self),
+            'dim': self.dim,
+            'model_name': self.model_name,
+            'bm25_version': self.bm25_version,
+        })
+        print(f"✅ Índice denso salvo em: {path}")
+
+    @classmethod
+    def load(cls, path: str) -> 'DenseIndex':
+        """
+        Open index from disk via mmap
+
+        Raises:
+            ValueError: If the file is not in the current index format
+        """
+        index_file = IndexFile(path, INDEX_KIND)
+        header = index_file.metadata
+
+        obj = cls.__new__(cls)
+        obj.index_file = index_file
+        obj.model_name = header['model_name']
+        obj.bm25_version = header['bm25_version']
+        obj.embeddings = index_file.array('embeddings').reshape(header['num_docs'], header['dim'])
+        obj.chunk_ids = StringTable(index_file.array('chunk_offsets'), index_file.array('chunk_blob'))
+        return obj
@@ -1,34 +1,191 @@
 """
-Hybrid Search - BM25 + Reranking pipeline
+Hybrid Search - BM25 + dense retrieval + Reranking pipeline
+
+Stage 1 gathers candidates from BM25 (lexical) and, when a dense index is
+configured, from embedding similarity; both ranked lists are merged with
+reciprocal-rank fusion. Stage 2 reranks the fused candidates with the
+cross-encoder.
+
+Embeddings for a new BM25 version are computed on a background thread;
+until they are ready, searches use BM25 only.
 """
 
+import hashlib
 import os
-from typing import List
+import threading
+from typing import Iterable, List, Optional
+
+import numpy as np
+
 from .bm25_index import BM25Index
-from .reranker import Reranker
+from .chunker import MarkdownChunker
+from .dense_index import DEFAULT_EMBEDDING_MODEL, DenseIndex, Embedder
+from .reranker import Reranker, scorer_name
+from .search_cache import SearchCache, normalize_query
+
+# Constante usual do RRF: reduz o peso das primeiras posições de cada lista
+RRF_K = 60
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[int]], k: int = RRF_K) -> List[int]:
+    """Merge ranked lists of document ids: score(d) = sum of 1 / (k + rank of d)"""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, 1):
+            scores[doc] = scores.get(doc, 0.0) + 1.0 / (k + rank)
+    # Empates mantêm a ordem de inserção (BM25 primeiro)
+    return sorted(scores, key=lambda doc: -scores[doc])
 
 
 class HybridSearch:
-    """Two-stage hybrid search: BM25 recall + Reranker precision"""
+    """Two-stage hybrid search: BM25 + dense recall, Reranker precision"""
 
-    def __init__(self, index_path: str = None):
+    def __init__(self, index_path: str = None, cache: Optional[SearchCache] = None,
+                 dense_path: Optional[str] = None, embedding_model: str = DEFAULT_EMBEDDING_MODEL):
         """
         Initialize hybrid search
 
         Args:
             index_path: Path to BM25 index file (optional)
+            cache: Result/score cache (default: in-memory only)
+            dense_path: Path to the dense index file (None disables dense retrieval)
+            embedding_model: sentence-transformers model for the dense index
         """
         self.bm25 = None
+        self.dense = None
         self.reranker = None
+        self.embedder = None
+        self.dense_path = dense_path
+        self.embedding_model = embedding_model
+        self._reranker_lock = threading.Lock()
+        self._embedder_lock = threading.Lock()
+        self._dense_lock = threading.Lock()
+        self._dense_pending = None  # BM25 aguardando embeddings
+        self._dense_thread = None
+        self.cache = cache or SearchCache(model_name=scorer_name())
 
         # Load BM25 index if exists
         if index_path and os.path.exists(index_path):
-            self.bm25 = BM25Index.load(index_path)
+            try:
+                self.bm25 = BM25Index.load(index_path)
+            except ValueError as e:
+                # Índice em formato antigo (ex: rank_bm25): precisa ser recriado
+                print(f"⚠️  Índice BM25 será recriado ({e})")
+                self.bm25 = None
+
+            # Índice sem metadados de seção: precisa ser recriado
+            if self.bm25 is not None and self.bm25.metadata is None:
+                print("⚠️  Índice BM25 sem metadados de seção, será recriado")
+                self.bm25 = None
+
+        if self.bm25 is not None:
+            self._sync_dense(self.bm25)
+
+    def set_index(self, bm25: BM25Index):
+        """Swap in a new index (searches already running keep the old one)"""
+        # BM25 entra na hora; até o índice denso da nova versão ficar pronto (em background), a busca é só lexical
+        self.bm25 = bm25
+        self._sync_dense(bm25)
+
+    @property
+    def dense_building(self) -> bool:
+        """True while embeddings for a BM25 version are being computed"""
+        thread = self._dense_thread
+        return thread is not None and thread.is_alive()
+
+    def _sync_dense(self, bm25: BM25Index, background: bool = True):
+        """
+        Open or (re)build the dense index matching a BM25 index
+
+        Args:
+            bm25: BM25 index the dense index must match
+            background: Compute missing embeddings on a worker thread (the
+                caller never waits for the embedding model)
+        """
+        if not self.dense_path:
+            return
+
+        dense = self._open_dense(bm25)
+        if self._matches(dense, bm25):
+            self.dense = dense
+            return
+
+        if not background:
+            self._build_dense(bm25)
+            return
+
+        # Uma thread só: trocas seguidas de índice calculam apenas a versão mais recente
+        with self._dense_lock:
+            self._dense_pending = bm25
+            if not self.dense_building:
+                self._dense_thread = threading.Thread(target=self._dense_worker, name="dense-index", daemon=True)
+                self._dense_thread.start()
+
+    def _dense_worker(self):
+        while True:
+            with self._dense_lock:
+                bm25, self._dense_pending = self._dense_pending, None
+                if bm25 is None:
+                    return
+            self._build_dense(bm25)
+
+    def _open_dense(self, bm25: BM25Index) -> Optional[DenseIndex]:
+        """Dense index in memory or on disk (matching the BM25 version if possible)"""
+        dense = self.dense
+        if (dense is None or dense.bm25_version != bm25.version) and os.path.exists(self.dense_path):
+            try:
+                dense = DenseIndex.load(self.dense_path)
+            except (ValueError, KeyError) as e:
+                print(f"⚠️  Índice denso será recriado ({e})")
+        return dense
+
+    def _matches(self, dense: Optional[DenseIndex], bm25: BM25Index) -> bool:
+        return dense is not None and dense.bm25_version == bm25.version and dense.model_name == self.embedding_model
+
+    def _build_dense(self, bm25: BM25Index):
+        """Embed the chunks of a BM25 index (reusing unchanged ones) and open the result"""
+        dense = self._open_dense(bm25)
+        if self._matches(dense, bm25):
+            self.dense = dense
+            return
+
+        try:
+            self._lazy_load_embedder()
+            documents = [bm25.documents[i] for i in range(len(bm25.documents))]
+            chunk_ids = [self._chunk_id(bm25, i) for i in range(len(bm25.documents))]
+            DenseIndex.build(documents, chunk_ids, self.embedder, bm25.version, previous=dense).save(self.dense_path)
+            # Reabre via mmap, como o índice BM25
+            self.dense = DenseIndex.load(self.dense_path)
+        except Exception as e:
+            # Sem modelo de embeddings (ex: offline): segue só com BM25
+            print(f"⚠️  Busca densa desativada: {e}")
+            self.dense = None
+
+    def _lazy_load_embedder(self):
+        """Lazy load embedding model (only when needed)"""
+        with self._embedder_lock:
+            if self.embedder is None:
+                self.embedder = Embedder(self.embedding_model)
+
+    @staticmethod
+    def _chunk_id(bm25: BM25Index, i: int) -> str:
+        meta = bm25.metadata[i] if bm25.metadata else {}
+        return meta.get('chunk_id') or hashlib.sha1(bm25.documents[i].encode('utf-8')).hexdigest()[:16]
 
     def _lazy_load_reranker(self):
         """Lazy load reranker (only when needed)"""
-        if self.reranker is None:
-            self.reranker = Reranker()
+        # Buscas concorrentes compartilham um único modelo/micro-batcher
+        with self._reranker_lock:
+            if self.reranker is None:
+                self.reranker = Reranker()
+
+    def warm_up(self):
+        """Load the reranker and run one dummy inference (lazy init, first allocations)"""
+        self._lazy_load_reranker()
+        self.reranker.score("aquecimento do modelo", ["Emendas parlamentares ao orçamento da União."])
+        if self.dense is not None:
+            self._lazy_load_embedder()
+            self.embedder.encode(["aquecimento do modelo"])
 
     def index_documents(self, markdown_file: str, index_path: str):
         """
@@ -44,26 +201,24 @@ class HybridSearch:
         with open(markdown_file, 'r', encoding='utf-8') as f:
             content = f.read()
 
-        # Split into paragraphs (filter out very short ones)
-        paragraphs = [
-            p.strip()
-            for p in content.split('\n\n')
-            if len(p.strip()) > 50  # Min 50 chars
-        ]
+        # Split into section-aware chunks (headings, tables, token windows)
+        chunks = MarkdownChunker().chunk(content, source=os.path.basename(markdown_file))
 
-        print(f"📝 Encontrados {len(paragraphs)} parágrafos")
+        print(f"📝 Gerados {len(chunks)} trechos")
 
-        # Create BM25 index
-        self.bm25 = BM25Index(paragraphs)
+        # Create BM25 index (section path is indexed with the chunk body)
+        metadata = [dict(chunk.to_dict(), text=chunk.text) for chunk in chunks]
+        self.bm25 = BM25Index([chunk.search_text for chunk in chunks], metadata)
 
         # Save index
         self.bm25.save(index_path)
+        self._sync_dense(self.bm25, background=False)
 
     def search(self, query: str, top_k: int = 5, bm25_candidates: int = 20) -> List[str]:
         """
         Two-stage hybrid search
 
-        Stage 1: BM25 retrieves top N candidates (fast, keyword-based)
+        Stage 1: BM25 (+ dense, fused by RRF) retrieves top N candidates
         Stage 2: Reranker selects top K from candidates (slower, semantic)
 
         Args:
@@ -74,22 +229,80 @@ class HybridSearch:
         Returns:
             List of relevant document strings
         """
-        if not self.bm25:
+        return [result['text'] for result in self.search_chunks(query, top_k, bm25_candidates)]
+
+    def search_chunks(self, query: str, top_k: int = 5, bm25_candidates: int = 20) -> List[dict]:
+        """
+        Same as search, returning each chunk with its metadata
+
+        Repeated queries are answered from the result cache; for new ones,
+        only (query, chunk) pairs without a cached score go to the reranker.
+
+        Returns:
+            List of dicts with text, section_path, source, chunk_id,
+            start, end, tokens and score
+        """
+        # Referência única aos índices: uma troca no meio da busca não afeta esta chamada
+        bm25 = self.bm25
+        if not bm25:
             print("⚠️  Índice BM25 não carregado!")
             return []
 
-        # Stage 1: BM25 Recall (fast)
-        print(f"🔍 Stage 1: BM25 retrieving top {bm25_candidates} candidates...")
-        candidates = self.bm25.search(query, top_k=bm25_candidates)
-        docs_only = [doc for doc, score in candidates]
+        dense = self.dense
+        if dense is not None and dense.bm25_version != bm25.version:
+            dense = None  # índice denso da versão nova ainda sendo calculado
+
+        raw_query = query
+        query = normalize_query(query)
+        self.cache.set_index_version(bm25.version if dense is None else f"{bm25.version}+dense")
+        cache_key = (query, top_k, bm25_candidates)
+        cached = self.cache.get_results(cache_key)
+        if cached is not None:
+            print("⚡ Resultado em cache (sem reranking)")
+            return cached
+
+        # Stage 1: BM25 Recall (fast) + busca densa, fundidas por RRF
+        if dense is None:
+            print(f"🔍 Stage 1: BM25 retrieving top {bm25_candidates} candidates...")
+            candidates = [i for i, score in bm25.search_indices(query, top_k=bm25_candidates)]
+        else:
+            print(f"🔍 Stage 1: BM25 + dense (RRF) retrieving top {bm25_candidates} candidates...")
+            candidates = reciprocal_rank_fusion([
+                [i for i, score in bm25.search_indices(query, top_k=bm25_candidates)],
+                self._dense_search(dense, raw_query, bm25_candidates),
+            ])[:bm25_candidates]
 
-        if len(docs_only) == 0:
+        if len(candidates) == 0:
             return []
 
-        # Stage 2: Reranker Precision (semantic)
-        print(f"🎯 Stage 2: Reranking to top {top_k}...")
-        self._lazy_load_reranker()
-        reranked = self.reranker.rerank(query, docs_only, top_k=top_k)
+        metadata = [bm25.metadata[i] if bm25.metadata else {'text': bm25.documents[i]} for i in candidates]
+        chunk_ids = [self._chunk_id(bm25, i) for i in candidates]
+
+        # Stage 2: Reranker Precision (semantic), só para pares sem score em cache
+        scores = self.cache.get_scores(query, chunk_ids)
+        missing = [(i, chunk_id) for i, chunk_id in zip(candidates, chunk_ids) if chunk_id not in scores]
+        if missing:
+            print(f"🎯 Stage 2: Reranking {len(missing)} of {len(candidates)} candidates to top {top_k}...")
+            self._lazy_load_reranker()
+            new_scores = self.reranker.score(query, [bm25.documents[i] for i, _ in missing])
+            new_scores = {chunk_id: float(score) for (_, chunk_id), score in zip(missing, new_scores)}
+            self.cache.put_scores(query, new_scores)
+            scores.update(new_scores)
+
+        ranked = np.argsort([-scores[chunk_id] for chunk_id in chunk_ids], kind='stable')[:top_k]
+        results = [dict(metadata[j], score=scores[chunk_ids[j]]) for j in ranked]
 
-        # Return only documents (no scores)
-        return [doc for doc, score in reranked]
+        self.cache.put_results(cache_key, results)
+        return results
+
+    def _dense_search(self, dense: DenseIndex, query: str, top_k: int) -> List[int]:
+        """Document indices most similar to the query (empty if the embedder fails)"""
+        try:
+            self._lazy_load_embedder()
+            query_embedding = self.embedder.encode([query])[0]
+        except Exception as e:
+            # Não tenta carregar o modelo de novo a cada busca
+            print(f"⚠️  Busca densa desativada: {e}")
+            self.dense = None
+            return []
+        return [i for i, score in dense.search(query_embedding, top_k=top_k)]
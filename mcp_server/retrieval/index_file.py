@@ -0,0 +1,133 @@
+"""
+Index File - Versioned binary container opened via mmap
+
+Layout:
+    magic (8 bytes) | version (uint32) | header length (uint32) |
+    header (JSON, utf-8) | sections (each aligned to 64 bytes)
+
+The JSON header describes each section (offset, length, dtype) plus free
+metadata. Sections are read with np.frombuffer directly over the mmap, so
+opening an index copies nothing into the process heap: pages are loaded on
+demand and shared between processes through the OS page cache.
+
+Files are always written to a temp file and swapped in with os.replace, so
+processes that still map the old file keep a valid view of it.
+"""
+
+import json
+import mmap
+import os
+import struct
+from typing import Dict, Optional
+
+import numpy as np
+
+MAGIC = b'MCPIDX\x00\x01'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+_PREFIX = struct.Struct('<8sII')
+
+
+def _align(position: int) -> int:
+    return (position + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def write_index_file(path: str, kind: str, sections: Dict[str, np.ndarray], metadata: Optional[dict] = None):
+    """
+    Write a set of arrays as a binary index file (atomically)
+
+    Args:
+        path: Destination path
+        kind: Index type stored in the header (checked on open)
+        sections: Name -> 1-D NumPy array (use uint8 for byte blobs)
+        metadata: Extra JSON-serializable values for the header
+    """
+    arrays = {name: np.ascontiguousarray(array) for name, array in sections.items()}
+
+    # O header depende dos offsets, que dependem do tamanho do header:
+    # calcula com offsets relativos e desloca pelo início da área de dados
+    layout = {}
+    relative = 0
+    for name, array in arrays.items():
+        relative = _align(relative)
+        layout[name] = {
+            'offset': relative,
+            'count': int(array.size),
+            'dtype': array.dtype.str,
+        }
+        relative += array.nbytes
+
+    header = {'kind': kind, 'metadata': metadata or {}, 'sections': layout}
+    header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    data_start = _align(_PREFIX.size + len(header_bytes))
+    header['data_start'] = data_start
+    header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+
+    # O header cresceu com o campo data_start: recalcula se passar do alinhamento
+    while _PREFIX.size + len(header_bytes) > data_start:
+        data_start = _align(_PREFIX.size + len(header_bytes))
+        header['data_start'] = data_start
+        header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(_PREFIX.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name]['offset'])
+            f.write(array.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class IndexFile:
+    """Read-only mmap view of a binary index file"""
+
+    def __init__(self, path: str, kind: str):
+        """
+        Open an index file
+
+        Args:
+            path: Index file path
+            kind: Expected index type
+
+        Raises:
+            ValueError: If the file is not a supported index of this kind
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._mmap) < _PREFIX.size:
+            raise ValueError("arquivo de índice truncado")
+
+        magic, version, header_length = _PREFIX.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError("arquivo não é um índice (magic inválido)")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"versão de índice {version} não suportada (esperada {FORMAT_VERSION})")
+
+        header = json.loads(self._mmap[_PREFIX.size:_PREFIX.size + header_length].decode('utf-8'))
+        if header.get('kind') != kind:
+            raise ValueError(f"índice do tipo '{header.get('kind')}', esperado '{kind}'")
+
+        self.metadata = header['metadata']
+        self._sections = header['sections']
+        self._data_start = header['data_start']
+
+    def has_section(self, name: str) -> bool:
+        return name in self._sections
+
+    def array(self, name: str) -> np.ndarray:
+        """Zero-copy view of a section"""
+        section = self._sections[name]
+        if section['count'] == 0:
+            return np.empty(0, dtype=np.dtype(section['dtype']))
+        return np.frombuffer(
+            self._mmap,
+            dtype=np.dtype(section['dtype']),
+            count=section['count'],
+            offset=self._data_start + section['offset']
+        )
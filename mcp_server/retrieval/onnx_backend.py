@@ -0,0 +1,240 @@
+"""
+ONNX Backend - Cross-encoder inference through onnxruntime (int8)
+
+The PyTorch path imports torch and keeps an fp32 model in memory, which
+dominates first-query latency and the server RSS on CPU-only hosts. Here
+the cross-encoder is exported once to ONNX and quantized with dynamic int8
+quantization; at serving time only onnxruntime and the `tokenizers`
+library are loaded (no torch, no transformers).
+
+Export (needs torch + sentence-transformers + onnxruntime, run once):
+    python -m retrieval.onnx_backend [--model NAME] [--output DIR]
+
+The export directory holds model.onnx (fp32), model_int8.onnx, the
+tokenizer and onnx_config.json (max length, input names and the activation
+the PyTorch CrossEncoder applies, so scores match the torch path).
+"""
+
+import argparse
+import importlib.util
+import inspect
+import json
+import os
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+EXPORT_FORMAT = 1
+CONFIG_FILE = 'onnx_config.json'
+FP32_FILE = 'model.onnx'
+INT8_FILE = 'model_int8.onnx'
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+
+
+def default_model_dir(model_name: str) -> str:
+    """Export directory of a model (retrieval/models/<name>-onnx)"""
+    return os.path.join(MODELS_DIR, model_name.split('/')[-1] + '-onnx')
+
+
+def onnxruntime_available() -> bool:
+    return importlib.util.find_spec('onnxruntime') is not None and \
+        importlib.util.find_spec('tokenizers') is not None
+
+
+def is_exported(model_dir: str, quantized: bool = True) -> bool:
+    model_file = INT8_FILE if quantized else FP32_FILE
+    return all(
+        os.path.exists(os.path.join(model_dir, name))
+        for name in (CONFIG_FILE, 'tokenizer.json', model_file)
+    )
+
+
+def read_export_config(model_dir: str) -> dict:
+    """
+    Read onnx_config.json of an export directory
+
+    Raises:
+        ValueError: If the export was made by another format version
+    """
+    with open(os.path.join(model_dir, CONFIG_FILE), 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    if config.get('format') != EXPORT_FORMAT:
+        raise ValueError(f"exportação ONNX em formato {config.get('format')} (esperado {EXPORT_FORMAT})")
+    return config
+
+
+def _activation_name(cross_encoder) -> str:
+    """Activation applied by CrossEncoder.predict (depends on the model config)"""
+    import torch
+
+    activation = getattr(cross_encoder, 'activation_fn', None) or \
+        getattr(cross_encoder, 'default_activation_function', None)
+    if activation is None or isinstance(activation, torch.nn.Identity):
+        return 'identity'
+    if isinstance(activation, torch.nn.Sigmoid):
+        return 'sigmoid'
+    raise ValueError(f"ativação {type(activation).__name__} não suportada no backend ONNX")
+
+
+def export_onnx_model(model_name: str, output_dir: Optional[str] = None,
+                      quantize: bool = True, opset: int = 17) -> str:
+    """
+    Export a sentence-transformers CrossEncoder to ONNX (+ dynamic int8 quantization)
+
+    Args:
+        model_name: HuggingFace model name
+        output_dir: Export directory (default: retrieval/models/<name>-onnx)
+        quantize: Also write the int8 model
+        opset: ONNX opset version
+
+    Returns:
+        The export directory
+    """
+    # Só a exportação precisa de torch
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import CrossEncoder
+
+    output_dir = output_dir or default_model_dir(model_name)
+    os.makedirs(output_dir, exist_ok=True)
+
+    print(f"⏳ Exportando {model_name} para ONNX em {output_dir}")
+    cross_encoder = CrossEncoder(model_name, device='cpu')
+    model = cross_encoder.model.eval()
+    tokenizer = cross_encoder.tokenizer
+    if not tokenizer.is_fast:
+        raise ValueError("backend ONNX requer um tokenizer rápido (tokenizer.json)")
+
+    sample = tokenizer(['consulta de exemplo'], ['documento de exemplo'], return_tensors='pt')
+    input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in sample]
+
+    class _Logits(torch.nn.Module):
+        # Saída só com os logits (o ONNX não exporta o ModelOutput)
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs)), return_dict=False)[0]
+
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+    dynamic_axes['logits'] = {0: 'batch'}
+
+    # Exportador TorchScript (o dynamo, padrão nas versões novas, exige onnxscript)
+    export_kwargs = {'dynamo': False} if 'dynamo' in inspect.signature(torch.onnx.export).parameters else {}
+
+    fp32_path = os.path.join(output_dir, FP32_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            _Logits(model),
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=['logits'],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            **export_kwargs,
+        )
+
+    if quantize:
+        # Pesos int8, ativações quantizadas em tempo de execução
+        quantize_dynamic(fp32_path, os.path.join(output_dir, INT8_FILE), weight_type=QuantType.QInt8)
+
+    tokenizer.save_pretrained(output_dir)
+
+    config = {
+        'format': EXPORT_FORMAT,
+        'model_name': model_name,
+        'max_length': cross_encoder.max_length or tokenizer.model_max_length,
+        'activation': _activation_name(cross_encoder),
+        'input_names': input_names,
+        'pad_token': tokenizer.pad_token,
+        'pad_id': tokenizer.pad_token_id,
+    }
+    with open(os.path.join(output_dir, CONFIG_FILE), 'w', encoding='utf-8') as f:
+        json.dump(config, f, indent=2)
+
+    print(f"✅ Modelo ONNX exportado{' (fp32 + int8)' if quantize else ''}")
+    return output_dir
+
+
+class OnnxCrossEncoder:
+    """Drop-in for CrossEncoder.predict backed by an onnxruntime session"""
+
+    def __init__(self, model_dir: str, quantized: bool = True, num_threads: int = 0):
+        """
+        Load an exported model
+
+        Args:
+            model_dir: Export directory (see export_onnx_model)
+            quantized: Use the int8 model (False = fp32 export)
+            num_threads: onnxruntime intra-op threads (0 = library default)
+        """
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        config = read_export_config(model_dir)
+        self.model_name = config['model_name']
+        self.activation = config['activation']
+        self.input_names = config['input_names']
+
+        # Mesma tokenização do CrossEncoder: truncamento longest_first, padding pelo maior do lote
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, 'tokenizer.json'))
+        self.tokenizer.enable_truncation(max_length=config['max_length'], strategy='longest_first')
+        self.tokenizer.enable_padding(pad_id=config['pad_id'], pad_token=config['pad_token'])
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads > 0:
+            options.intra_op_num_threads = num_threads
+
+        model_path = os.path.join(model_dir, INT8_FILE if quantized else FP32_FILE)
+        self.session = ort.InferenceSession(model_path, sess_options=options,
+                                            providers=['CPUExecutionProvider'])
+
+    def _encode(self, pairs: Sequence[Tuple[str, str]]) -> dict:
+        encodings = self.tokenizer.encode_batch([(query.strip(), doc.strip()) for query, doc in pairs])
+        feeds = {
+            'input_ids': [encoding.ids for encoding in encodings],
+            'attention_mask': [encoding.attention_mask for encoding in encodings],
+            'token_type_ids': [encoding.type_ids for encoding in encodings],
+        }
+        return {name: np.asarray(feeds[name], dtype=np.int64) for name in self.input_names}
+
+    def predict(self, pairs: List[Tuple[str, str]], batch_size: int = 32,
+                show_progress_bar: bool = False) -> np.ndarray:
+        """
+        Score (query, document) pairs
+
+        Returns:
+            One score per pair (same scale as CrossEncoder.predict)
+        """
+        if len(pairs) == 0:
+            return np.zeros(0, dtype=np.float32)
+
+        scores = []
+        for start in range(0, len(pairs), batch_size):
+            logits = self.session.run(['logits'], self._encode(pairs[start:start + batch_size]))[0]
+            scores.append(logits[:, 0])
+        scores = np.concatenate(scores).astype(np.float32)
+
+        if self.activation == 'sigmoid':
+            scores = 1.0 / (1.0 + np.exp(-scores))
+        return scores
+
+
+def main():
+    from .reranker import DEFAULT_MODEL
+
+    parser = argparse.ArgumentParser(description="Exporta o CrossEncoder para ONNX (int8)")
+    parser.add_argument('--model', default=DEFAULT_MODEL)
+    parser.add_argument('--output', default=None, help="diretório de saída (padrão: retrieval/models/)")
+    parser.add_argument('--no-quantize', action='store_true', help="exporta só o modelo fp32")
+    args = parser.parse_args()
+
+    export_onnx_model(args.model, args.output, quantize=not args.no_quantize)
+
+
+if __name__ == '__main__':
+    main()
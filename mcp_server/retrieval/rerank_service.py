@@ -0,0 +1,147 @@
+"""
+Rerank Service - Cross-request micro-batching for the cross-encoder
+
+Concurrent searches each used to run their own small forward pass. Here,
+every caller enqueues its (query, document) pairs and blocks; a single
+worker thread collects pairs from all callers until the batch is full or
+the oldest pair has waited `max_wait_ms`. The window is then sorted by
+length and cut into batches (length buckets), so each forward pass pads
+to similar lengths. Scores are routed back to each waiting caller.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class _Request:
+    """Pairs of one caller and the future that receives their scores"""
+
+    def __init__(self, count: int):
+        self.scores = np.zeros(count, dtype=np.float32)
+        self.remaining = count
+        self.future = Future()
+
+
+class RerankService:
+    """Queues (query, document) pairs and scores them in micro-batches"""
+
+    def __init__(self, scorer: Callable[[List[Tuple[str, str]]], Sequence[float]],
+                 max_batch_size: int = 32, max_wait_ms: float = 5.0, window_batches: int = 4):
+        """
+        Initialize service and start the worker thread
+
+        Args:
+            scorer: Function that scores a list of (query, document) pairs
+            max_batch_size: Pairs per forward pass
+            max_wait_ms: Max time the oldest queued pair waits for a batch to fill
+            window_batches: Batches collected per window before sorting by length
+        """
+        self.scorer = scorer
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.window_size = max_batch_size * window_batches
+
+        self._queue = queue.Queue()
+        self._closed = False   # close() chamado: novas chamadas falham
+        self._stopped = False  # worker chegou ao marcador de fim da fila
+
+        self.batches = 0
+        self.pairs = 0
+
+        self._worker = threading.Thread(target=self._run, name="rerank-batcher", daemon=True)
+        self._worker.start()
+
+    def score(self, query: str, documents: List[str], timeout: Optional[float] = None) -> np.ndarray:
+        """
+        Score documents for a query (blocks until the batches containing them ran)
+
+        Returns:
+            Scores in the same order as documents
+        """
+        if len(documents) == 0:
+            return np.zeros(0, dtype=np.float32)
+        if self._closed:
+            raise RuntimeError("serviço de reranking encerrado")
+
+        request = _Request(len(documents))
+        enqueued_at = time.monotonic()
+        for i, doc in enumerate(documents):
+            self._queue.put((enqueued_at, len(query) + len(doc), request, i, (query, doc)))
+        return request.future.result(timeout=timeout)
+
+    def _collect(self) -> list:
+        """Wait for the first pair, then gather more until full or deadline"""
+        first = self._queue.get()
+        if first is None:
+            self._stopped = True
+            return []
+
+        items = [first]
+        deadline = first[0] + self.max_wait
+        while len(items) < self.window_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._stopped = True
+                break
+            items.append(item)
+        return items
+
+    def _run(self):
+        while not self._stopped:
+            items = self._collect()
+
+            # Buckets por tamanho: pares de comprimento parecido no mesmo forward
+            items.sort(key=lambda item: item[1])
+            for start in range(0, len(items), self.max_batch_size):
+                self._run_batch(items[start:start + self.max_batch_size])
+
+        # Pares enfileirados depois do close: falham em vez de esperar para sempre
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None and not item[2].future.done():
+                item[2].future.set_exception(RuntimeError("serviço de reranking encerrado"))
+
+    def _run_batch(self, batch: list):
+        try:
+            scores = self.scorer([item[4] for item in batch])
+        except Exception as e:
+            for request in {id(item[2]): item[2] for item in batch}.values():
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.pairs += len(batch)
+
+        for (_, _, request, i, _), score in zip(batch, scores):
+            if request.future.done():
+                continue
+            request.scores[i] = score
+            request.remaining -= 1
+            if request.remaining == 0:
+                request.future.set_result(request.scores)
+
+    def close(self):
+        """Stop the worker after the queued pairs are scored (later calls fail)"""
+        self._closed = True
+        self._queue.put(None)
+
+    def stats(self) -> dict:
+        return {
+            'batches': self.batches,
+            'pairs': self.pairs,
+            'avg_batch_size': round(self.pairs / self.batches, 2) if self.batches else 0.0,
+            'queued': self._queue.qsize(),
+        }
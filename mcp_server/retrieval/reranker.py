@@ -1,27 +1,100 @@
 """
 Cross-Encoder Reranker - Semantic reranking
+
+Two inference backends (RERANKER_BACKEND):
+    torch: sentence_transformers.CrossEncoder, fp32 PyTorch
+    onnx:  exported int8 model through onnxruntime (see onnx_backend.py)
+    auto:  onnx when onnxruntime is installed and the model was exported
 """
 
-from sentence_transformers import CrossEncoder
+import os
 import numpy as np
 from typing import List, Tuple
 
+from .onnx_backend import (
+    OnnxCrossEncoder, default_model_dir, export_onnx_model, is_exported, onnxruntime_available
+)
+from .rerank_service import RerankService
+
+DEFAULT_MODEL = 'cross-encoder/ms-marco-MiniLM-L-6-v2'
+BACKENDS = ('auto', 'torch', 'onnx')
+
+RERANKER_BACKEND = os.getenv("RERANKER_BACKEND", "auto")
+# Diretório da exportação ONNX (vazio = retrieval/models/<modelo>-onnx)
+RERANKER_ONNX_DIR = os.getenv("RERANKER_ONNX_DIR", "")
+RERANKER_THREADS = int(os.getenv("RERANKER_THREADS", "0"))
+
+# Micro-batching entre requisições concorrentes (0 = desliga, chama o modelo direto)
+RERANK_MAX_BATCH = int(os.getenv("RERANK_MAX_BATCH", "32"))
+RERANK_MAX_WAIT_MS = float(os.getenv("RERANK_MAX_WAIT_MS", "5"))
+
+
+def resolve_backend(backend: str = RERANKER_BACKEND, model_name: str = DEFAULT_MODEL) -> str:
+    """
+    Resolve the configured backend to 'torch' or 'onnx' (without importing either)
+
+    Raises:
+        ValueError: If the backend name is unknown
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"RERANKER_BACKEND inválido: '{backend}' (use {', '.join(BACKENDS)})")
+    if backend == 'auto':
+        model_dir = RERANKER_ONNX_DIR or default_model_dir(model_name)
+        return 'onnx' if onnxruntime_available() and is_exported(model_dir) else 'torch'
+    return backend
+
+
+def scorer_name(backend: str = RERANKER_BACKEND, model_name: str = DEFAULT_MODEL) -> str:
+    """Model + backend identifier (int8 scores differ slightly: caches must not mix them)"""
+    if resolve_backend(backend, model_name) == 'onnx':
+        return f"{model_name}@onnx-int8"
+    return model_name
+
 
 class Reranker:
     """Cross-encoder based reranker for semantic relevance"""
 
-    def __init__(self, model_name: str = 'cross-encoder/ms-marco-MiniLM-L-6-v2'):
+    def __init__(self, model_name: str = DEFAULT_MODEL, backend: str = RERANKER_BACKEND,
+                 max_batch_size: int = RERANK_MAX_BATCH, max_wait_ms: float = RERANK_MAX_WAIT_MS):
         """
         Initialize reranker with cross-encoder model
 
         Args:
             model_name: HuggingFace model name
                        Default: cross-encoder/ms-marco-MiniLM-L-6-v2 (~80MB, fast)
+            backend: 'torch', 'onnx' or 'auto'
+            max_batch_size: Pairs per micro-batch (0 disables the batching service)
+            max_wait_ms: Max wait for a micro-batch to fill
         """
-        print(f"⏳ Carregando reranker: {model_name}")
-        self.model = CrossEncoder(model_name)
+        self.model_name = model_name
+        self.backend = resolve_backend(backend, model_name)
+        self.scorer_name = scorer_name(self.backend, model_name)
+
+        print(f"⏳ Carregando reranker: {model_name} ({self.backend})")
+        if self.backend == 'onnx':
+            self.model = self._load_onnx(model_name)
+        else:
+            # Import tardio: torch só é carregado quando este backend é usado
+            from sentence_transformers import CrossEncoder
+            self.model = CrossEncoder(model_name)
+
+        self.service = None
+        if max_batch_size > 0:
+            self.service = RerankService(self._predict, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
         print(f"✅ Reranker carregado!")
 
+    @staticmethod
+    def _load_onnx(model_name: str) -> OnnxCrossEncoder:
+        model_dir = RERANKER_ONNX_DIR or default_model_dir(model_name)
+        if not is_exported(model_dir):
+            # Exportação única (usa torch); as próximas subidas já carregam o int8
+            export_onnx_model(model_name, model_dir)
+        return OnnxCrossEncoder(model_dir, num_threads=RERANKER_THREADS)
+
+    def _predict(self, pairs: List[Tuple[str, str]]) -> np.ndarray:
+        # Um único forward por micro-batch (já agrupado por tamanho)
+        return np.asarray(self.model.predict(pairs, batch_size=len(pairs), show_progress_bar=False))
+
     def rerank(self, query: str, documents: List[str], top_k: int = 5) -> List[Tuple[str, float]]:
         """
         Rerank documents by semantic relevance
@@ -37,14 +110,25 @@ class Reranker:
         if len(documents) == 0:
             return []
 
-        # Create query-document pairs
-        pairs = [(query, doc) for doc in documents]
-
-        # Predict relevance scores (semantic similarity)
-        scores = self.model.predict(pairs)
+        scores = self.score(query, documents)
 
         # Get top k indices (highest scores first)
         top_indices = np.argsort(scores)[-top_k:][::-1]
 
         # Return documents with scores
         return [(documents[i], float(scores[i])) for i in top_indices]
+
+    def score(self, query: str, documents: List[str]) -> np.ndarray:
+        """Relevance score of each document for the query (same order)"""
+        if len(documents) == 0:
+            return np.zeros(0, dtype=np.float32)
+
+        # Pares de várias buscas concorrentes são agrupados no mesmo forward
+        if self.service is not None:
+            return self.service.score(query, documents)
+
+        # Create query-document pairs
+        pairs = [(query, doc) for doc in documents]
+
+        # Predict relevance scores (semantic similarity)
+        return np.asarray(self.model.predict(pairs))
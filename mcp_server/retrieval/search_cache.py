@@ -0,0 +1,179 @@
+"""
+Search Cache - Two-level cache for HybridSearch
+
+1. Result cache: (normalized query, top_k, candidates) -> final chunks.
+   Tied to the index version: cleared when a new index is swapped in.
+2. Score cache: (normalized query, chunk_id) -> cross-encoder score.
+   chunk_id is a hash of the chunk text and section, so scores stay valid
+   across index rebuilds and overlapping candidate sets reuse them.
+
+Both levels are bounded LRUs. Optionally the cache is persisted to a JSON
+file (written atomically) and reloaded on start when the reranker model
+matches.
+"""
+
+import json
+import os
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+CACHE_FORMAT = 1
+
+
+def normalize_query(query: str) -> str:
+    """Query key: NFKC, lowercase, collapsed whitespace (the reranker model is uncased)"""
+    return ' '.join(unicodedata.normalize('NFKC', query).lower().split())
+
+
+class LRU:
+    """Minimal bounded LRU mapping (not thread-safe, guarded by SearchCache)"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.data = OrderedDict()
+
+    def get(self, key):
+        value = self.data.get(key)
+        if value is not None:
+            self.data.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.data[key] = value
+        self.data.move_to_end(key)
+        while len(self.data) > self.max_entries:
+            self.data.popitem(last=False)
+
+    def clear(self):
+        self.data.clear()
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+
+class SearchCache:
+    """Result cache + reranker score cache with LRU eviction"""
+
+    def __init__(self, max_results: int = 256, max_scores: int = 50_000,
+                 path: Optional[str] = None, model_name: str = ''):
+        """
+        Initialize search cache
+
+        Args:
+            max_results: Max cached result lists
+            max_scores: Max cached (query, chunk) scores
+            path: Optional JSON file for persistence
+            model_name: Reranker model (persisted scores of another model are ignored)
+        """
+        self.results = LRU(max_results)
+        self.scores = LRU(max_scores)
+        self.path = path
+        self.model_name = model_name
+        self.index_version = None
+
+        self._lock = threading.Lock()
+        self._dirty = False
+
+        self.result_hits = 0
+        self.result_misses = 0
+        self.score_hits = 0
+        self.score_misses = 0
+
+        if path:
+            self._load()
+
+    def set_index_version(self, version: str):
+        """Drop cached results when a different index is in use"""
+        with self._lock:
+            if version != self.index_version:
+                if self.index_version is not None:
+                    self.results.clear()
+                    self._dirty = True
+                self.index_version = version
+
+    def get_results(self, key: Tuple) -> Optional[List[dict]]:
+        with self._lock:
+            results = self.results.get(key)
+            if results is None:
+                self.result_misses += 1
+                return None
+            self.result_hits += 1
+            return [dict(result) for result in results]
+
+    def put_results(self, key: Tuple, results: List[dict]):
+        with self._lock:
+            self.results.put(key, [dict(result) for result in results])
+            self._dirty = True
+
+    def get_scores(self, query: str, chunk_ids: List[str]) -> Dict[str, float]:
+        """Return the cached scores among chunk_ids"""
+        found = {}
+        with self._lock:
+            for chunk_id in chunk_ids:
+                score = self.scores.get((query, chunk_id))
+                if score is not None:
+                    found[chunk_id] = score
+            self.score_hits += len(found)
+            self.score_misses += len(chunk_ids) - len(found)
+        return found
+
+    def put_scores(self, query: str, scores: Dict[str, float]):
+        with self._lock:
+            for chunk_id, score in scores.items():
+                self.scores.put((query, chunk_id), float(score))
+            self._dirty = True
+
+    def save(self):
+        """Persist to disk (no-op without path or changes)"""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            state = {
+                'format': CACHE_FORMAT,
+                'model_name': self.model_name,
+                'index_version': self.index_version,
+                'results': [[list(key), value] for key, value in self.results.data.items()],
+                'scores': [[query, chunk_id, score] for (query, chunk_id), score in self.scores.data.items()],
+            }
+            self._dirty = False
+
+        tmp_path = f"{self.path}.tmp{os.getpid()}"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Cache de busca ignorado ({e})")
+            return
+
+        if state.get('format') != CACHE_FORMAT or state.get('model_name') != self.model_name:
+            return
+
+        for query, chunk_id, score in state.get('scores', []):
+            self.scores.put((query, chunk_id), score)
+
+        # Resultados só valem para o índice em que foram calculados
+        self.index_version = state.get('index_version')
+        for key, value in state.get('results', []):
+            self.results.put(tuple(key), value)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'results': len(self.results),
+                'scores': len(self.scores),
+                'result_hits': self.result_hits,
+                'result_misses': self.result_misses,
+                'score_hits': self.score_hits,
+                'score_misses': self.score_misses,
+            }
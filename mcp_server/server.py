@@ -8,11 +8,21 @@ Este servidor expõe ferramentas para consultar dados sobre:
 - Dados em tempo real (API simulada)
 """
 
+import io
 import os
+import re
 import sys
+import atexit
+import time
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
+import anyio
 import pandas as pd
 from sqlalchemy import create_engine, text, inspect
+from sqlalchemy.engine import make_url
 import json
 import glob
 
@@ -24,6 +34,22 @@ from mcp.types import Tool, TextContent
 
 # Hybrid Search import
 from retrieval.hybrid_search import HybridSearch
+from retrieval.corpus import CorpusIndexer
+from retrieval.search_cache import SearchCache
+from retrieval.reranker import scorer_name as reranker_scorer_name
+from retrieval.dense_index import DEFAULT_EMBEDDING_MODEL
+
+# Reescrita de agregações para as tabelas de rollup
+from query_rewrite import RollupRewriter
+
+# Cache de resultados das queries SQL
+from query_cache import QueryCache, file_generation
+
+# Formatação vetorizada (R$ e contagens)
+from formatting import format_dataframe
+
+# Conexões SQLite somente leitura
+from db_pool import create_readonly_engine, prewarm
 
 # Configurações do banco de dados
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -31,22 +57,158 @@ PROJECT_ROOT = os.path.dirname(BASE_DIR)
 DB_PATH = os.path.join(PROJECT_ROOT, "local_deploy", "data", "db_transparencia.db")
 DB_SQL_URL = os.getenv("DB_SQL_URL", f"sqlite:///{DB_PATH}")
 
+# Execução das ferramentas fora do event loop (pool de threads)
+TOOL_WORKERS = int(os.getenv("MCP_TOOL_WORKERS", "4"))
+TOOL_TIMEOUT = float(os.getenv("MCP_TOOL_TIMEOUT", "60"))
+# Concorrência máxima por ferramenta (as demais usam TOOL_WORKERS)
+TOOL_CONCURRENCY = {
+    # Buscas passam a maior parte do tempo bloqueadas (reranking, aquecimento) segurando um worker:
+    # sempre sobra ao menos um para query_emendas/get_emendas_stats
+    "search_legislative_report": max(1, TOOL_WORKERS - 1),
+}
+# A cada N instruções da VM do SQLite verifica timeout/cancelamento
+SQLITE_PROGRESS_STEPS = 10000
+
+# Pool de conexões somente leitura (uma por worker por padrão)
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", str(TOOL_WORKERS)))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_KIB = int(os.getenv("SQLITE_CACHE_KIB", str(64 * 1024)))
+
+# Máximo de linhas devolvidas por query (economiza tokens do LLM)
+MAX_RESULT_ROWS = 50
+
+# Corpus de documentos teóricos (reindexação incremental em background)
+CORPUS_DIR = os.getenv("CORPUS_DIR", os.path.join(PROJECT_ROOT, "data", "teorico"))
+CORPUS_REFRESH_INTERVAL = float(os.getenv("CORPUS_REFRESH_INTERVAL", "30"))  # 0 = desligado
+
+# Cache de resultados/scores do reranker ("" = só em memória)
+SEARCH_CACHE_PATH = os.getenv("SEARCH_CACHE_PATH", os.path.join(BASE_DIR, "retrieval", "search_cache.json"))
+SEARCH_CACHE_MAX_RESULTS = int(os.getenv("SEARCH_CACHE_MAX_RESULTS", "256"))
+SEARCH_CACHE_MAX_SCORES = int(os.getenv("SEARCH_CACHE_MAX_SCORES", "50000"))
+
+# Busca densa (embeddings) fundida com o BM25 antes do reranking (0 = só BM25)
+HYBRID_DENSE = os.getenv("HYBRID_DENSE", "1") != "0"
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", DEFAULT_EMBEDDING_MODEL)
+
+# Aquecimento da busca na subida: índice + reranker + inferência de teste (0 = lazy)
+RETRIEVAL_WARMUP = os.getenv("RETRIEVAL_WARMUP", "1") != "0"
+
+# Cache de resultados (chave = SQL normalizado)
+QUERY_CACHE_MAX_BYTES = int(os.getenv("QUERY_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "300"))
+
 # Cria o servidor MCP
 app = Server("transparencia-gov")
 
-# Engine SQLAlchemy
+# Engine SQLAlchemy (e versão do arquivo do banco quando foi criado)
 sql_engine = None
+sql_engine_generation = None
+
+# Protege as inicializações lazy (as ferramentas rodam em threads)
+init_lock = threading.RLock()
+
+# Pool de threads das ferramentas e semáforos por ferramenta
+tool_executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="mcp-tool")
+tool_semaphores = {}
 
 # Hybrid Search (lazy loading)
 hybrid_search = None
+corpus_indexer = None
+corpus_refresher = None
+
+# Estado do aquecimento da busca (thread em background iniciada no main)
+warmup_thread = None
+warmup_done = threading.Event()
+warmup_state = {"status": "disabled", "stage": None, "elapsed_s": None, "error": None}
+server_started_at = time.monotonic()
+
+# Índice full-text criado pelo init_sqlite.py (None = ainda não verificado)
+FTS_TABLE = "emendas_fts"
+fts_available = None
+
+# Reescrita de GROUP BYs para os rollups (lazy loading)
+rollup_rewriter = None
+
+def get_db_file() -> str:
+    """Caminho do arquivo SQLite configurado em DB_SQL_URL (ou None)."""
+    url = make_url(DB_SQL_URL)
+    if url.get_backend_name() != "sqlite" or not url.database:
+        return None
+    return os.path.abspath(url.database)
+
+def db_generation():
+    """Versão do arquivo do banco: muda quando o init_sqlite.py recarrega os dados."""
+    db_file = get_db_file()
+    return file_generation(db_file) if db_file else None
+
+query_cache = QueryCache(
+    max_bytes=QUERY_CACHE_MAX_BYTES,
+    ttl=QUERY_CACHE_TTL,
+    generation_fn=db_generation
+)
+
+class ToolCall:
+    """Estado de uma chamada de ferramenta: prazo e sinal de cancelamento."""
+
+    def __init__(self, timeout: float):
+        self.deadline = time.monotonic() + timeout
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def should_abort(self) -> bool:
+        """Usado como progress_handler do SQLite: True interrompe a query."""
+        return self.cancelled.is_set() or time.monotonic() > self.deadline
+
+# Chamada em execução na thread atual (propagada via contextvars)
+current_call = contextvars.ContextVar("current_call", default=None)
 
 def get_sql_engine():
-    """Retorna o engine SQLAlchemy, criando se necessário."""
-    global sql_engine
-    if sql_engine is None:
-        sql_engine = create_engine(DB_SQL_URL)
+    """
+    Retorna o engine SQLAlchemy, criando se necessário.
+
+    Para SQLite usa o pool somente leitura (mode=ro, mmap, query_only). Se o
+    arquivo do banco foi trocado (recarga do init_sqlite.py), o pool é
+    descartado para não continuar lendo o arquivo antigo.
+    """
+    global sql_engine, sql_engine_generation, rollup_rewriter, fts_available
+
+    generation = db_generation()
+    if sql_engine is not None and generation == sql_engine_generation:
+        return sql_engine
+
+    with init_lock:
+        if sql_engine is not None and generation != sql_engine_generation:
+            sql_engine.dispose()
+            sql_engine = None
+            rollup_rewriter = None
+            fts_available = None
+
+        if sql_engine is None:
+            db_file = get_db_file()
+            if db_file:
+                sql_engine = create_readonly_engine(
+                    db_file,
+                    pool_size=SQLITE_POOL_SIZE,
+                    mmap_size=SQLITE_MMAP_SIZE,
+                    cache_size_kib=SQLITE_CACHE_KIB
+                )
+            else:
+                sql_engine = create_engine(DB_SQL_URL)
+            sql_engine_generation = generation
+
     return sql_engine
 
+def prewarm_sql_pool():
+    """Abre todas as conexões do pool na subida do servidor."""
+    if not get_db_file():
+        return
+    try:
+        prewarm(get_sql_engine(), SQLITE_POOL_SIZE)
+    except Exception as e:
+        print(f"⚠️  Não foi possível pré-aquecer o pool SQLite: {e}", file=sys.stderr)
+
 def get_table_schema(table_name: str = "emendas_parlamentares") -> str:
     """Retorna o schema de uma tabela."""
     try:
@@ -68,85 +230,319 @@ def get_table_schema(table_name: str = "emendas_parlamentares") -> str:
     except Exception as e:
         return f"Erro ao obter schema: {str(e)}"
 
-def execute_sql_query(query: str) -> str:
+def has_fts_index() -> bool:
+    """Verifica (uma vez) se o banco tem o índice FTS5 de autor/município/ação."""
+    global fts_available
+    if fts_available is None:
+        try:
+            with get_sql_engine().connect() as conn:
+                row = conn.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                    {"name": FTS_TABLE}
+                ).fetchone()
+            fts_available = row is not None
+        except Exception:
+            fts_available = False
+    return fts_available
+
+def build_fts_match(term: str, column: str) -> str:
+    """
+    Monta uma expressão MATCH do FTS5 com busca por prefixo de cada palavra.
+
+    Ex: ("sao paulo", "municipio") -> municipio : ("sao"* "paulo"*)
+    O tokenizer do índice remove acentos, então "SAO" casa com "SÃO".
+    """
+    tokens = re.findall(r"\w+", term)
+    if not tokens:
+        return ""
+    return f"{column} : (" + " ".join(f'"{token}"*' for token in tokens) + ")"
+
+def build_text_filter(term: str, column: str, params: dict) -> str:
+    """
+    Retorna a cláusula WHERE para buscar `term` em `column`, preenchendo `params`.
+
+    Usa o índice FTS5 quando disponível; senão cai no LIKE '%...%' (bancos antigos).
+    """
+    match = build_fts_match(term, column) if has_fts_index() else ""
+    if match:
+        params[f"{column}_match"] = match
+        return f"rowid IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :{column}_match)"
+
+    params[f"{column}_like"] = f"%{term}%"
+    return f"{column} LIKE :{column}_like"
+
+def get_rollup_rewriter() -> RollupRewriter:
+    """Carrega o catálogo de rollups do banco (uma vez)."""
+    global rollup_rewriter
+    if rollup_rewriter is None:
+        try:
+            with get_sql_engine().connect() as conn:
+                rollup_rewriter = RollupRewriter.from_connection(conn)
+        except Exception:
+            rollup_rewriter = RollupRewriter([])
+    return rollup_rewriter
+
+def execute_sql_query(query: str, params: dict = None) -> str:
     """Executa uma query SQL e retorna os resultados."""
+    # Queries repetidas saem direto do cache (sem SQLite nem pandas)
+    cache_key = QueryCache.make_key(query, params)
+    cached = query_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    # Versão do banco antes de executar: se mudar no meio, o put descarta
+    generation = query_cache.generation()
+    result = None
+
+    # Agregações compatíveis são respondidas pelas tabelas de rollup
+    if params is None:
+        rewritten = get_rollup_rewriter().rewrite(query)
+        if rewritten:
+            result = _execute_sql_query(rewritten)
+            if result.startswith("Erro"):
+                result = None
+
+    if result is None:
+        result = _execute_sql_query(query, params)
+
+    if not result.startswith("Erro"):
+        query_cache.put(cache_key, result, generation)
+
+    return result
+
+class interruptible:
+    """
+    Instala o progress_handler do SQLite na conexão enquanto a query roda.
+
+    Se a chamada atual passar do prazo ou for cancelada, o SQLite aborta a
+    query em andamento (OperationalError: interrupted).
+    """
+
+    def __init__(self, conn):
+        self.raw = None
+        call = current_call.get()
+        if call is None:
+            return
+        raw = getattr(conn.connection, "driver_connection", None)
+        if hasattr(raw, "set_progress_handler"):
+            self.raw = raw
+            self.call = call
+
+    def __enter__(self):
+        if self.raw is not None:
+            self.raw.set_progress_handler(self.call.should_abort, SQLITE_PROGRESS_STEPS)
+        return self
+
+    def __exit__(self, *exc):
+        if self.raw is not None:
+            self.raw.set_progress_handler(None, 0)
+        return False
+
+def count_query_rows(conn, query: str, params: dict = None):
+    """Conta as linhas de uma query via SELECT COUNT(*) FROM (query) (None se falhar)."""
+    inner = query.strip().rstrip(";")
+    try:
+        return conn.execute(text(f"SELECT COUNT(*) FROM (\n{inner}\n)"), params or {}).scalar()
+    except Exception:
+        return None
+
+def _execute_sql_query(query: str, params: dict = None) -> str:
     try:
         engine = get_sql_engine()
 
         # Executa a query
-        with engine.connect() as conn:
-            result = conn.execute(text(query))
-
-            # Se é um SELECT, retorna os dados
-            if query.strip().upper().startswith('SELECT'):
-                df = pd.DataFrame(result.fetchall(), columns=result.keys())
-
-                # Formata colunas numéricas (valores monetários)
-                # Detecta colunas com valores grandes que podem ser valores monetários
-                for col in df.columns:
-                    if df[col].dtype in ['float64', 'float32', 'int64', 'int32']:
-                        # Se é uma coluna de valor (soma, total, média) ou contém "valor" no nome
-                        col_lower = str(col).lower()
-                        if any(keyword in col_lower for keyword in ['valor', 'total', 'soma', 'média', 'media', 'pago', 'empenhado', 'liquidado']):
-                            # Formata como moeda brasileira
-                            df[col] = df[col].apply(lambda x: f"R$ {x:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".") if pd.notna(x) else "")
-                        elif df[col].max() > 1000000:  # Se tem valores grandes (>1M), provavelmente é valor monetário
-                            df[col] = df[col].apply(lambda x: f"R$ {x:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".") if pd.notna(x) else "")
-                        elif col_lower in ['quantidade', 'count', 'qtd', 'num']:
-                            # Formata números inteiros (quantidade)
-                            df[col] = df[col].apply(lambda x: f"{int(x):,}".replace(",", ".") if pd.notna(x) else "")
-
-                # Limita a 50 linhas para economizar tokens
-                if len(df) > 50:
-                    return f"Retornando primeiras 50 de {len(df)} linhas:\n\n{df.head(50).to_markdown(index=False)}"
-
-                return df.to_markdown(index=False)
+        with engine.connect() as conn, interruptible(conn):
+            result = conn.execute(text(query), params or {})
+
+            # Se retorna linhas (SELECT), busca só o necessário para exibir
+            if result.returns_rows:
+                columns = list(result.keys())
+
+                # Limita a MAX_RESULT_ROWS linhas para economizar tokens; a linha
+                # extra só indica que há mais resultados (sem trazer a tabela toda)
+                rows = result.fetchmany(MAX_RESULT_ROWS + 1)
+                result.close()
+
+                truncated = len(rows) > MAX_RESULT_ROWS
+                df = pd.DataFrame(rows[:MAX_RESULT_ROWS], columns=columns)
+
+                # Formata moeda e contagens (vetorizado, tipo da coluna vem do schema)
+                df = format_dataframe(df)
+                table = df.to_markdown(index=False, disable_numparse=True)
+
+                if truncated:
+                    total = count_query_rows(conn, query, params)
+                    if total is None:
+                        return f"Retornando primeiras {MAX_RESULT_ROWS} linhas (há mais resultados):\n\n{table}"
+                    return f"Retornando primeiras {MAX_RESULT_ROWS} de {total} linhas:\n\n{table}"
+
+                return table
             else:
                 return f"Query executada com sucesso. Linhas afetadas: {result.rowcount}"
 
     except Exception as e:
+        call = current_call.get()
+        if call is not None and call.should_abort():
+            return "Erro ao executar query: consulta interrompida (tempo limite excedido ou chamada cancelada)."
         return f"Erro ao executar query: {str(e)}"
 
 def get_hybrid_search():
     """Inicializa busca híbrida (lazy loading)"""
-    global hybrid_search
+    global hybrid_search, corpus_indexer
+
+    with init_lock:
+        if hybrid_search is not None:
+            return hybrid_search
 
-    if hybrid_search is None:
         # Paths
-        index_path = os.path.join(BASE_DIR, 'retrieval', 'bm25_index.pkl')
-        md_file = os.path.join(PROJECT_ROOT, 'data', 'teorico', 'Relatorio_Emendas_Parlamentares.md')
+        index_path = os.path.join(BASE_DIR, 'retrieval', 'bm25_index.bin')
+        dense_path = os.path.join(BASE_DIR, 'retrieval', 'dense_index.bin') if HYBRID_DENSE else None
 
         # Initialize hybrid search
-        hybrid_search = HybridSearch(index_path)
-
-        # Create index if doesn't exist
-        if not os.path.exists(index_path):
-            print(f"🔧 Criando índice BM25 pela primeira vez...")
-            hybrid_search.index_documents(md_file, index_path)
+        cache = SearchCache(
+            max_results=SEARCH_CACHE_MAX_RESULTS,
+            max_scores=SEARCH_CACHE_MAX_SCORES,
+            path=SEARCH_CACHE_PATH or None,
+            model_name=reranker_scorer_name()
+        )
+        atexit.register(cache.save)
+        searcher = HybridSearch(index_path, cache=cache, dense_path=dense_path, embedding_model=EMBEDDING_MODEL)
+        indexer = CorpusIndexer(CORPUS_DIR, index_path)
+
+        # Indexa só arquivos novos/alterados desde o último manifesto
+        bm25 = indexer.refresh(force=searcher.bm25 is None)
+        if bm25 is not None:
+            searcher.set_index(bm25)
         else:
             print(f"✅ Índice BM25 carregado de: {index_path}")
 
+        corpus_indexer = indexer
+        hybrid_search = searcher
+        start_corpus_refresher()
+
     return hybrid_search
 
+def refresh_corpus() -> bool:
+    """Reindexa documentos novos/alterados e troca o índice em uso (True se mudou)."""
+    searcher = get_hybrid_search()
+    bm25 = corpus_indexer.refresh()
+    if bm25 is None:
+        return False
+    searcher.set_index(bm25)
+    return True
+
+def start_corpus_refresher():
+    """Verifica o corpus e grava o cache de busca periodicamente (thread daemon)."""
+    global corpus_refresher
+
+    if CORPUS_REFRESH_INTERVAL <= 0 or corpus_refresher is not None:
+        return
+
+    def loop():
+        while True:
+            time.sleep(CORPUS_REFRESH_INTERVAL)
+            try:
+                refresh_corpus()
+                hybrid_search.cache.save()
+            except Exception as e:
+                print(f"⚠️  Erro ao reindexar corpus: {e}", file=sys.stderr)
+
+    corpus_refresher = threading.Thread(target=loop, name="corpus-refresh", daemon=True)
+    corpus_refresher.start()
+
+
+def warm_up_retrieval():
+    """Carrega o índice BM25 e o reranker e roda uma inferência de teste."""
+    started = time.monotonic()
+    warmup_state.update(status="running", stage="index")
+    try:
+        searcher = get_hybrid_search()
+        warmup_state["stage"] = "reranker"
+        searcher.warm_up()
+        warmup_state.update(status="ready", stage=None)
+        print(f"🔥 Busca aquecida em {time.monotonic() - started:.1f}s")
+    except Exception as e:
+        # As chamadas seguem pelo caminho lazy (e reportam o erro, se persistir)
+        warmup_state.update(status="failed", error=str(e))
+        print(f"⚠️  Aquecimento da busca falhou: {e}", file=sys.stderr)
+    finally:
+        warmup_state["elapsed_s"] = round(time.monotonic() - started, 2)
+        warmup_done.set()
+
+def start_retrieval_warmup():
+    """Inicia o aquecimento em uma thread daemon (não atrasa o handshake MCP)."""
+    global warmup_thread
+
+    if not RETRIEVAL_WARMUP or warmup_thread is not None:
+        return
+
+    warmup_state["status"] = "pending"
+    warmup_thread = threading.Thread(target=warm_up_retrieval, name="retrieval-warmup", daemon=True)
+    warmup_thread.start()
+
+def wait_for_warmup():
+    """Chamadas que chegam durante o aquecimento esperam por ele em vez de carregar de novo."""
+    if warmup_thread is None:
+        return
+
+    call = current_call.get()
+    while not warmup_done.wait(0.5):
+        if call is not None and call.should_abort():
+            raise TimeoutError("busca ainda em aquecimento")
+
+def get_server_status() -> dict:
+    """Prontidão do servidor (não dispara nenhum carregamento)."""
+    searcher = hybrid_search
+    reranker = searcher.reranker if searcher is not None else None
+    bm25 = searcher.bm25 if searcher is not None else None
+    dense = searcher.dense if searcher is not None else None
+
+    retrieval = {
+        "index_loaded": bm25 is not None,
+        "documents": len(bm25.documents) if bm25 is not None else 0,
+        "index_version": bm25.version if bm25 is not None else None,
+        "dense_enabled": HYBRID_DENSE,
+        "dense_loaded": dense is not None,
+        "dense_building": searcher.dense_building if searcher is not None else False,
+        "embedding_model": dense.model_name if dense is not None else None,
+        "reranker_loaded": reranker is not None,
+        "reranker_backend": reranker.backend if reranker is not None else None,
+    }
+    if reranker is not None and reranker.service is not None:
+        retrieval["rerank_batching"] = reranker.service.stats()
+    if corpus_indexer is not None:
+        retrieval["corpus"] = corpus_indexer.stats()
+    if searcher is not None:
+        retrieval["search_cache"] = searcher.cache.stats()
+
+    return {
+        "ready": warmup_state["status"] in ("ready", "disabled"),
+        "uptime_s": round(time.monotonic() - server_started_at, 1),
+        "warmup": dict(warmup_state),
+        "retrieval": retrieval,
+    }
 
 def search_in_markdown(query: str) -> str:
     """Busca híbrida BM25 + Reranking nos documentos markdown (retorna trechos para o LLM processar)"""
     try:
+        wait_for_warmup()
+
         # Get hybrid search instance
         searcher = get_hybrid_search()
 
-        # Perform hybrid search - busca 10 trechos para ter mais contexto
-        results = searcher.search(query, top_k=10, bm25_candidates=30)
+        # Perform hybrid search - poucos trechos densos, já delimitados por seção
+        results = searcher.search_chunks(query, top_k=5, bm25_candidates=12)
 
         if not results:
             return "Nenhum resultado encontrado nos documentos teóricos."
 
         # Formata os trechos de forma limpa para o LLM processar
+        # (sem linhas em branco dentro do trecho: o cliente separa por '\n\n')
         formatted = []
-        for i, doc in enumerate(results, 1):
-            # Limita tamanho de cada trecho
-            snippet = doc[:1000] + "..." if len(doc) > 1000 else doc
-            formatted.append(f"[Trecho {i}]\n{snippet}")
+        for i, chunk in enumerate(results, 1):
+            section = " > ".join(chunk.get("section_path", []))
+            header = f"[Trecho {i}] ({section})" if section else f"[Trecho {i}]"
+            formatted.append(f"{header}\n{chunk['text']}")
 
         return "\n\n".join(formatted)
 
@@ -231,6 +627,7 @@ async def list_tools() -> list[Tool]:
             name="search_emendas_by_author",
             description="""
             Busca emendas por nome do autor (parlamentar).
+            A busca ignora acentos e casa prefixos de palavras (ex: "jose silv").
 
             Retorna todas as emendas associadas a um autor específico,
             incluindo valores totais e distribuição por município.
@@ -257,7 +654,8 @@ async def list_tools() -> list[Tool]:
             Lista emendas destinadas a um município específico.
 
             Retorna emendas filtradas por município, com informações sobre
-            valores, autores e finalidades.
+            valores, autores e finalidades. A busca ignora acentos
+            (ex: "SAO PAULO" encontra "SÃO PAULO").
             """,
             inputSchema={
                 "type": "object",
@@ -275,6 +673,32 @@ async def list_tools() -> list[Tool]:
                 "required": ["municipality"]
             }
         ),
+        Tool(
+            name="get_query_cache_stats",
+            description="""
+            Retorna as estatísticas do cache de resultados SQL do servidor:
+            entradas, bytes ocupados, acertos, falhas, taxa de acerto,
+            remoções por LRU/TTL e invalidações por mudança no banco.
+            """,
+            inputSchema={
+                "type": "object",
+                "properties": {},
+                "required": []
+            }
+        ),
+        Tool(
+            name="get_server_status",
+            description="""
+            Retorna a prontidão do servidor: estado do aquecimento da busca
+            (índice BM25 e reranker carregados, tempo gasto, erro), backend do
+            reranker e estatísticas do corpus e do cache de busca.
+            """,
+            inputSchema={
+                "type": "object",
+                "properties": {},
+                "required": []
+            }
+        ),
         Tool(
             name="search_legislative_report",
             description="""
@@ -301,9 +725,47 @@ async def list_tools() -> list[Tool]:
         )
     ]
 
+def get_tool_semaphore(name: str) -> asyncio.Semaphore:
+    """Semáforo que limita quantas chamadas da ferramenta rodam ao mesmo tempo."""
+    if name not in tool_semaphores:
+        tool_semaphores[name] = asyncio.Semaphore(TOOL_CONCURRENCY.get(name, TOOL_WORKERS))
+    return tool_semaphores[name]
+
 @app.call_tool()
 async def call_tool(name: str, arguments: Any) -> list[TextContent]:
-    """Executa uma ferramenta do servidor MCP."""
+    """
+    Executa uma ferramenta do servidor MCP.
+
+    O corpo da ferramenta roda no pool de threads, para que uma query lenta
+    ou um reranking não bloqueiem o event loop: chamadas concorrentes da
+    mesma sessão se sobrepõem. Cada chamada tem timeout; no timeout ou no
+    cancelamento (ex: cliente desconectou) a query SQLite em andamento é
+    interrompida pelo progress_handler.
+    """
+    call = ToolCall(TOOL_TIMEOUT)
+
+    async with get_tool_semaphore(name):
+        # Propaga a chamada atual para a thread (usada pelo progress_handler)
+        context = contextvars.copy_context()
+        context.run(current_call.set, call)
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(tool_executor, context.run, run_tool, name, arguments or {})
+
+        try:
+            return await asyncio.wait_for(future, timeout=TOOL_TIMEOUT)
+        except asyncio.TimeoutError:
+            call.cancel()
+            return [TextContent(
+                type="text",
+                text=f"Erro: a ferramenta '{name}' excedeu o tempo limite de {TOOL_TIMEOUT:.0f}s."
+            )]
+        except asyncio.CancelledError:
+            call.cancel()
+            raise
+
+def run_tool(name: str, arguments: dict) -> list[TextContent]:
+    """Corpo síncrono das ferramentas (executado no pool de threads)."""
 
     try:
         if name == "get_emendas_schema":
@@ -313,8 +775,9 @@ async def call_tool(name: str, arguments: Any) -> list[TextContent]:
         elif name == "query_emendas":
             query = arguments.get("query", "")
 
-            # Validação de segurança: apenas SELECT
-            if not query.strip().upper().startswith("SELECT"):
+            # Em SQLite a conexão é somente leitura (mode=ro + query_only): qualquer
+            # escrita falha no próprio banco. Outros bancos mantêm a checagem textual.
+            if not get_db_file() and not query.strip().upper().startswith("SELECT"):
                 return [TextContent(
                     type="text",
                     text="Erro: Apenas queries SELECT são permitidas por segurança."
@@ -324,15 +787,22 @@ async def call_tool(name: str, arguments: Any) -> list[TextContent]:
             return [TextContent(type="text", text=result)]
 
         elif name == "get_emendas_stats":
-            stats_query = """
-            SELECT
-                COUNT(*) as total_emendas,
-                COUNT(DISTINCT nome_autor) as total_autores,
-                SUM(valor_empenhado) as total_empenhado,
-                SUM(valor_liquidado) as total_liquidado,
-                SUM(valor_pago) as total_pago
-            FROM emendas_parlamentares
-            """
+            if get_rollup_rewriter().is_enabled():
+                # Totais pré-calculados na carga (inclui COUNT DISTINCT de autores)
+                stats_query = """
+                SELECT total_emendas, total_autores, total_empenhado, total_liquidado, total_pago
+                FROM rollup_total
+                """
+            else:
+                stats_query = """
+                SELECT
+                    COUNT(*) as total_emendas,
+                    COUNT(DISTINCT nome_autor) as total_autores,
+                    SUM(valor_empenhado) as total_empenhado,
+                    SUM(valor_liquidado) as total_liquidado,
+                    SUM(valor_pago) as total_pago
+                FROM emendas_parlamentares
+                """
 
             result = execute_sql_query(stats_query)
 
@@ -356,7 +826,10 @@ async def call_tool(name: str, arguments: Any) -> list[TextContent]:
 
         elif name == "search_emendas_by_author":
             author_name = arguments.get("author_name", "")
-            limit = arguments.get("limit", 50)
+            limit = int(arguments.get("limit", 50))
+
+            params = {"limit": limit}
+            author_filter = build_text_filter(author_name, "nome_autor", params)
 
             query = f"""
             SELECT
@@ -366,19 +839,23 @@ async def call_tool(name: str, arguments: Any) -> list[TextContent]:
                 nome_acao,
                 valor_pago
             FROM emendas_parlamentares
-            WHERE nome_autor LIKE '%{author_name}%'
+            WHERE {author_filter}
             ORDER BY valor_pago DESC
-            LIMIT {limit}
+            LIMIT :limit
             """
 
-            result = execute_sql_query(query)
+            result = execute_sql_query(query, params)
             return [TextContent(type="text", text=result)]
 
         elif name == "get_emendas_by_municipality":
             municipality = arguments.get("municipality", "")
             uf = arguments.get("uf")
 
+            params = {}
+            municipality_filter = build_text_filter(municipality, "municipio", params)
+
             if uf:
+                params["uf"] = uf
                 query = f"""
                 SELECT
                     nome_autor,
@@ -386,8 +863,8 @@ async def call_tool(name: str, arguments: Any) -> list[TextContent]:
                     valor_pago,
                     ano_emenda
                 FROM emendas_parlamentares
-                WHERE municipio LIKE '%{municipality}%'
-                AND uf = '{uf}'
+                WHERE {municipality_filter}
+                AND uf = :uf
                 ORDER BY valor_pago DESC
                 LIMIT 50
                 """
@@ -401,14 +878,21 @@ async def call_tool(name: str, arguments: Any) -> list[TextContent]:
                     valor_pago,
                     ano_emenda
                 FROM emendas_parlamentares
-                WHERE municipio LIKE '%{municipality}%'
+                WHERE {municipality_filter}
                 ORDER BY valor_pago DESC
                 LIMIT 50
                 """
 
-            result = execute_sql_query(query)
+            result = execute_sql_query(query, params)
             return [TextContent(type="text", text=result)]
 
+        elif name == "get_query_cache_stats":
+            stats = query_cache.stats()
+            return [TextContent(type="text", text=json.dumps(stats, indent=2))]
+
+        elif name == "get_server_status":
+            return [TextContent(type="text", text=json.dumps(get_server_status(), indent=2))]
+
         elif name == "search_legislative_report":
             query = arguments.get("query", "")
             result = search_in_markdown(query)
@@ -429,7 +913,14 @@ async def call_tool(name: str, arguments: Any) -> list[TextContent]:
 
 async def main():
     """Inicia o servidor MCP via stdio."""
-    async with stdio_server() as (read_stream, write_stream):
+    # O stdout é do protocolo: logs (inclusive do aquecimento em background) vão para o stderr
+    protocol_stdout = anyio.wrap_file(io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8"))
+    sys.stdout = sys.stderr
+
+    prewarm_sql_pool()
+    start_retrieval_warmup()
+
+    async with stdio_server(stdout=protocol_stdout) as (read_stream, write_stream):
         await app.run(
             read_stream,
             write_stream,
@@ -437,5 +928,4 @@ async def main():
         )
 
 if __name__ == "__main__":
-    import asyncio
     asyncio.run(main())
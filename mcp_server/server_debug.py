@@ -25,6 +25,9 @@ from mcp.server import Server
 from mcp.server.stdio import stdio_server
 from mcp.types import Tool, TextContent
 
+# Formatação vetorizada (R$ e contagens), compartilhada com server.py
+from formatting import format_dataframe
+
 # Configurações do banco de dados
 DB_SQL_URL = os.getenv("DB_SQL_URL", "sqlite:///local_deploy/data/db_transparencia.db")
 
@@ -75,6 +78,9 @@ def execute_sql_query(query: str) -> str:
             if query.strip().upper().startswith('SELECT'):
                 df = pd.DataFrame(result.fetchall(), columns=result.keys())
 
+                # Formata moeda e contagens (vetorizado, tipo da coluna vem do schema)
+                df = format_dataframe(df)
+
                 # Limita a 100 linhas para não sobrecarregar
                 if len(df) > 100:
                     return f"Retornando primeiras 100 de {len(df)} linhas:\n\n{df.head(100).to_string()}"
@@ -371,6 +377,11 @@ async def call_tool(name: str, arguments: Any) -> list[TextContent]:
             result = execute_sql_query(query)
             return [TextContent(type="text", text=result)]
 
+        elif name == "search_legislative_report":
+            query = arguments.get("query", "")
+            result = search_in_markdown(query)
+            return [TextContent(type="text", text=result)]
+
         else:
             return [TextContent(
                 type="text",
@@ -383,11 +394,6 @@ async def call_tool(name: str, arguments: Any) -> list[TextContent]:
             text=f"Erro ao executar ferramenta: {str(e)}"
         )]
 
-        elif name == "search_legislative_report":
-            query = arguments.get("query", "")
-            result = search_in_markdown(query)
-            return [TextContent(type="text", text=result)]
-
 
 async def main():
     """Inicia o servidor MCP via stdio."""
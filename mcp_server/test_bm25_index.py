@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Teste do índice BM25 (retrieval/bm25_index.py)
+
+    - Paridade dos scores com rank_bm25.BM25Okapi (mesmos tokens, k1, b e
+      epsilon), inclusive termos com idf negativo (presentes em mais da
+      metade dos documentos). Pulado sem rank_bm25.
+    - Formato binário: save -> load (mmap) devolve os mesmos documentos,
+      metadados, vocabulário, arrays e resultados de busca.
+"""
+
+import io
+import os
+import sys
+import tempfile
+from contextlib import redirect_stdout
+
+import numpy as np
+
+from retrieval.bm25_index import BM25Index
+from retrieval.chunker import MarkdownChunker
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BASE_DIR)
+md_file = os.path.join(PROJECT_ROOT, 'data', 'teorico', 'Relatorio_Emendas_Parlamentares.md')
+
+SEED = 11
+NUM_SYNTHETIC = 300
+TOLERANCE = 1e-5
+
+# Termos comuns (idf negativo) e raros, com acentos para passar pelo analisador
+COMMON_WORDS = ["emenda", "parlamentar", "orçamento", "união"]
+RARE_WORDS = ["transferência", "especial", "rastreabilidade", "bancada", "relator", "impositiva",
+              "município", "saúde", "educação", "empenho", "liquidação", "pagamento", "convênio",
+              "fundo", "comissão", "execução", "sigilo", "transparência", "programa", "ação"]
+
+test_queries = [
+    "O que é emenda PIX?",
+    "Quais são as regras de rastreabilidade?",
+    "Lei Complementar 210/2024",
+    "emenda parlamentar orçamento",
+    "transferência especial para município de saúde saúde",
+    "execução orçamentária das emendas de bancada",
+    "termo que não existe no corpus",
+]
+
+
+def synthetic_corpus(rng: np.random.Generator) -> list:
+    documents = []
+    for _ in range(NUM_SYNTHETIC):
+        words = [word for word in COMMON_WORDS if rng.random() < 0.8]
+        words += list(rng.choice(RARE_WORDS, size=rng.integers(1, 25)))
+        rng.shuffle(words)
+        documents.append(" ".join(words))
+    return documents
+
+
+def report_corpus() -> list:
+    if not os.path.exists(md_file):
+        return []
+    with open(md_file, 'r', encoding='utf-8') as f:
+        content = f.read()
+    return [chunk.search_text for chunk in MarkdownChunker().chunk(content, source=os.path.basename(md_file))]
+
+
+def quiet():
+    """Silencia os prints do índice (criado/salvo/carregado)"""
+    return redirect_stdout(io.StringIO())
+
+
+class Checks:
+    def __init__(self):
+        self.failures = 0
+
+    def check(self, description: str, ok: bool, detail: str = ""):
+        self.failures += not ok
+        print(f"{'✅' if ok else '❌'} {description}" + (f" ({detail})" if detail and not ok else ""))
+
+
+def test_parity(checks: Checks, name: str, documents: list, index: BM25Index):
+    try:
+        from rank_bm25 import BM25Okapi
+    except ImportError:
+        print(f"⏭️  rank_bm25 não instalado, paridade ({name}) pulada")
+        return
+
+    tokenized = [index.tokenize(doc) for doc in documents]
+    reference = BM25Okapi(tokenized, k1=index.k1, b=index.b, epsilon=0.25)
+    negative_terms = sum(freq > len(documents) / 2 for freq in
+                         (sum(term in set(tokens) for tokens in tokenized) for term in index.vocab))
+
+    max_diff = 0.0
+    problems = []
+    for query in test_queries:
+        expected = reference.get_scores(index.tokenize(query))
+        results = index.search_indices(query, top_k=len(documents))
+
+        scores = np.zeros(len(documents))
+        for doc_id, score in results:
+            scores[doc_id] = score
+        if len(results):
+            max_diff = max(max_diff, float(np.abs(scores - expected).max()))
+        if not np.allclose(scores, expected, rtol=TOLERANCE, atol=TOLERANCE):
+            problems.append(query)
+        # Documentos fora do resultado não têm nenhum termo da query
+        returned = {doc_id for doc_id, _ in results}
+        query_terms = set(index.tokenize(query))
+        if any(query_terms & set(tokenized[i]) for i in range(len(documents)) if i not in returned):
+            problems.append(f"{query} (documento com termo da query fora do resultado)")
+        ranked = [score for _, score in results]
+        if ranked != sorted(ranked, reverse=True):
+            problems.append(f"{query} (resultado fora de ordem)")
+
+    checks.check(f"{name}: scores iguais ao BM25Okapi ({len(documents)} documentos, "
+                 f"{negative_terms} termos com idf negativo, diferença máxima {max_diff:.1e})",
+                 not problems, "; ".join(problems))
+    if name == "sintético":
+        checks.check("sintético: corpus tem termos com idf negativo", negative_terms > 0)
+
+
+def test_round_trip(checks: Checks, documents: list, metadata: list):
+    with quiet():
+        built = BM25Index(documents, metadata)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'bm25_index.bin')
+        with quiet():
+            built.save(path)
+            loaded = BM25Index.load(path)
+
+        checks.check("documentos", list(loaded.documents) == documents)
+        checks.check("metadados", list(loaded.metadata) == metadata)
+        checks.check("versão, analisador, k1 e b",
+                     (loaded.version, loaded.analyzer.name, loaded.k1, loaded.b) ==
+                     (built.version, built.analyzer.name, built.k1, built.b))
+        checks.check("vocabulário", len(loaded.vocab) == len(built.vocab) and
+                     all(loaded.vocab.get(term) == term_id for term, term_id in built.vocab.items()) and
+                     loaded.vocab.get("termo-inexistente") is None)
+        checks.check("arrays (idf, offsets, doc_ids, impacts)",
+                     all(np.array_equal(getattr(loaded, name), getattr(built, name))
+                         for name in ("idf", "offsets", "doc_ids", "impacts")))
+        checks.check("buscas idênticas", all(loaded.search_indices(query, 20) == built.search_indices(query, 20)
+                                            for query in test_queries))
+
+        try:
+            loaded.save(os.path.join(tmp_dir, 'copia.bin'))
+            checks.check("save de índice mmap recusado", False)
+        except ValueError:
+            checks.check("save de índice mmap recusado", True)
+
+        with quiet():
+            BM25Index(documents[:5]).save(path)
+            reloaded = BM25Index.load(path)
+        checks.check("índice sem metadados", reloaded.metadata is None)
+
+        with open(path, 'wb') as f:
+            f.write(b'formato antigo' * 8)
+        try:
+            BM25Index.load(path)
+            checks.check("arquivo inválido recusado", False)
+        except ValueError:
+            checks.check("arquivo inválido recusado", True)
+
+
+def main():
+    print("="*80)
+    print("TESTE DO ÍNDICE BM25 (paridade com rank_bm25 e formato binário)")
+    print("="*80)
+    print()
+
+    checks = Checks()
+    synthetic = synthetic_corpus(np.random.default_rng(SEED))
+    report = report_corpus()
+    with quiet():
+        synthetic_index = BM25Index(synthetic)
+        report_index = BM25Index(report) if report else None
+
+    print("Paridade com rank_bm25:")
+    test_parity(checks, "sintético", synthetic, synthetic_index)
+    if report_index is not None:
+        test_parity(checks, "relatório", report, report_index)
+
+    print()
+    print("Formato binário (save/load):")
+    metadata = [{'chunk_id': f"c{i}", 'section_path': ["Seção", f"Parte {i % 7}"], 'text': doc}
+                for i, doc in enumerate(synthetic)]
+    test_round_trip(checks, synthetic, metadata)
+
+    if checks.failures:
+        print(f"\n❌ {checks.failures} verificação(ões) falharam")
+        sys.exit(1)
+    print("\n✅ BM25 igual ao BM25Okapi e formato binário sem perdas")
+
+
+if __name__ == "__main__":
+    main()
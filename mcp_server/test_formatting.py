@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Teste de paridade: formatação vetorizada (formatting.py) vs célula a célula
+
+O formatador antigo do execute_sql_query era um df[col].apply com
+f"R$ {x:,.2f}" / f"{int(x):,}". Os textos vetorizados devem ser idênticos,
+inclusive nos meios centavos (0.005, 2.675, 0.125), negativos que
+arredondam para zero, valores fora do int64 e inf.
+"""
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from formatting import brl_cell, format_brl, format_integer, integer_cell
+
+NUM_RANDOM = 40_000
+SEED = 7
+
+EDGE_VALUES = [
+    0.0, -0.0, 0.005, 0.015, 2.675, 1.005, 0.125, 0.375, -2.5, 179686.445,
+    -0.001, -0.005, -1234.5, 0.994999, 999.995, 1e15 + 0.5, 9.2e16, 1e17, 9.3e18, 1e19, -1e19,
+    np.inf, -np.inf, np.nan,
+]
+
+
+def random_values(rng: np.random.Generator) -> np.ndarray:
+    """Valores de AVG/SUM típicos: várias ordens de grandeza e muitos meios centavos"""
+    magnitudes = 10.0 ** rng.uniform(-3, 18, NUM_RANDOM)
+    values = rng.uniform(-1, 1, NUM_RANDOM) * magnitudes
+    decimals = rng.integers(0, 6, NUM_RANDOM)
+    for places in range(6):
+        values[decimals == places] = np.round(values[decimals == places], places)
+    half_cents = np.round(rng.uniform(0, 1e7, NUM_RANDOM // 4)) / 100 + 0.005
+    return np.concatenate([values, half_cents, rng.uniform(-1e6, 1e6, NUM_RANDOM) / 3])
+
+
+def compare(name: str, series: pd.Series, vectorized, cell) -> int:
+    start = time.perf_counter()
+    new = vectorized(series)
+    new_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    old = series.apply(cell)
+    old_time = time.perf_counter() - start
+
+    differences = [(value, a, b) for value, a, b in zip(series, new, old) if a != b]
+    status = '✅' if not differences else '❌'
+    print(f"{status} {name}: {len(series)} valores, {len(differences)} diferenças "
+          f"(vetorizado {new_time * 1000:.1f} ms, célula a célula {old_time * 1000:.1f} ms)")
+    for value, a, b in differences[:10]:
+        print(f"   {value!r}: {a!r} != {b!r}")
+    return len(differences)
+
+
+def main():
+    print("="*80)
+    print("TESTE DE PARIDADE DA FORMATAÇÃO (vetorizada vs célula a célula)")
+    print("="*80)
+    print()
+
+    rng = np.random.default_rng(SEED)
+    values = pd.Series(np.concatenate([random_values(rng), EDGE_VALUES]))
+    finite = values[np.isfinite(values) | values.isna()]
+
+    failures = 0
+    failures += compare("moeda (casos de borda)", pd.Series(EDGE_VALUES), format_brl, brl_cell)
+    failures += compare("moeda (aleatórios)", values, format_brl, brl_cell)
+    # O int(x) antigo não aceitava inf: só valores finitos
+    failures += compare("inteiros", finite, format_integer, integer_cell)
+    failures += compare("vazio", pd.Series([], dtype="float64"), format_brl, brl_cell)
+
+    if failures:
+        print(f"\n❌ {failures} valor(es) formatado(s) diferente(s)")
+        sys.exit(1)
+    print("\n✅ Formatação vetorizada idêntica à célula a célula")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,7 +11,7 @@ from retrieval.hybrid_search import HybridSearch
 # Paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.dirname(BASE_DIR)
-index_path = os.path.join(BASE_DIR, 'retrieval', 'bm25_index.pkl')
+index_path = os.path.join(BASE_DIR, 'retrieval', 'bm25_index.bin')
 md_file = os.path.join(PROJECT_ROOT, 'data', 'teorico', 'Relatorio_Emendas_Parlamentares.md')
 
 # Test queries
@@ -37,7 +37,7 @@ def main():
     searcher = HybridSearch(index_path)
 
     # Create or load index
-    if not os.path.exists(index_path):
+    if searcher.bm25 is None:
         print("🔧 Criando índice BM25 pela primeira vez...")
         searcher.index_documents(md_file, index_path)
         print()
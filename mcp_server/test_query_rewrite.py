@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Teste de equivalência da reescrita para rollups (query_rewrite.py)
+
+Monta um banco pequeno com as funções do init_sqlite.py (tabela + rollups)
+e, para cada query, compara o resultado da query original com o da query
+reescrita:
+    - mesmas linhas (e mesmos nomes de coluna)
+    - com ORDER BY, a mesma sequência na coluna de ordenação
+Também confere que formatos que o rollup não consegue responder com o
+mesmo resultado (ex: ORDER BY de uma coluna que o rollup não tem) não são
+reescritos.
+"""
+
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+
+from sqlalchemy import create_engine
+
+from query_rewrite import RollupRewriter
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BASE_DIR)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'local_deploy'))
+
+import init_sqlite  # noqa: E402
+
+NUM_ROWS = 2000
+SEED = 42
+
+AUTORES = ['Ana Souza', 'Bruno Lima', 'Carla Dias', 'Diego Alves', 'Elisa Rocha', 'Fábio Melo']
+LOCAIS = [
+    ('SP', 'Sudeste', ['São Paulo', 'Campinas']),
+    ('RJ', 'Sudeste', ['Rio de Janeiro']),
+    ('RS', 'Sul', ['Porto Alegre', 'Pelotas']),
+    ('PR', 'Sul', ['Curitiba']),
+    ('BA', 'Nordeste', ['Salvador', 'Feira de Santana']),
+    ('PE', 'Nordeste', ['Recife']),
+    ('AM', 'Norte', ['Manaus']),
+    ('GO', 'Centro-Oeste', ['Goiânia']),
+]
+FUNCOES = ['Saúde', 'Educação', 'Urbanismo', 'Assistência Social', 'Agricultura']
+TIPOS = ['Emenda Individual - Transferências Especiais', 'Emenda de Bancada']
+
+# (descrição, query, índice da coluna de ordenação ou None)
+EQUIVALENT_QUERIES = [
+    ("regras: soma por autor",
+     "SELECT nome_autor, SUM(valor_pago) as total\nFROM emendas_parlamentares\n"
+     "GROUP BY nome_autor\nORDER BY total DESC\nLIMIT 50;", 1),
+    ("regras: contagem por UF",
+     "SELECT uf, COUNT(*) as quantidade\nFROM emendas_parlamentares\n"
+     "GROUP BY uf\nORDER BY quantidade DESC\nLIMIT 50;", 1),
+    ("regras: contagem + soma com LIKE e =",
+     "SELECT nome_autor, COUNT(*) as quantidade, SUM(valor_empenhado) as total\n"
+     "FROM emendas_parlamentares\nWHERE nome_funcao LIKE '%Saúde%' AND regiao = 'Sul'\n"
+     "GROUP BY nome_autor\nORDER BY total DESC\nLIMIT 3;", 2),
+    ("regras: município filtrado por região",
+     "SELECT municipio, SUM(valor_liquidado) as total\nFROM emendas_parlamentares\n"
+     "WHERE regiao = 'Nordeste'\nGROUP BY municipio\nORDER BY total DESC\nLIMIT 50;", 1),
+    ("WHERE com !=",
+     "SELECT regiao, SUM(valor_pago) AS total FROM emendas_parlamentares "
+     "WHERE regiao != 'Sul' GROUP BY regiao", None),
+    ("WHERE com <> e LIKE",
+     "SELECT uf, COUNT(*) AS n FROM emendas_parlamentares "
+     "WHERE nome_funcao <> 'Saúde' AND regiao LIKE 'Nor%' GROUP BY uf", None),
+    ("HAVING com COUNT(*)",
+     "SELECT uf, COUNT(*) AS n, SUM(valor_pago) AS total FROM emendas_parlamentares "
+     "GROUP BY uf HAVING COUNT(*) > 250 ORDER BY total DESC", 2),
+    ("HAVING com SUM e alias",
+     "SELECT nome_funcao, SUM(valor_pago) AS total FROM emendas_parlamentares "
+     "GROUP BY nome_funcao HAVING SUM(valor_pago) > 1000000 AND total < 100000000 "
+     "ORDER BY total", 1),
+    ("COUNT(*) sem alias (nome da coluna preservado)",
+     "SELECT nome_funcao, COUNT(*) FROM emendas_parlamentares GROUP BY nome_funcao", None),
+    ("duas dimensões",
+     "SELECT ano_emenda, regiao, SUM(valor_pago) AS total FROM emendas_parlamentares "
+     "GROUP BY ano_emenda, regiao ORDER BY ano_emenda, total DESC", None),
+]
+
+NOT_REWRITTEN_QUERIES = [
+    ("ORDER BY de medida fora de agregação",
+     "SELECT uf, SUM(valor_pago) AS total FROM emendas_parlamentares "
+     "GROUP BY uf ORDER BY valor_pago DESC"),
+    ("ORDER BY de coluna do rollup que não está na query",
+     "SELECT uf, COUNT(*) AS n FROM emendas_parlamentares GROUP BY uf ORDER BY quantidade DESC"),
+    ("ORDER BY de coluna fora do rollup",
+     "SELECT uf, SUM(valor_pago) AS total FROM emendas_parlamentares GROUP BY uf ORDER BY nome_acao"),
+    ("HAVING com soma de coluna que não é medida",
+     "SELECT uf, COUNT(*) AS n FROM emendas_parlamentares "
+     "GROUP BY uf HAVING SUM(valor_restos_pagar_pagos) > 0"),
+    ("WHERE com OR",
+     "SELECT uf, COUNT(*) AS n FROM emendas_parlamentares "
+     "WHERE regiao = 'Sul' OR regiao = 'Norte' GROUP BY uf"),
+    ("GROUP BY sem rollup",
+     "SELECT tipo_emenda, COUNT(*) AS n FROM emendas_parlamentares GROUP BY tipo_emenda"),
+]
+
+
+def build_database(db_path: str):
+    """Tabela base com dados sintéticos (valores inteiros: somas exatas) + rollups"""
+    rng = random.Random(SEED)
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute("BEGIN")
+    init_sqlite.create_table(conn)
+
+    rows = []
+    for i in range(NUM_ROWS):
+        uf, regiao, municipios = rng.choice(LOCAIS)
+        row = dict.fromkeys(init_sqlite.COLUMNS)
+        row.update({
+            'codigo_emenda': f"{i:08d}",
+            'ano_emenda': rng.choice([2022, 2023, 2024]),
+            'tipo_emenda': rng.choice(TIPOS),
+            'nome_autor': rng.choice(AUTORES),
+            'municipio': rng.choice(municipios),
+            'uf': uf,
+            'regiao': regiao,
+            'nome_funcao': rng.choice(FUNCOES),
+            'nome_acao': f"Ação {rng.randint(1, 50)}",
+            'valor_empenhado': float(rng.randint(1_000, 500_000)),
+            'valor_liquidado': float(rng.randint(1_000, 500_000)),
+            'valor_pago': float(rng.randint(1_000, 500_000)),
+            'valor_restos_pagar_pagos': float(rng.randint(0, 10_000)),
+        })
+        rows.append(tuple(row[column] for column in init_sqlite.COLUMNS))
+
+    conn.executemany(
+        f"INSERT INTO {init_sqlite.TABLE_NAME} ({', '.join(init_sqlite.COLUMNS)}) "
+        f"VALUES ({', '.join('?' * len(init_sqlite.COLUMNS))})",
+        rows
+    )
+    init_sqlite.create_rollups(conn)
+    conn.execute("COMMIT")
+    conn.close()
+
+
+def run(conn: sqlite3.Connection, query: str):
+    cursor = conn.execute(query)
+    return [column[0] for column in cursor.description], cursor.fetchall()
+
+
+def main():
+    print("="*80)
+    print("TESTE DE REESCRITA PARA ROLLUPS")
+    print("="*80)
+    print()
+
+    failures = 0
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'rollups.db')
+        # Silencia os prints da materialização
+        stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+        try:
+            build_database(db_path)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+
+        engine = create_engine(f"sqlite:///{db_path}")
+        with engine.connect() as sa_conn:
+            rewriter = RollupRewriter.from_connection(sa_conn)
+        engine.dispose()
+        print(f"📊 {NUM_ROWS} linhas, {len(rewriter.catalog)} rollups no catálogo")
+        print()
+
+        conn = sqlite3.connect(db_path)
+
+        print("Queries equivalentes:")
+        for description, query, order_column in EQUIVALENT_QUERIES:
+            rewritten = rewriter.rewrite(query)
+            if rewritten is None:
+                failures += 1
+                print(f"❌ {description}: não foi reescrita")
+                continue
+
+            original_columns, original_rows = run(conn, query)
+            rewritten_columns, rewritten_rows = run(conn, rewritten)
+
+            problems = []
+            if "FROM rollup_" not in rewritten:
+                problems.append("não usa um rollup")
+            if rewritten_columns != original_columns:
+                problems.append(f"colunas {rewritten_columns} != {original_columns}")
+            if sorted(rewritten_rows) != sorted(original_rows):
+                problems.append("linhas diferentes")
+            if order_column is not None and \
+                    [row[order_column] for row in rewritten_rows] != [row[order_column] for row in original_rows]:
+                problems.append("ordem diferente")
+            if not original_rows:
+                problems.append("resultado vazio (teste sem efeito)")
+
+            failures += bool(problems)
+            status = '❌' if problems else '✅'
+            print(f"{status} {description} ({len(original_rows)} linhas)"
+                  + (f": {', '.join(problems)}" if problems else ""))
+
+        print()
+        print("Queries que não devem ser reescritas:")
+        for description, query in NOT_REWRITTEN_QUERIES:
+            rewritten = rewriter.rewrite(query)
+            failures += rewritten is not None
+            print(f"{'❌' if rewritten else '✅'} {description}"
+                  + (f": reescrita para\n   {rewritten}" if rewritten else ""))
+
+        conn.close()
+
+    if failures:
+        print(f"\n❌ {failures} caso(s) com problema")
+        sys.exit(1)
+    print("\n✅ Reescrita equivalente à query original em todos os casos")
+
+
+if __name__ == "__main__":
+    main()
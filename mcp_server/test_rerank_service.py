@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Teste do micro-batching do reranker (retrieval/rerank_service.py)
+
+Usa um scorer falso (score determinístico por par, sem modelo) e várias
+buscas concorrentes. Confere que:
+    - cada chamada recebe os próprios scores, na ordem dos seus documentos
+    - pares de chamadas diferentes dividem o mesmo forward, sem passar de
+      max_batch_size
+    - um erro do scorer chega só às chamadas daquele lote, e o serviço segue
+    - close() pontua o que já estava na fila e recusa chamadas novas
+"""
+
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from retrieval.rerank_service import RerankService
+
+NUM_CALLERS = 24
+MAX_BATCH_SIZE = 16
+CALL_TIMEOUT = 10.0
+SEED = 3
+
+WORDS = ["emenda", "pix", "transferência", "especial", "rastreabilidade", "bancada", "orçamento",
+         "município", "saúde", "execução", "empenho", "relator", "impositiva", "LC 210/2024"]
+
+
+def expected_score(query: str, doc: str) -> float:
+    """Score falso: depende do par (query, documento), como o CrossEncoder"""
+    return (zlib.crc32(f"{query}\x00{doc}".encode("utf-8")) % 100_000) / 1000.0
+
+
+class StubScorer:
+    """Scorer que registra cada lote e pode falhar em lotes com um documento marcado"""
+
+    def __init__(self, delay: float = 0.002):
+        self.delay = delay
+        self.batches = []
+        self._lock = threading.Lock()
+
+    def __call__(self, pairs):
+        with self._lock:
+            self.batches.append(list(pairs))
+        time.sleep(self.delay)  # "forward": dá tempo de outras chamadas enfileirarem
+        if any(doc == "FALHA" for _, doc in pairs):
+            raise RuntimeError("forward falhou")
+        return [expected_score(query, doc) for query, doc in pairs]
+
+
+class Checks:
+    def __init__(self):
+        self.failures = 0
+
+    def check(self, description: str, ok: bool, detail: str = ""):
+        self.failures += not ok
+        print(f"{'✅' if ok else '❌'} {description}" + (f" ({detail})" if detail and not ok else ""))
+
+
+def make_calls(rng: np.random.Generator):
+    """(query, documentos) por chamada: tamanhos variados e documentos repetidos entre chamadas"""
+    calls = []
+    for n in range(NUM_CALLERS):
+        query = f"pergunta {n}: " + " ".join(rng.choice(WORDS, size=rng.integers(1, 6)))
+        documents = [" ".join(rng.choice(WORDS, size=rng.integers(1, 40))) for _ in range(rng.integers(1, 30))]
+        calls.append((query, documents))
+    return calls
+
+
+def test_concurrent_callers(checks: Checks):
+    print("Chamadas concorrentes:")
+    scorer = StubScorer()
+    service = RerankService(scorer, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=5.0)
+    calls = make_calls(np.random.default_rng(SEED))
+    start = threading.Barrier(NUM_CALLERS)
+
+    def call(query, documents):
+        start.wait()
+        return service.score(query, documents, timeout=CALL_TIMEOUT)
+
+    with ThreadPoolExecutor(max_workers=NUM_CALLERS) as pool:
+        results = list(pool.map(lambda args: call(*args), calls))
+
+    wrong = [n for n, ((query, documents), scores) in enumerate(zip(calls, results))
+             if len(scores) != len(documents) or
+             not np.allclose(scores, [expected_score(query, doc) for doc in documents])]
+    checks.check(f"{NUM_CALLERS} chamadas recebem os próprios scores na ordem original", not wrong,
+                 f"chamadas erradas: {wrong}")
+
+    sizes = [len(batch) for batch in scorer.batches]
+    mixed = sum(len({query for query, _ in batch}) > 1 for batch in scorer.batches)
+    total_pairs = sum(len(documents) for _, documents in calls)
+    checks.check("todos os pares pontuados uma vez", sum(sizes) == total_pairs == service.stats()["pairs"],
+                 f"{sum(sizes)} de {total_pairs}")
+    checks.check(f"nenhum lote passa de {MAX_BATCH_SIZE} pares", max(sizes) <= MAX_BATCH_SIZE, str(max(sizes)))
+    checks.check("lotes com pares de chamadas diferentes", mixed > 0)
+    print(f"   {len(sizes)} lotes, {mixed} misturando chamadas, média {np.mean(sizes):.1f} pares")
+
+    empty = service.score("pergunta", [])
+    checks.check("lista vazia não passa pelo scorer", len(empty) == 0 and len(scorer.batches) == len(sizes))
+    service.close()
+
+
+def test_scorer_error(checks: Checks):
+    print()
+    print("Erro do scorer:")
+    scorer = StubScorer()
+    # Janela longa: as duas chamadas caem no mesmo lote
+    service = RerankService(scorer, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=200.0)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        failing = pool.submit(service.score, "q1", ["doc a", "FALHA"], CALL_TIMEOUT)
+        time.sleep(0.01)
+        other = pool.submit(service.score, "q2", ["doc b"], CALL_TIMEOUT)
+        errors = []
+        for future in (failing, other):
+            try:
+                future.result()
+                errors.append(None)
+            except RuntimeError as e:
+                errors.append(str(e))
+    checks.check("erro chega às chamadas do lote", errors == ["forward falhou", "forward falhou"], str(errors))
+
+    scores = service.score("q3", ["doc c", "doc d"], timeout=CALL_TIMEOUT)
+    checks.check("serviço segue depois do erro",
+                 np.allclose(scores, [expected_score("q3", "doc c"), expected_score("q3", "doc d")]))
+    service.close()
+
+
+def test_close(checks: Checks):
+    print()
+    print("Encerramento:")
+    scorer = StubScorer(delay=0.05)
+    service = RerankService(scorer, max_batch_size=2, max_wait_ms=1.0)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        queued = pool.submit(service.score, "q", ["a", "b", "c", "d", "e"], CALL_TIMEOUT)
+        time.sleep(0.01)
+        service.close()
+        try:
+            scores = queued.result()
+            checks.check("pares já na fila são pontuados", len(scores) == 5)
+        except Exception as e:
+            checks.check("pares já na fila são pontuados", False, repr(e))
+
+    try:
+        service.score("q", ["a"], timeout=1.0)
+        checks.check("chamada depois do close falha", False, "retornou scores")
+    except RuntimeError:
+        checks.check("chamada depois do close falha", True)
+    except Exception as e:
+        checks.check("chamada depois do close falha", False, repr(e))
+
+    service._worker.join(timeout=CALL_TIMEOUT)
+    checks.check("worker encerrado", not service._worker.is_alive())
+
+
+def main():
+    print("="*80)
+    print("TESTE DO MICRO-BATCHING DO RERANKER (scorer falso)")
+    print("="*80)
+    print()
+
+    checks = Checks()
+    test_concurrent_callers(checks)
+    test_scorer_error(checks)
+    test_close(checks)
+
+    if checks.failures:
+        print(f"\n❌ {checks.failures} verificação(ões) falharam")
+        sys.exit(1)
+    print("\n✅ Cada busca recebe os próprios scores, na ordem original")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Teste de paridade: CrossEncoder PyTorch vs backend ONNX (fp32 e int8)
+
+Exporta o modelo se necessário (python -m retrieval.onnx_backend) e compara
+os scores dos dois backends nos trechos do relatório teórico:
+    - ONNX fp32: mesmos scores do PyTorch (diferença numérica apenas)
+    - ONNX int8: mesma ordenação (correlação de Spearman e top-5)
+"""
+
+import os
+import resource
+import sys
+import time
+
+import numpy as np
+
+from retrieval.chunker import MarkdownChunker
+from retrieval.onnx_backend import OnnxCrossEncoder, default_model_dir, export_onnx_model, is_exported
+from retrieval.reranker import DEFAULT_MODEL
+
+# Paths
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BASE_DIR)
+md_file = os.path.join(PROJECT_ROOT, 'data', 'teorico', 'Relatorio_Emendas_Parlamentares.md')
+model_dir = os.getenv("RERANKER_ONNX_DIR") or default_model_dir(DEFAULT_MODEL)
+
+test_queries = [
+    "O que é emenda PIX?",
+    "Quais são as regras de rastreabilidade?",
+    "Lei Complementar 210/2024",
+    "Tipos de emendas parlamentares",
+    "Como funciona a execução orçamentária?"
+]
+
+NUM_DOCUMENTS = 40
+FP32_TOLERANCE = 2e-3
+MIN_SPEARMAN = 0.95
+MIN_TOP5_OVERLAP = 4
+
+
+def rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def spearman(a: np.ndarray, b: np.ndarray) -> float:
+    rank_a = np.argsort(np.argsort(a))
+    rank_b = np.argsort(np.argsort(b))
+    return float(np.corrcoef(rank_a, rank_b)[0, 1])
+
+
+def timed_predict(model, pairs) -> tuple:
+    model.predict(pairs[:4], batch_size=4)  # aquecimento
+    start = time.perf_counter()
+    scores = np.asarray(model.predict(pairs, batch_size=len(pairs), show_progress_bar=False))
+    return scores, time.perf_counter() - start
+
+
+def main():
+    print("="*80)
+    print("TESTE DE PARIDADE DO RERANKER (PyTorch vs ONNX)")
+    print("="*80)
+    print()
+
+    with open(md_file, 'r', encoding='utf-8') as f:
+        chunks = MarkdownChunker().chunk(f.read(), source=os.path.basename(md_file))
+    documents = [chunk.text for chunk in chunks[:NUM_DOCUMENTS]]
+    print(f"📄 {len(documents)} trechos x {len(test_queries)} perguntas")
+
+    if not is_exported(model_dir) or not is_exported(model_dir, quantized=False):
+        export_onnx_model(DEFAULT_MODEL, model_dir)
+
+    # ONNX primeiro: a memória medida ainda não inclui o torch
+    rss_before = rss_mb()
+    onnx_int8 = OnnxCrossEncoder(model_dir, quantized=True)
+    rss_onnx = rss_mb()
+    onnx_fp32 = OnnxCrossEncoder(model_dir, quantized=False)
+
+    rss_before_torch = rss_mb()
+    from sentence_transformers import CrossEncoder
+    torch_model = CrossEncoder(DEFAULT_MODEL)
+    rss_torch = rss_mb()
+
+    print(f"💾 RSS ao carregar: ONNX int8 +{rss_onnx - rss_before:.0f} MB | "
+          f"PyTorch +{rss_torch - rss_before_torch:.0f} MB (inclui import do torch)")
+    print()
+
+    failures = 0
+    totals = {'torch': 0.0, 'fp32': 0.0, 'int8': 0.0}
+
+    for query in test_queries:
+        pairs = [(query, doc) for doc in documents]
+        torch_scores, torch_time = timed_predict(torch_model, pairs)
+        fp32_scores, fp32_time = timed_predict(onnx_fp32, pairs)
+        int8_scores, int8_time = timed_predict(onnx_int8, pairs)
+        totals['torch'] += torch_time
+        totals['fp32'] += fp32_time
+        totals['int8'] += int8_time
+
+        fp32_diff = float(np.max(np.abs(fp32_scores - torch_scores)))
+        int8_diff = float(np.max(np.abs(int8_scores - torch_scores)))
+        rho = spearman(torch_scores, int8_scores)
+        top5 = len(set(np.argsort(-torch_scores)[:5]) & set(np.argsort(-int8_scores)[:5]))
+
+        ok = fp32_diff <= FP32_TOLERANCE and rho >= MIN_SPEARMAN and top5 >= MIN_TOP5_OVERLAP
+        failures += not ok
+
+        print(f"{'✅' if ok else '❌'} {query}")
+        print(f"   fp32: diferença máx {fp32_diff:.2e} | "
+              f"int8: diferença máx {int8_diff:.3f}, Spearman {rho:.3f}, top-5 {top5}/5")
+
+    print()
+    print(f"⏱️  Tempo total ({len(test_queries)} lotes de {len(documents)} pares): "
+          f"PyTorch {totals['torch'] * 1000:.0f} ms | ONNX fp32 {totals['fp32'] * 1000:.0f} ms | "
+          f"ONNX int8 {totals['int8'] * 1000:.0f} ms")
+
+    if failures:
+        print(f"\n❌ {failures} pergunta(s) fora da tolerância")
+        sys.exit(1)
+    print("\n✅ Backend ONNX com scores equivalentes ao PyTorch")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,7 +10,7 @@ from retrieval.hybrid_search import HybridSearch
 # Paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.dirname(BASE_DIR)
-index_path = os.path.join(BASE_DIR, 'retrieval', 'bm25_index.pkl')
+index_path = os.path.join(BASE_DIR, 'retrieval', 'bm25_index.bin')
 
 def test_search_output():
     """Testa o formato da saída da busca"""
@@ -28,8 +28,8 @@ def test_search_output():
     print(f"🔍 Query: {query}")
     print()
 
-    # Perform search (10 trechos, como configurado)
-    results = searcher.search(query, top_k=10, bm25_candidates=30)
+    # Perform search (5 trechos, como configurado no servidor)
+    results = searcher.search(query, top_k=5, bm25_candidates=12)
 
     print(f"✅ Encontrados {len(results)} trechos")
     print()